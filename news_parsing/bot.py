@@ -1,19 +1,65 @@
 import asyncio
+import html
+import logging
 import os
+import time
 from aiogram import Bot, Dispatcher, F, types
 from aiogram.filters import Command
+from aiogram.types import BufferedInputFile
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from aiogram.types import FSInputFile
-from config import BOT_TOKEN, CHANNEL_ID, ADMINS
-from database import init_db, add_site, remove_site, get_sites, is_news_sent, mark_news_sent, mark_news_published, \
-    get_queue_size, clear_stuck_processing, set_moderation_lock, is_moderation_locked
-from site_poster import post_news_to_site
+from config import BOT_TOKEN, ADMINS
+from database import init_db, add_site, remove_site, get_sites, is_news_sent, mark_news_sent, \
+    get_queue_size, clear_stuck_processing, get_outbox_stats, count_pending_news, claim_moderation_lease, \
+    release_moderation_lease, clear_moderation_leases, count_active_leases, get_queue_oldest_age, retry_publication, \
+    get_outbox_entries
+from send_scheduler import get_scheduler_stats
+from publisher import enqueue_publication, wake_outbox_dispatcher, DESTINATION_SITE, DESTINATION_TELEGRAM, \
+    DESTINATION_NAMES
+from parser import wake_moderation_dispatcher
+from pipeline import wake_feed_poller, get_pipeline_stats
 from news_sender import send_processed_news_to_admin, get_pending_raw_news, get_pending_processed_news, \
-    remove_from_pending_raw_news, remove_from_pending_processed_news, delete_news_messages
+    remove_from_pending_raw_news, remove_from_pending_processed_news, delete_news_messages_for_all, STAGE_RAW, STAGE_PROCESSED, \
+    broadcast_to_admins
+from profiler import run_profile, PROFILE_DEFAULT_SECONDS, PROFILE_MAX_SECONDS
+from loop_watchdog import get_stall_report
+from tracing import trace_span, trace_event, get_trace_report, get_recent_traces_report
+import metrics
+
+logger = logging.getLogger(__name__)
 
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher()
 
+MODERATION_DECISION_SECONDS = metrics.histogram(
+    "moderation_decision_seconds", "Время от отправки карточки админам до решения",
+    ("stage", "decision"), buckets=metrics.DECISION_BUCKETS)
+QUEUE_DEPTH = metrics.gauge("news_queue_depth", "Новостей в очереди на модерацию")
+QUEUE_OLDEST_AGE = metrics.gauge("news_queue_oldest_age_seconds", "Возраст самой старой новости в очереди")
+PENDING_MODERATION = metrics.gauge("moderation_pending", "Новостей ждут решения админов", ("stage",))
+MODERATION_LEASES = metrics.gauge("moderation_leases_active", "Занятые слоты модерации")
+OUTBOX_ITEMS = metrics.gauge("publish_outbox_items", "Задачи очереди публикаций", ("status",))
+TELEGRAM_SEND_QUEUE = metrics.gauge("telegram_send_queue", "Сообщения в очереди отправки Telegram", ("priority",))
+PIPELINE_QUEUE = metrics.gauge("pipeline_queue_items", "Заполненность очередей конвейера сбора", ("stage",))
+
+
+async def collect_queue_metrics():
+    """Обновляет метрики очередей перед выдачей /metrics"""
+    QUEUE_DEPTH.set(await get_queue_size())
+    QUEUE_OLDEST_AGE.set(await get_queue_oldest_age())
+    PENDING_MODERATION.set(await count_pending_news(STAGE_RAW), stage=STAGE_RAW)
+    PENDING_MODERATION.set(await count_pending_news(STAGE_PROCESSED), stage=STAGE_PROCESSED)
+    MODERATION_LEASES.set(await count_active_leases())
+    for status, count in (await get_outbox_stats()).items():
+        OUTBOX_ITEMS.set(count, status=status)
+    send_stats = get_scheduler_stats()
+    TELEGRAM_SEND_QUEUE.set(send_stats["queued_channel"], priority="channel")
+    TELEGRAM_SEND_QUEUE.set(send_stats["queued_admin"], priority="admin")
+    for stage, size in get_pipeline_stats().items():
+        PIPELINE_QUEUE.set(size, stage=stage)
+
+
+metrics.register_collector(collect_queue_metrics)
+
 
 # Команды для админов
 def is_admin(user_id: int) -> bool:
@@ -24,270 +70,186 @@ def is_admin(user_id: int) -> bool:
 # В обработчике approve_raw_news
 @dp.callback_query(F.data.startswith("approve_raw|"))
 async def approve_raw_news(callback: types.CallbackQuery):
-    from database import set_moderation_lock
+    _, news_id = callback.data.split("|", 1)
+    data = await get_pending_raw_news(news_id)
+    if not data:
+        await callback.answer()
+        await delete_news_messages_for_all(news_id)
+        await callback.message.answer("❌ Новость не найдена.")
+        return
 
-    # Блокируем модерацию
-    await set_moderation_lock(True)
+    # Закрепляем новость за админом, чтобы ее не взяли в работу дважды
+    if not await claim_moderation_lease(data["url"], callback.from_user.id):
+        await callback.answer("⏳ Эту новость уже обрабатывает другой админ")
+        return
 
+    MODERATION_DECISION_SECONDS.observe(data["age"], stage=STAGE_RAW, decision="approve")
+    await trace_event(data["url"], "raw_decision", detail="approve")
     try:
         await callback.answer("✅ Новость одобрена для редактирования")
 
-        _, news_id = callback.data.split("|", 1)
-        data = get_pending_raw_news().get(news_id)
-        if not data:
-            await delete_news_messages(callback.from_user.id, news_id)
-            await callback.message.answer("❌ Новость не найдена.")
-            return
-
-        # Удаляем все сообщения этой новости у админа
-        await delete_news_messages(callback.from_user.id, news_id)
+        # Удаляем все сообщения этой новости у всех админов
+        await delete_news_messages_for_all(news_id)
 
         # Обрабатываем через DeepSeek
         from parser import process_with_deepseek
-        processed_text = await process_with_deepseek(data["title"], data["text"])
+        async with trace_span(data["url"], "paraphrase"):
+            processed_text = await process_with_deepseek(data["title"], data["text"])
 
         # Отправляем обработанную новость на финальное одобрение БЕЗ ФОТО
-        await send_processed_news_to_admin(processed_text, data["url"], data["title"])
+        async with trace_span(data["url"], "send_processed"):
+            await send_processed_news_to_admin(processed_text, data["url"], data["title"])
 
         # Удаляем из временного хранилища
-        remove_from_pending_raw_news(news_id)
+        await remove_from_pending_raw_news(news_id)
 
         # Уведомляем админа
         await callback.message.answer("✅ Новость отправлена на обработку DeepSeek")
 
-    finally:
-        # Разблокируем модерацию после завершения
-        await set_moderation_lock(False)
+    except Exception as e:
+        logger.error("❌ Ошибка обработки одобренной новости: %s", e)
+        # Освобождаем слот, иначе новость займет его до истечения аренды
+        await release_moderation_lease(data["url"])
+        wake_moderation_dispatcher()
+        await callback.message.answer("❌ Не удалось обработать новость.")
 
 
 # Обработка отклонения сырой новости
 @dp.callback_query(F.data.startswith("reject_raw|"))
 async def reject_raw_news(callback: types.CallbackQuery):
-    from database import set_moderation_lock
-
     try:
         await callback.answer("❌ Новость отклонена")
     except Exception:
         pass
 
-    try:
-        _, news_id = callback.data.split("|", 1)
+    _, news_id = callback.data.split("|", 1)
+    data = await get_pending_raw_news(news_id)
+
+    # Удаляем все сообщения этой новости у всех админов
+    await delete_news_messages_for_all(news_id)
 
-        # Удаляем все сообщения этой новости у админа
-        await delete_news_messages(callback.from_user.id, news_id)
+    await remove_from_pending_raw_news(news_id)
 
-        remove_from_pending_raw_news(news_id)
+    # Освобождаем слот модерации
+    if data:
+        MODERATION_DECISION_SECONDS.observe(data["age"], stage=STAGE_RAW, decision="reject")
+        await trace_event(data["url"], "raw_decision", detail="reject")
+        await release_moderation_lease(data["url"])
+        wake_moderation_dispatcher()
 
-        # Уведомляем ВСЕХ админов об отклонении
-        for admin_id in ADMINS:
-            try:
-                await bot.send_message(admin_id, "❌ Сырая новость отклонена.")
-            except Exception:
-                pass
-    finally:
-        # Разблокируем модерацию
-        await set_moderation_lock(False)
+    # Уведомляем ВСЕХ админов об отклонении
+    await broadcast_to_admins("❌ Сырая новость отклонена.")
 
 
 # Подтверждение обработанной новости для Telegram
 @dp.callback_query(F.data.startswith("approve|"))
 async def approve_processed_news(callback: types.CallbackQuery):
-    from database import set_moderation_lock
-
-    await callback.answer()
-
-    try:
-        _, news_id = callback.data.split("|", 1)
-        data = get_pending_processed_news().get(news_id)
-        if not data:
-            await delete_news_messages(callback.from_user.id, news_id)
-            await callback.message.answer("❌ Новость не найдена.")
-            return
-
-        news_text = data["text"]
-        image_path = data["image"]
-
-        if not os.path.exists(image_path):
-            print(f"❌ Файл не найден: {image_path}")
-            await delete_news_messages(callback.from_user.id, news_id)
-            await callback.message.answer("❌ Изображение не найдено, новость не отправлена.")
-            return
-
-        photo = FSInputFile(image_path)
-
-        try:
-            # Сначала отправляем фото с началом текста (если текст короткий)
-            if len(news_text) <= 1024:
-                # Если текст помещается в подпись к фото
-                await bot.send_photo(CHANNEL_ID, photo, caption=news_text, parse_mode="HTML")
-            else:
-                # Если текст длинный - отправляем фото без текста, а текст отдельно
-                await bot.send_photo(CHANNEL_ID, photo)
-                # Отправляем текст частями
-                from news_sender import send_long_message
-                await send_long_message(CHANNEL_ID, news_text, "")
-
-        except Exception as e:
-            print("❌ Ошибка отправки в канал:", e)
-            await delete_news_messages(callback.from_user.id, news_id)
-            await callback.message.answer("❌ Не удалось отправить новость в канал.")
-            return
-
-        # Отмечаем как опубликованную
-        await mark_news_published(data["url"])
-        remove_from_pending_processed_news(news_id)
-
-        # Удаляем все сообщения этой новости у админа
-        await delete_news_messages(callback.from_user.id, news_id)
-
-        # Уведомляем ВСЕХ админов о публикации
-        for admin_id in ADMINS:
-            try:
-                await bot.send_message(admin_id, "✅ Новость опубликована в Telegram.")
-            except Exception:
-                pass
-
-    finally:
-        # Разблокируем модерацию
-        await set_moderation_lock(False)
+    await queue_processed_news(callback, [DESTINATION_TELEGRAM])
 
 
 @dp.callback_query(F.data.startswith("site|"))
 async def post_to_site(callback: types.CallbackQuery):
-    from database import set_moderation_lock
-
-    try:
-        await callback.answer()
-        _, news_id = callback.data.split("|", 1)
-        data = get_pending_processed_news().get(news_id)
-        if not data:
-            await delete_news_messages(callback.from_user.id, news_id)
-            await callback.message.answer("❌ Новость не найдена.")
-            return
-
-        success = post_news_to_site(data["text"], data["image"])
-        if success:
-            await mark_news_published(data["url"])
-            remove_from_pending_processed_news(news_id)
-            await delete_news_messages(callback.from_user.id, news_id)
-            await callback.message.answer("🌐 Новость опубликована на сайте!")
-
-            for admin_id in ADMINS:
-                try:
-                    await bot.send_message(admin_id, "🌐 Новость опубликована на сайте!")
-                except Exception:
-                    pass
-        else:
-            await delete_news_messages(callback.from_user.id, news_id)
-            await callback.message.answer("❌ Ошибка при публикации на сайте.")
-    except Exception as e:
-        print(f"❌ Ошибка в post_to_site: {e}")
-        await delete_news_messages(callback.from_user.id, news_id)
-        await callback.message.answer("❌ Произошла ошибка при публикации на сайте.")
-    finally:
-        # Разблокируем модерацию
-        await set_moderation_lock(False)
+    await queue_processed_news(callback, [DESTINATION_SITE])
 
 
 @dp.callback_query(F.data.startswith("both|"))
 async def post_to_both(callback: types.CallbackQuery):
-    from database import set_moderation_lock
+    await queue_processed_news(callback, [DESTINATION_SITE, DESTINATION_TELEGRAM])
+
 
+async def queue_processed_news(callback: types.CallbackQuery, destinations: list):
+    """Ставит обработанную новость в очередь публикации - доставка идет в фоне"""
+    news_id = None
     try:
         await callback.answer()
         _, news_id = callback.data.split("|", 1)
-        data = get_pending_processed_news().get(news_id)
+        data = await get_pending_processed_news(news_id)
         if not data:
-            await delete_news_messages(callback.from_user.id, news_id)
+            await delete_news_messages_for_all(news_id)
             await callback.message.answer("❌ Новость не найдена.")
             return
 
-        image_path = data["image"]
-        text = data["text"]
-
-        # 1️⃣ Публикуем на сайт
-        success_site = post_news_to_site(text, image_path)
+        if DESTINATION_TELEGRAM in destinations and not os.path.exists(data["image"] or ""):
+            logger.error("❌ Файл не найден: %s", data['image'])
+            await delete_news_messages_for_all(news_id)
+            await callback.message.answer("❌ Изображение не найдено, новость не отправлена.")
+            return
 
-        # 2️⃣ Публикуем в Telegram
-        try:
-            photo = FSInputFile(image_path)
-            if len(text) <= 1024:
-                await bot.send_photo(CHANNEL_ID, photo, caption=text, parse_mode="HTML")
-            else:
-                await bot.send_photo(CHANNEL_ID, photo)
-                from news_sender import send_long_message
-                await send_long_message(CHANNEL_ID, text, "")
-            success_tg = True
-        except Exception as e:
-            print("Ошибка публикации в Telegram:", e)
-            success_tg = False
-
-        # Результат
-        if success_site or success_tg:
-            await mark_news_published(data["url"])
-            remove_from_pending_processed_news(news_id)
-            await delete_news_messages(callback.from_user.id, news_id)
-
-            result_message = ""
-            if success_site and success_tg:
-                result_message = "🚀 Новость опубликована в Telegram и на сайте!"
-            elif success_site:
-                result_message = "🌐 Новость опубликована на сайте (Telegram не удалось)!"
-            else:
-                result_message = "✅ Новость опубликована в Telegram (сайт не удалось)!"
-
-            await callback.message.answer(result_message)
-            for admin_id in ADMINS:
-                try:
-                    await bot.send_message(admin_id, result_message)
-                except Exception:
-                    pass
+        # Ключ идемпотентности (ссылка + площадка): на эти площадки новость могла уже ставиться раньше
+        existing = await get_outbox_entries(data["url"], destinations)
+        await enqueue_publication(data["url"], destinations, data["text"], data["image"])
+        MODERATION_DECISION_SECONDS.observe(data["age"], stage=STAGE_PROCESSED, decision="publish")
+        await trace_event(data["url"], "processed_decision", detail="publish: " + ", ".join(destinations))
+        await remove_from_pending_processed_news(news_id)
+        await delete_news_messages_for_all(news_id)
+        # Решение по новости принято - освобождаем слот модерации
+        await release_moderation_lease(data["url"])
+        wake_moderation_dispatcher()
+
+        if not existing:
+            await callback.message.answer("📤 Новость поставлена в очередь публикации. Результат придет отдельным сообщением.")
         else:
-            await delete_news_messages(callback.from_user.id, news_id)
-            await callback.message.answer("⚠️ Ошибка при публикации (проверь лог).")
+            await callback.message.answer(describe_existing_publications(existing, len(existing) < len(destinations)))
     except Exception as e:
-        print(f"❌ Ошибка в post_to_both: {e}")
-        await delete_news_messages(callback.from_user.id, news_id)
+        logger.error("❌ Ошибка постановки новости в очередь публикации: %s", e)
+        if news_id:
+            await delete_news_messages_for_all(news_id)
         await callback.message.answer("❌ Произошла ошибка при публикации.")
-    finally:
-        # Разблокируем модерацию
-        await set_moderation_lock(False)
+
+
+OUTBOX_STATUS_NAMES = {
+    "pending": "уже в очереди публикации",
+    "in_progress": "публикуется",
+    "done": "уже опубликована",
+    "failed": "публикация не удалась",
+    "needs_check": "результат публикации не подтвержден",
+}
+
+
+def describe_existing_publications(existing: list, added: bool) -> str:
+    """Сообщение админу о площадках, на которые новость уже ставилась в очередь раньше"""
+    lines = ["📤 Новость поставлена в очередь публикации на остальные площадки." if added
+             else "ℹ️ Новая публикация не создана."]
+    for outbox_id, destination, status in existing:
+        line = f"• {DESTINATION_NAMES.get(destination, destination)}: {OUTBOX_STATUS_NAMES.get(status, status)}"
+        if status in ("failed", "needs_check"):
+            line += f" - повторить: /retrypublish {outbox_id}"
+        lines.append(line)
+    return "\n".join(lines)
 
 
 @dp.callback_query(F.data.startswith("reject|"))
 async def reject_processed_news(callback: types.CallbackQuery):
-    from database import set_moderation_lock
-
     try:
         await callback.answer("❌ Новость отклонена")
     except Exception:
         pass
 
-    try:
-        _, news_id = callback.data.split("|", 1)
+    _, news_id = callback.data.split("|", 1)
+    data = await get_pending_processed_news(news_id)
+
+    # Удаляем все сообщения этой новости у всех админов
+    await delete_news_messages_for_all(news_id)
 
-        # Удаляем все сообщения этой новости у админа
-        await delete_news_messages(callback.from_user.id, news_id)
+    await remove_from_pending_processed_news(news_id)
 
-        remove_from_pending_processed_news(news_id)
+    # Освобождаем слот модерации
+    if data:
+        MODERATION_DECISION_SECONDS.observe(data["age"], stage=STAGE_PROCESSED, decision="reject")
+        await trace_event(data["url"], "processed_decision", detail="reject")
+        await release_moderation_lease(data["url"])
+        wake_moderation_dispatcher()
 
-        for admin_id in ADMINS:
-            try:
-                await bot.send_message(admin_id, "❌ Обработанная новость отклонена.")
-            except Exception:
-                pass
-    finally:
-        # Разблокируем модерацию
-        await set_moderation_lock(False)
+    await broadcast_to_admins("❌ Обработанная новость отклонена.")
 
 
 async def delete_message_safe(callback: types.CallbackQuery):
     """Безопасно удаляет сообщение, обрабатывая возможные ошибки"""
     try:
         await callback.message.delete()
-        print("✅ Сообщение с новостью удалено из чата")
+        logger.info("✅ Сообщение с новостью удалено из чата")
     except Exception as e:
-        print(f"⚠️ Не удалось удалить сообщение: {e}")
+        logger.warning("⚠️ Не удалось удалить сообщение: %s", e)
         # Пробуем отредактировать сообщение, если удалить не получилось
         try:
             await callback.message.edit_text(
@@ -393,6 +355,10 @@ async def cmd_help(message: types.Message):
 `/skipnext` - пропустить зависшую новость (очищает блокировки)
 `/postlatest` - принудительно проверить ВСЕ RSS-ленты (по 1 новости с каждого)
 `/force_check` - массовая проверка (до 15 новостей с каждой ленты)
+`/profile <сек>` - профилирование бота: flamegraph и блокирующие вызовы
+`/stalls` - где и насколько блокировался event loop бота
+`/trace <id или ссылка>` - время каждого этапа обработки новости (без аргумента - последние новости)
+`/retrypublish <номер>` - повторить публикацию, которая не удалась или не подтверждена
 
 *🔄 АВТОМАТИЧЕСКИЙ ПРОЦЕСС:*
 
@@ -483,6 +449,10 @@ async def cmd_add_site(message: types.Message):
         except Exception as e:
             error_urls.append(f"{url} ({str(e)})")
 
+    # Новые ленты опрашиваем сразу, не дожидаясь таймера
+    if added_urls:
+        wake_feed_poller()
+
     # Формируем ответ
     result_message = ""
 
@@ -612,17 +582,27 @@ async def cmd_queue_status(message: types.Message):
         return
 
     queue_size = await get_queue_size()
-    from news_sender import get_pending_raw_news, get_pending_processed_news
-    pending_raw_count = len(get_pending_raw_news())
-    pending_processed_count = len(get_pending_processed_news())
-    is_locked = await is_moderation_locked()
+    pending_raw_count = await count_pending_news(STAGE_RAW)
+    pending_processed_count = await count_pending_news(STAGE_PROCESSED)
+    from parser import get_moderation_capacity
+    active_leases = await count_active_leases()
+    outbox_stats = await get_outbox_stats()
+    send_stats = get_scheduler_stats()
+    pipeline_stats = get_pipeline_stats()
 
     status_text = (
         f"📊 *Статус системы*\n\n"
+        f"• 🔄 В обработке парсером: *{pipeline_stats['in_pipeline']}*\n"
         f"• 📥 Новостей в очереди: *{queue_size}*\n"
         f"• ⏳ Сырых новостей на модерации: *{pending_raw_count}*\n"
         f"• ✍️ Обработанных новостей на модерации: *{pending_processed_count}*\n"
-        f"• 🔒 Модерация заблокирована: *{'Да' if is_locked else 'Нет'}*\n"
+        f"• 🔒 Слотов модерации занято: *{active_leases}* из *{get_moderation_capacity()}*\n"
+        f"• 📤 Ожидают публикации: *{outbox_stats.get('pending', 0) + outbox_stats.get('in_progress', 0)}*\n"
+        f"• ⚠️ Не удалось опубликовать: *{outbox_stats.get('failed', 0)}*\n"
+        f"• ❓ Публикация не подтверждена: *{outbox_stats.get('needs_check', 0)}*\n"
+        f"• 📨 Очередь отправки Telegram: *{send_stats['queued_channel']}* в канал, "
+        f"*{send_stats['queued_admin']}* админам "
+        f"(флуд-ожиданий: {send_stats['flood_waits']})\n"
         f"• 👥 Всего админов: *{len(ADMINS)}*\n"
         f"\n*Процесс модерации:*\n"
         f"1. Сырая новость → Одобрение → DeepSeek\n"
@@ -645,13 +625,13 @@ async def cmd_post_next(message: types.Message):
         await message.answer("❌ Ты не админ!")
         return
 
-    # Проверяем блокировку модерации
-    if await is_moderation_locked():
-        await message.answer("⏳ Модерация заблокирована - дождитесь завершения текущей новости")
+    # Проверяем, есть ли свободный слот модерации
+    from parser import process_next_from_queue, get_free_moderation_slots
+    if await get_free_moderation_slots() <= 0:
+        await message.answer("⏳ Все слоты модерации заняты - дождитесь решения по текущим новостям")
         return
 
     # Запускаем обработку следующей новости из очереди
-    from parser import process_next_from_queue
     success = await process_next_from_queue()
 
     if success:
@@ -668,8 +648,9 @@ async def cmd_skip_next(message: types.Message):
 
     # Пропускаем текущую новость (очищаем зависшие обработки)
     await clear_stuck_processing()
-    # Также снимаем блокировку модерации
-    await set_moderation_lock(False)
+    # Также освобождаем все слоты модерации
+    await clear_moderation_leases()
+    wake_moderation_dispatcher()
     await message.answer("✅ Зависшие обработки очищены. Следующая новость будет обработана автоматически.")
 
 
@@ -722,6 +703,82 @@ async def cmd_force_check(message: types.Message):
     await message.answer(f"✅ Добавлено {total_added} новостей в очередь")
 
 
+@dp.message(Command("trace"))
+async def cmd_trace(message: types.Message):
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ Ты не админ!")
+        return
+
+    # Без аргумента - список последних трасс, иначе waterfall по ID новости или ссылке
+    args = message.text.split(maxsplit=1)
+    if len(args) < 2:
+        await message.answer(await get_recent_traces_report(), parse_mode="HTML")
+        return
+
+    report = await get_trace_report(args[1].strip())
+    if not report:
+        await message.answer("❌ Трасса не найдена.")
+        return
+    await message.answer(report, parse_mode="HTML")
+
+
+@dp.message(Command("retrypublish"))
+async def cmd_retry_publish(message: types.Message):
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ Ты не админ!")
+        return
+
+    # Номер задачи outbox приходит в уведомлении о неудачной или неподтвержденной публикации
+    args = message.text.split(maxsplit=1)
+    if len(args) < 2 or not args[1].strip().isdigit():
+        await message.answer("❌ Укажи номер публикации, например `/retrypublish 42`", parse_mode="Markdown")
+        return
+
+    if not await retry_publication(int(args[1])):
+        await message.answer("❌ Публикация не найдена или не требует повтора.")
+        return
+    wake_outbox_dispatcher()
+    await message.answer("🔄 Публикация снова поставлена в очередь.")
+
+
+@dp.message(Command("profile"))
+async def cmd_profile(message: types.Message):
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ Ты не админ!")
+        return
+
+    args = message.text.split(maxsplit=1)
+    try:
+        seconds = int(args[1]) if len(args) > 1 else PROFILE_DEFAULT_SECONDS
+    except ValueError:
+        await message.answer("❌ Укажи длительность в секундах, например `/profile 60`", parse_mode="Markdown")
+        return
+    seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+
+    await message.answer(f"🔬 Профилирую процесс бота {seconds} сек...")
+    session = await run_profile(seconds)
+    if session is None:
+        await message.answer("⏳ Профилирование уже идет - дождитесь результата")
+        return
+
+    # Свернутые стеки открываются в speedscope.app или flamegraph.pl
+    if session.stacks:
+        filename = f"profile-{time.strftime('%Y%m%d-%H%M%S')}.folded"
+        await message.answer_document(BufferedInputFile(session.folded().encode(), filename=filename),
+                                      caption="🔥 Flamegraph (формат folded: speedscope.app, flamegraph.pl)")
+    await message.answer(f"<pre>{html.escape(session.report()[:3900])}</pre>", parse_mode="HTML")
+
+
+@dp.message(Command("stalls"))
+async def cmd_stalls(message: types.Message):
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ Ты не админ!")
+        return
+
+    await message.answer(f"🐢 <b>Блокировки event loop</b>\n<pre>{html.escape(get_stall_report()[:3900])}</pre>",
+                         parse_mode="HTML")
+
+
 # Обработчик для любых других сообщений
 @dp.message()
 async def handle_other_messages(message: types.Message):
@@ -737,7 +794,7 @@ async def handle_other_messages(message: types.Message):
 # Инициализация базы данных при запуске
 async def initialize():
     await init_db()
-    print("✅ База данных инициализирована")
+    logger.info("✅ База данных инициализирована")
 
 
 # Запуск инициализации
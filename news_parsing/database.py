@@ -1,49 +1,57 @@
+import json
+import zlib
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 import aiosqlite
+from migrations import migrate
 
 DB_NAME = "news.db"
 
+# Сколько минут новость может висеть на модерации, прежде чем освободит слот
+MODERATION_LEASE_MINUTES = 60
+
+# Уровень сжатия текстов статей в news_content (zlib: 1 - быстрее, 9 - компактнее)
+CONTENT_COMPRESSION_LEVEL = 6
+
+
+def pack_text(text: str) -> bytes:
+    return zlib.compress((text or "").encode("utf-8"), CONTENT_COMPRESSION_LEVEL)
+
+
+def unpack_text(body: bytes) -> str:
+    return zlib.decompress(body).decode("utf-8") if body else ""
+
+
+# Параметры ссылки, которые не меняют статью (метки рекламных кампаний)
+TRACKING_PARAMS = ("utm_", "yclid", "gclid", "fbclid", "from", "ref")
+
+
+def canonical_link(link: str) -> str:
+    """Ссылка без фрагмента, меток кампаний и завершающего '/', с хостом в нижнем регистре.
+
+    Хранится в link_key очереди, news_sent и published_news - по нему проверяются дубли (seen_filter).
+    """
+    try:
+        parts = urlsplit(link.strip())
+    except ValueError:
+        return link
+    query = urlencode([(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                       if not key.lower().startswith(TRACKING_PARAMS)])
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/") or "/", query, ""))
+
+
 async def init_db():
+    """Готовит базу к работе: WAL и недостающие миграции схемы (migrations.py)"""
     async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS sites (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            url TEXT UNIQUE
-        )
-        """)
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS news_sent (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            link TEXT UNIQUE
-        )
-        """)
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS published_news (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            link TEXT UNIQUE,
-            published_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-        await db.execute("""
-                CREATE TABLE IF NOT EXISTS processing_queue (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    link TEXT UNIQUE,
-                    title TEXT,
-                    news_text TEXT,
-                    image_path TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    is_processing BOOLEAN DEFAULT FALSE,
-                    processed_by INTEGER DEFAULT NULL
-                )
-                """)
-        await db.execute("""
-                CREATE TABLE IF NOT EXISTS moderation_lock (
-                    id INTEGER PRIMARY KEY CHECK (id = 1),
-                    is_locked BOOLEAN DEFAULT FALSE,
-                    locked_until DATETIME DEFAULT NULL
-                )
-                """)
-        await db.execute("INSERT OR IGNORE INTO moderation_lock (id, is_locked) VALUES (1, FALSE)")
-        await db.commit()
+        # auto_vacuum меняется только в новой базе - до первой таблицы и до перехода в WAL.
+        # С INCREMENTAL retention.py возвращает место ОС без полного VACUUM
+        cursor = await db.execute("SELECT COUNT(*) FROM sqlite_master")
+        if not (await cursor.fetchone())[0]:
+            await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WAL позволяет боту и процессам-воркерам читать базу, пока кто-то пишет
+        await db.execute("PRAGMA journal_mode=WAL")
+    await migrate(DB_NAME)
+
+
 async def add_site(url):
     async with aiosqlite.connect(DB_NAME) as db:
         await db.execute("INSERT OR IGNORE INTO sites(url) VALUES(?)", (url,))
@@ -52,6 +60,7 @@ async def add_site(url):
 async def remove_site(url):
     async with aiosqlite.connect(DB_NAME) as db:
         await db.execute("DELETE FROM sites WHERE url=?", (url,))
+        await db.execute("DELETE FROM feed_leases WHERE url=?", (url,))
         await db.commit()
 
 async def get_sites():
@@ -69,9 +78,48 @@ async def is_news_sent(link):
 async def mark_news_sent(link):
     """Отмечает новость как отправленную на модерацию"""
     async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("INSERT OR IGNORE INTO news_sent(link) VALUES(?)", (link,))
+        await db.execute("INSERT OR IGNORE INTO news_sent(link, link_key, sent_at) VALUES(?, ?, CURRENT_TIMESTAMP)",
+                         (link, canonical_link(link)))
         await db.commit()
 
+async def get_seen_links_since(marks: dict, limit: int = None) -> tuple:
+    """Ключи ссылок (link_key), появившихся после отметок {таблица: последний id}: новых, отправленных
+    и опубликованных.
+
+    Возвращает (ключи, новые отметки). Нужна фильтру seen_filter, чтобы догонять записи других процессов.
+    """
+    links = []
+    new_marks = dict(marks)
+    async with aiosqlite.connect(DB_NAME) as db:
+        for table in ("processing_queue", "news_sent", "published_news"):
+            cursor = await db.execute(f"SELECT id, link_key FROM {table} WHERE id > ? ORDER BY id LIMIT ?",
+                                      (marks.get(table, 0), limit or -1))
+            rows = await cursor.fetchall()
+            if rows:
+                links.extend(row[1] for row in rows)
+                new_marks[table] = rows[-1][0]
+    return links, new_marks
+
+
+async def is_link_key_seen(link_key: str) -> bool:
+    """Есть ли ссылка с таким каноническим ключом в очереди, на модерации или среди опубликованных"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("""
+            SELECT 1 FROM published_news WHERE link_key = ?
+            UNION ALL SELECT 1 FROM news_sent WHERE link_key = ?
+            UNION ALL SELECT 1 FROM processing_queue WHERE link_key = ?
+            LIMIT 1
+        """, (link_key, link_key, link_key))
+        return await cursor.fetchone() is not None
+
+
+async def get_id_sequences() -> dict:
+    """Последние выданные id AUTOINCREMENT-таблиц (не уменьшаются при удалении строк)"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("SELECT name, seq FROM sqlite_sequence")
+        return {name: seq for name, seq in await cursor.fetchall()}
+
+
 async def is_news_published(link):
     """Проверяет, была ли новость уже опубликована"""
     async with aiosqlite.connect(DB_NAME) as db:
@@ -81,58 +129,109 @@ async def is_news_published(link):
 async def mark_news_published(link):
     """Отмечает новость как опубликованную"""
     async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("INSERT OR IGNORE INTO published_news(link) VALUES(?)", (link,))
+        await db.execute("INSERT OR IGNORE INTO published_news(link, link_key) VALUES(?, ?)",
+                         (link, canonical_link(link)))
         await db.commit()
 
-async def cleanup_old_pending_news(days=7):
-    """Очищает старые новости из pending_news (опционально)"""
+async def delete_rows_batch(table: str, condition: str, params: tuple, batch_size: int) -> int:
+    """Удаляет не больше batch_size строк, подходящих под условие, одной короткой транзакцией.
+
+    table и condition - только из правил хранения (retention.py), не из пользовательского ввода.
+    """
     async with aiosqlite.connect(DB_NAME) as db:
-        # Удаляем новости старше X дней из news_sent, но не из published_news
-        await db.execute("""
-            DELETE FROM news_sent 
-            WHERE link IN (
-                SELECT ns.link FROM news_sent ns
-                LEFT JOIN published_news pn ON ns.link = pn.link
-                WHERE pn.link IS NULL 
-                AND date(ns.id) < date('now', ?)
-            )
-        """, (f"-{days} days",))
+        cursor = await db.execute(f"""
+            DELETE FROM {table}
+            WHERE rowid IN (SELECT rowid FROM {table} WHERE {condition} LIMIT ?)
+        """, (*params, batch_size))
+        await db.commit()
+        return cursor.rowcount
+
+
+async def get_db_page_stats() -> dict:
+    """Размер базы в страницах, свободные страницы и режим auto_vacuum (0 - нет, 2 - incremental)"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        stats = {}
+        for pragma in ("page_size", "page_count", "freelist_count", "auto_vacuum"):
+            cursor = await db.execute(f"PRAGMA {pragma}")
+            stats[pragma] = (await cursor.fetchone())[0]
+        return stats
+
+
+async def enable_incremental_vacuum():
+    """Переводит базу в auto_vacuum=INCREMENTAL. Нужен полный VACUUM - база блокируется на время перезаписи,
+    поэтому вызывается только вручную при остановленных боте и воркерах (python retention.py --convert)"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        await db.execute("VACUUM")
+
+
+async def incremental_vacuum(pages: int):
+    """Возвращает ОС до pages свободных страниц (короткая блокировка вместо полного VACUUM)"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        # executescript выполняет прагму до конца (execute освобождает лишь одну страницу за шаг)
+        await db.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+
+
+async def optimize_db(analyze: bool = False):
+    """Обновляет статистику планировщика запросов и сжимает WAL-файл"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        if analyze:
+            await db.execute("ANALYZE")
+        await db.execute("PRAGMA optimize")
+        await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
         await db.commit()
 
 
 async def add_to_queue(link: str, title: str, news_text: str, image_path: str):
-    """Добавляет новость в очередь обработки"""
+    """Добавляет новость в очередь обработки. Текст хранится сжатым в news_content - очередь остается узкой"""
+    body = pack_text(news_text)
     async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("""
-            INSERT OR IGNORE INTO processing_queue (link, title, news_text, image_path)
+        cursor = await db.execute("""
+            INSERT OR IGNORE INTO processing_queue (link, link_key, title, image_path)
             VALUES (?, ?, ?, ?)
-        """, (link, title, news_text, image_path))
+        """, (link, canonical_link(link), title, image_path))
+        if cursor.rowcount:
+            await db.execute("INSERT INTO news_content (queue_id, body) VALUES (?, ?)", (cursor.lastrowid, body))
         await db.commit()
 
 
 async def get_next_from_queue():
     """Получает следующую новость из очереди для обработки"""
     async with aiosqlite.connect(DB_NAME) as db:
-        # Ищем первую необрабатываемую новость
-        cursor = await db.execute("""
-            SELECT id, link, title, news_text, image_path 
-            FROM processing_queue 
-            WHERE is_processing = FALSE 
-            ORDER BY created_at ASC 
-            LIMIT 1
-        """)
-        news = await cursor.fetchone()
+        while True:
+            # Ищем первую необрабатываемую новость (запрос целиком покрыт индексом idx_processing_queue_claim)
+            cursor = await db.execute("""
+                SELECT id
+                FROM processing_queue 
+                WHERE is_processing = FALSE 
+                ORDER BY created_at ASC 
+                LIMIT 1
+            """)
+            row = await cursor.fetchone()
+            if not row:
+                return None
 
-        if news:
-            # Помечаем как обрабатываемую
-            await db.execute("""
+            # Помечаем как обрабатываемую, только если ее не забрал другой процесс
+            cursor = await db.execute("""
                 UPDATE processing_queue 
-                SET is_processing = TRUE 
-                WHERE id = ?
-            """, (news[0],))
+                SET is_processing = TRUE, claimed_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND is_processing = FALSE
+            """, (row[0],))
             await db.commit()
+            if not cursor.rowcount:
+                continue
 
-        return news
+            # Текст загружаем только для забранной новости
+            cursor = await db.execute("""
+                SELECT q.id, q.link, q.title, c.body, q.image_path
+                FROM processing_queue q
+                LEFT JOIN news_content c ON c.queue_id = q.id
+                WHERE q.id = ?
+            """, (row[0],))
+            news = await cursor.fetchone()
+            if news:
+                queue_id, link, title, body, image_path = news
+                return queue_id, link, title, unpack_text(body), image_path
 
 
 async def mark_queue_processed(link: str):
@@ -142,6 +241,24 @@ async def mark_queue_processed(link: str):
         await db.commit()
 
 
+async def release_queue_item(queue_id: int):
+    """Возвращает забранную новость в очередь (отправка не удалась, новость будет обработана повторно)"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.execute("""
+            UPDATE processing_queue
+            SET is_processing = FALSE, claimed_at = NULL
+            WHERE id = ?
+        """, (queue_id,))
+        await db.commit()
+
+
+async def is_news_queued(link: str) -> bool:
+    """Проверяет, стоит ли новость в очереди обработки"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("SELECT 1 FROM processing_queue WHERE link = ?", (link,))
+        return await cursor.fetchone() is not None
+
+
 async def get_queue_size():
     """Возвращает размер очереди"""
     async with aiosqlite.connect(DB_NAME) as db:
@@ -150,61 +267,447 @@ async def get_queue_size():
         return result[0] if result else 0
 
 
+async def get_queue_oldest_age() -> float:
+    """Сколько секунд ждет самая старая новость в очереди (0 - очередь пуста)"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("""
+            SELECT (julianday('now') - julianday(MIN(created_at))) * 86400 FROM processing_queue
+        """)
+        result = await cursor.fetchone()
+        return result[0] if result and result[0] is not None else 0
+
+
 async def clear_stuck_processing():
     """Очищает зависшие обработки (старше 10 минут)"""
     async with aiosqlite.connect(DB_NAME) as db:
         await db.execute("""
             UPDATE processing_queue 
-            SET is_processing = FALSE 
+            SET is_processing = FALSE, claimed_at = NULL
             WHERE is_processing = TRUE 
-            AND datetime(created_at) < datetime('now', '-10 minutes')
+            AND claimed_at < datetime('now', '-10 minutes')
         """)
         await db.commit()
-async def add_to_approval_queue(link: str, title: str, news_text: str, image_path: str):
-    """Добавляет новость в очередь одобрения"""
+# Аренда новостей на модерации: вместо глобальной блокировки каждая новость
+# занимает свой слот на ограниченное время
+async def acquire_moderation_lease(link: str, minutes: int = MODERATION_LEASE_MINUTES):
+    """Занимает слот модерации для новости (новость отправлена админам)"""
     async with aiosqlite.connect(DB_NAME) as db:
         await db.execute("""
-            INSERT OR IGNORE INTO approval_queue (link, title, news_text, image_path)
-            VALUES (?, ?, ?, ?)
-        """, (link, title, news_text, image_path))
+            INSERT OR REPLACE INTO moderation_leases (link, admin_id, leased_until)
+            VALUES (?, NULL, datetime('now', ?))
+        """, (link, f"+{minutes} minutes"))
         await db.commit()
 
-async def get_next_from_approval_queue():
-    """Получает следующую новость из очереди одобрения"""
+
+async def claim_moderation_lease(link: str, admin_id: int, minutes: int = MODERATION_LEASE_MINUTES) -> bool:
+    """Закрепляет новость за админом и продлевает аренду.
+
+    Возвращает False, если новость уже взял в работу другой админ и его аренда не истекла.
+    """
     async with aiosqlite.connect(DB_NAME) as db:
+        await db.execute("""
+            INSERT OR IGNORE INTO moderation_leases (link, leased_until)
+            VALUES (?, datetime('now'))
+        """, (link,))
         cursor = await db.execute("""
-            SELECT id, link, title, news_text, image_path 
-            FROM approval_queue 
-            WHERE is_processing = FALSE 
-            ORDER BY created_at ASC 
-            LIMIT 1
+            UPDATE moderation_leases
+            SET admin_id = ?, leased_until = datetime('now', ?)
+            WHERE link = ?
+            AND (admin_id IS NULL OR admin_id = ? OR leased_until <= datetime('now'))
+        """, (admin_id, f"+{minutes} minutes", link, admin_id))
+        await db.commit()
+        return cursor.rowcount > 0
+
+
+async def release_moderation_lease(link: str):
+    """Освобождает слот модерации (по новости принято решение)"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.execute("DELETE FROM moderation_leases WHERE link = ?", (link,))
+        await db.commit()
+
+
+async def count_active_leases() -> int:
+    """Количество новостей, которые сейчас на модерации (аренда не истекла)"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("SELECT COUNT(*) FROM moderation_leases WHERE leased_until > datetime('now')")
+        result = await cursor.fetchone()
+        return result[0] if result else 0
+
+
+async def count_active_leases_by_admin() -> dict:
+    """Новости на модерации по админам: admin_id -> количество (None - еще никем не взята в работу)"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("""
+            SELECT admin_id, COUNT(*) FROM moderation_leases
+            WHERE leased_until > datetime('now')
+            GROUP BY admin_id
         """)
-        news = await cursor.fetchone()
+        return {admin_id: count for admin_id, count in await cursor.fetchall()}
 
-        if news:
-            await db.execute("""
-                UPDATE approval_queue 
-                SET is_processing = TRUE 
+
+async def clear_moderation_leases():
+    """Освобождает все слоты модерации (ручной сброс зависшей модерации)"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.execute("DELETE FROM moderation_leases")
+        await db.commit()
+
+
+# Аренда RSS-лент и ссылок между процессами-воркерами
+async def claim_due_feeds(worker_id: str, limit: int, lease_seconds: int) -> list:
+    """Забирает ленты, которые пора опросить и которые не опрашивает другой воркер"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        # IMMEDIATE сразу берет блокировку на запись - два воркера не получат одну ленту
+        await db.execute("BEGIN IMMEDIATE")
+        await db.execute("INSERT OR IGNORE INTO feed_leases (url) SELECT url FROM sites")
+        cursor = await db.execute("""
+            SELECT url FROM feed_leases
+            WHERE url IN (SELECT url FROM sites)
+            AND (next_poll_at IS NULL OR next_poll_at <= datetime('now'))
+            AND (leased_until IS NULL OR leased_until <= datetime('now'))
+            ORDER BY next_poll_at ASC
+            LIMIT ?
+        """, (limit,))
+        urls = [row[0] for row in await cursor.fetchall()]
+
+        await db.executemany("""
+            UPDATE feed_leases
+            SET worker_id = ?, leased_until = datetime('now', ?)
+            WHERE url = ?
+        """, [(worker_id, f"+{lease_seconds} seconds", url) for url in urls])
+        await db.commit()
+        return urls
+
+
+async def finish_feed_poll(url: str, next_poll_in_seconds: int):
+    """Освобождает ленту и назначает время следующего опроса"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.execute("""
+            UPDATE feed_leases
+            SET worker_id = NULL, leased_until = NULL, next_poll_at = datetime('now', ?)
+            WHERE url = ?
+        """, (f"+{next_poll_in_seconds} seconds", url))
+        await db.commit()
+
+
+async def claim_crawl_link(link: str, worker_id: str, lease_seconds: int) -> bool:
+    """Закрепляет ссылку за воркером, чтобы статью не скачивали два процесса"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.execute("""
+            INSERT OR IGNORE INTO crawl_leases (link, worker_id, leased_until)
+            VALUES (?, ?, datetime('now'))
+        """, (link, worker_id))
+        cursor = await db.execute("""
+            UPDATE crawl_leases
+            SET worker_id = ?, leased_until = datetime('now', ?)
+            WHERE link = ? AND (worker_id = ? OR leased_until <= datetime('now'))
+        """, (worker_id, f"+{lease_seconds} seconds", link, worker_id))
+        await db.commit()
+        return cursor.rowcount > 0
+
+
+async def release_crawl_link(link: str, worker_id: str):
+    """Снимает аренду ссылки, если она принадлежит этому воркеру"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.execute("DELETE FROM crawl_leases WHERE link = ? AND worker_id = ?", (link, worker_id))
+        await db.commit()
+
+
+# Очередь публикаций (outbox): каждая площадка доставляется отдельно
+async def add_to_outbox(link: str, destinations: list, news_text: str, image_path: str) -> int:
+    """Ставит новость в очередь публикации на указанные площадки.
+
+    Ключ идемпотентности (ссылка + площадка) не дает опубликовать новость дважды.
+    Возвращает количество реально добавленных задач.
+    """
+    added = 0
+    async with aiosqlite.connect(DB_NAME) as db:
+        for destination in destinations:
+            cursor = await db.execute("""
+                INSERT OR IGNORE INTO publish_outbox (idempotency_key, link, destination, news_text, image_path)
+                VALUES (?, ?, ?, ?, ?)
+            """, (f"{destination}|{link}", link, destination, news_text, image_path))
+            added += cursor.rowcount
+        await db.commit()
+    return added
+
+
+async def get_outbox_entries(link: str, destinations: list) -> list:
+    """Задачи outbox новости на указанные площадки: (id, destination, status)"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute(f"""
+            SELECT id, destination, status FROM publish_outbox
+            WHERE idempotency_key IN ({", ".join("?" * len(destinations))})
+            ORDER BY id
+        """, [f"{destination}|{link}" for destination in destinations])
+        return await cursor.fetchall()
+
+
+async def claim_due_publications(limit: int = 10):
+    """Забирает готовые к отправке задачи outbox и помечает их как выполняемые"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("""
+            SELECT id, link, destination, news_text, image_path, attempts, progress
+            FROM publish_outbox
+            WHERE status = 'pending' AND next_attempt_at <= datetime('now')
+            ORDER BY next_attempt_at ASC
+            LIMIT ?
+        """, (limit,))
+        rows = await cursor.fetchall()
+
+        if rows:
+            await db.executemany("""
+                UPDATE publish_outbox
+                SET status = 'in_progress', claimed_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
                 WHERE id = ?
-            """, (news[0],))
+            """, [(row[0],) for row in rows])
             await db.commit()
 
-        return news
+        return rows
+
+
+async def mark_publication_done(outbox_id: int):
+    """Помечает задачу outbox как успешно доставленную"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.execute("""
+            UPDATE publish_outbox
+            SET status = 'done', attempts = attempts + 1, last_error = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (outbox_id,))
+        await db.commit()
+
+
+async def mark_publication_failed(outbox_id: int, error: str, retry_in_seconds: int = None):
+    """Фиксирует неудачную попытку: планирует повтор или помечает задачу как проваленную"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        if retry_in_seconds is None:
+            await db.execute("""
+                UPDATE publish_outbox
+                SET status = 'failed', attempts = attempts + 1, last_error = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (error, outbox_id))
+        else:
+            await db.execute("""
+                UPDATE publish_outbox
+                SET status = 'pending', attempts = attempts + 1, last_error = ?,
+                    next_attempt_at = datetime('now', ?), updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (error, f"+{int(retry_in_seconds)} seconds", outbox_id))
+        await db.commit()
+
+
+async def save_publication_progress(outbox_id: int, progress: dict):
+    """Сохраняет выполненные шаги доставки, чтобы повтор их не дублировал"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.execute("""
+            UPDATE publish_outbox
+            SET progress = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (json.dumps(progress), outbox_id))
+        await db.commit()
+
+
+async def mark_publication_unverified(outbox_id: int, error: str):
+    """Результат доставки неизвестен (площадка могла принять запрос): без повтора, до проверки админом"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.execute("""
+            UPDATE publish_outbox
+            SET status = 'needs_check', attempts = attempts + 1, last_error = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (error, outbox_id))
+        await db.commit()
+
+
+async def retry_publication(outbox_id: int) -> bool:
+    """Возвращает непрошедшую или непроверенную задачу в очередь (по команде админа)"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("""
+            UPDATE publish_outbox
+            SET status = 'pending', attempts = 0, next_attempt_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status IN ('failed', 'needs_check')
+        """, (outbox_id,))
+        await db.commit()
+        return cursor.rowcount > 0
+
 
-async def mark_approval_processed(link: str):
-    """Помечает новость в очереди одобрения как обработанную"""
+async def reset_inflight_publications(older_than_seconds: int = None) -> int:
+    """Возвращает в очередь задачи в in_progress: все (прерванные перезапуском бота)
+    или только захваченные дольше older_than_seconds назад (доставка упала, не сняв захват)"""
     async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("DELETE FROM approval_queue WHERE link = ?", (link,))
+        if older_than_seconds is None:
+            cursor = await db.execute("""
+                UPDATE publish_outbox
+                SET status = 'pending', claimed_at = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'in_progress'
+            """)
+        else:
+            cursor = await db.execute("""
+                UPDATE publish_outbox
+                SET status = 'pending', claimed_at = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'in_progress' AND (claimed_at IS NULL OR claimed_at < datetime('now', ?))
+            """, (f"-{int(older_than_seconds)} seconds",))
         await db.commit()
-async def set_moderation_lock(locked: bool):
-    """Устанавливает блокировку модерации"""
+        return cursor.rowcount
+
+
+async def release_publications(outbox_ids: list, error: str, retry_in_seconds: int):
+    """Возвращает захваченные задачи в очередь с задержкой (доставка прервалась ошибкой).
+    Задачи, результат которых уже записан, не трогает"""
     async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("UPDATE moderation_lock SET is_locked = ? WHERE id = 1", (locked,))
+        await db.executemany("""
+            UPDATE publish_outbox
+            SET status = 'pending', claimed_at = NULL, last_error = ?,
+                next_attempt_at = datetime('now', ?), updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = 'in_progress'
+        """, [(error, f"+{int(retry_in_seconds)} seconds", outbox_id) for outbox_id in outbox_ids])
         await db.commit()
 
-async def is_moderation_locked() -> bool:
-    """Проверяет, заблокирована ли модерация"""
+
+async def get_outbox_stats() -> dict:
+    """Возвращает количество задач outbox по статусам"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("SELECT status, COUNT(*) FROM publish_outbox GROUP BY status")
+        rows = await cursor.fetchall()
+        return {status: count for status, count in rows}
+
+
+# Состояние модерации (переживает перезапуск бота)
+async def save_pending_news(news_id: str, stage: str, url: str, title: str, news_text: str, image_path: str = None):
+    """Сохраняет новость, ожидающую решения админа (stage: 'raw' или 'processed')"""
     async with aiosqlite.connect(DB_NAME) as db:
-        cursor = await db.execute("SELECT is_locked FROM moderation_lock WHERE id = 1")
+        await db.execute("""
+            INSERT OR REPLACE INTO pending_news (news_id, stage, url, title, news_text, image_path)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (news_id, stage, url, title, news_text, image_path))
+        await db.commit()
+
+
+async def get_pending_news(news_id: str, stage: str):
+    """Возвращает новость на модерации или None"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("""
+            SELECT url, title, news_text, image_path,
+                   (julianday('now') - julianday(created_at)) * 86400
+            FROM pending_news
+            WHERE news_id = ? AND stage = ?
+        """, (news_id, stage))
+        row = await cursor.fetchone()
+        if not row:
+            return None
+        url, title, news_text, image_path, age = row
+        # age - сколько секунд новость ждет решения на этом этапе
+        return {"url": url, "title": title, "text": news_text, "image": image_path, "age": age}
+
+
+async def remove_pending_news(news_id: str):
+    """Удаляет новость из состояния модерации"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.execute("DELETE FROM pending_news WHERE news_id = ?", (news_id,))
+        await db.commit()
+
+
+async def count_pending_news(stage: str) -> int:
+    """Количество новостей на модерации на указанном этапе"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("SELECT COUNT(*) FROM pending_news WHERE stage = ?", (stage,))
         result = await cursor.fetchone()
-        return result[0] if result else False
\ No newline at end of file
+        return result[0] if result else 0
+
+
+async def save_admin_messages(admin_id: int, news_id: str, message_ids: list):
+    """Запоминает ID сообщений новости, отправленных админу"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.executemany("""
+            INSERT OR IGNORE INTO admin_messages (admin_id, news_id, message_id)
+            VALUES (?, ?, ?)
+        """, [(admin_id, news_id, message_id) for message_id in message_ids])
+        await db.commit()
+
+
+async def get_admin_messages(admin_id: int, news_id: str) -> list:
+    """Возвращает ID сообщений новости у админа"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("""
+            SELECT message_id FROM admin_messages
+            WHERE admin_id = ? AND news_id = ?
+            ORDER BY message_id
+        """, (admin_id, news_id))
+        rows = await cursor.fetchall()
+        return [r[0] for r in rows]
+
+
+async def remove_admin_messages(admin_id: int, news_id: str):
+    """Забывает сообщения новости у админа"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.execute("DELETE FROM admin_messages WHERE admin_id = ? AND news_id = ?", (admin_id, news_id))
+        await db.commit()
+
+
+async def get_news_messages(news_id: str) -> dict:
+    """Возвращает ID сообщений новости у всех админов: admin_id -> [message_id, ...]"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("""
+            SELECT admin_id, message_id FROM admin_messages
+            WHERE news_id = ?
+            ORDER BY admin_id, message_id
+        """, (news_id,))
+        rows = await cursor.fetchall()
+
+    messages = {}
+    for admin_id, message_id in rows:
+        messages.setdefault(admin_id, []).append(message_id)
+    return messages
+
+
+async def remove_news_messages(news_id: str):
+    """Забывает сообщения новости у всех админов"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.execute("DELETE FROM admin_messages WHERE news_id = ?", (news_id,))
+        await db.commit()
+
+
+# Трассировка новостей: интервалы этапов обработки (см. tracing.py)
+async def add_trace_span(trace_id: str, link: str, stage: str, started_at: float, duration: float,
+                         status: str, detail: str = None):
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.execute("""
+            INSERT INTO trace_spans (trace_id, link, stage, started_at, duration, status, detail)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (trace_id, link, stage, started_at, duration, status, detail))
+        await db.commit()
+
+
+async def get_trace_spans(trace_id: str) -> list:
+    """Интервалы трассы по порядку. trace_id можно указать не полностью - берется самая свежая подходящая трасса"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("""
+            SELECT trace_id FROM trace_spans
+            WHERE trace_id >= ? AND trace_id < ?
+            ORDER BY started_at DESC
+            LIMIT 1
+        """, (trace_id, trace_id + "\uffff"))
+        row = await cursor.fetchone()
+        if not row:
+            return []
+        cursor = await db.execute("""
+            SELECT trace_id, link, stage, started_at, duration, status, detail
+            FROM trace_spans
+            WHERE trace_id = ?
+            ORDER BY started_at, id
+        """, (row[0],))
+        rows = await cursor.fetchall()
+
+    fields = ("trace_id", "link", "stage", "started_at", "duration", "status", "detail")
+    return [dict(zip(fields, row)) for row in rows]
+
+
+async def get_recent_traces(limit: int = 10) -> list:
+    """Последние трассы: [(trace_id, link, длительность от первого до последнего этапа), ...]"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("""
+            SELECT trace_id, link, MAX(started_at + duration) - MIN(started_at) AS total
+            FROM trace_spans
+            GROUP BY trace_id
+            ORDER BY MAX(started_at) DESC
+            LIMIT ?
+        """, (limit,))
+        return await cursor.fetchall()
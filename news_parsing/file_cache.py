@@ -0,0 +1,59 @@
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Папка для служебных кэшей (НЕ images/ - оттуда выбираются случайные картинки)
+CACHE_DIR = "cache"
+
+# Кэш хэшей файлов: path -> (size, mtime_ns, sha256)
+_file_hashes = {}
+
+
+def cache_path(name: str) -> str:
+    """Возвращает путь к файлу внутри папки кэша"""
+    return os.path.join(CACHE_DIR, name)
+
+
+def load_json_cache(path: str) -> dict:
+    """Загружает JSON-кэш с диска, при любой ошибке возвращает пустой словарь"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning("⚠️ Не удалось прочитать кэш %s: %s", path, e)
+        return {}
+
+
+def save_json_cache(path: str, data: dict):
+    """Атомарно сохраняет JSON-кэш на диск (через временный файл)"""
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.warning("⚠️ Не удалось сохранить кэш %s: %s", path, e)
+
+
+def file_sha256(path: str) -> str:
+    """Считает SHA-256 содержимого файла, повторно не читает неизменившийся файл"""
+    stat = os.stat(path)
+    cached = _file_hashes.get(path)
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+    result = digest.hexdigest()
+    _file_hashes[path] = (stat.st_size, stat.st_mtime_ns, result)
+    return result
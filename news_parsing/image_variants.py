@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+from file_cache import cache_path, file_sha256
+
+try:
+    from PIL import Image
+except ImportError:  # Без Pillow просто отдаем исходные файлы
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Папка с готовыми производными изображениями
+VARIANTS_DIR = cache_path("images")
+
+# Параметры производных изображений для каждого места публикации
+VARIANTS = {
+    # Главное изображение новости на сайте
+    "site": {"max_size": (1280, 720), "format": "WEBP", "quality": 82, "max_bytes": 200 * 1024},
+    # Фото в Telegram-канал (Telegram все равно ужимает до 1280px)
+    "telegram": {"max_size": (1280, 1280), "format": "JPEG", "quality": 85, "max_bytes": 300 * 1024},
+    # SEO-изображение (Open Graph 1200x630)
+    "seo": {"max_size": (1200, 630), "format": "JPEG", "quality": 80, "max_bytes": 150 * 1024},
+}
+
+EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp"}
+
+# Нижняя граница качества при подгонке под max_bytes
+MIN_QUALITY = 50
+
+
+def get_mime_type(path: str) -> str:
+    """Определяет MIME-тип изображения по расширению файла"""
+    mime_type, _ = mimetypes.guess_type(path)
+    return mime_type or "application/octet-stream"
+
+
+def _variant_path(image_path: str, variant: str) -> str:
+    options = VARIANTS[variant]
+    source_hash = file_sha256(image_path)
+    # Хэш параметров в имени файла: после изменения VARIANTS изображения строятся заново, а не берутся из кэша
+    options_hash = hashlib.sha256(json.dumps([options, MIN_QUALITY], sort_keys=True).encode()).hexdigest()[:8]
+    extension = EXTENSIONS[options["format"]]
+    return os.path.join(VARIANTS_DIR, f"{source_hash[:32]}_{variant}_{options_hash}.{extension}")
+
+
+def build_variant(image_path: str, variant: str) -> str:
+    """Строит (или берет из кэша) производное изображение и возвращает путь к нему.
+
+    При любой ошибке возвращает исходный путь, чтобы публикация не срывалась.
+    """
+    if Image is None or variant not in VARIANTS or not image_path or not os.path.exists(image_path):
+        return image_path
+
+    try:
+        output_path = _variant_path(image_path, variant)
+        if os.path.exists(output_path):
+            return output_path
+
+        options = VARIANTS[variant]
+        os.makedirs(VARIANTS_DIR, exist_ok=True)
+
+        with Image.open(image_path) as source:
+            image = source.convert("RGB")
+        image.thumbnail(options["max_size"], Image.LANCZOS)
+
+        # Снижаем качество, пока файл не уложится в лимит размера
+        tmp_path = f"{output_path}.tmp"
+        quality = options["quality"]
+        while True:
+            image.save(tmp_path, format=options["format"], quality=quality, optimize=True)
+            if os.path.getsize(tmp_path) <= options["max_bytes"] or quality <= MIN_QUALITY:
+                break
+            quality -= 10
+
+        os.replace(tmp_path, output_path)
+        logger.info("🖼️ Подготовлено изображение '%s': %s %s КБ → %s КБ", variant, os.path.basename(image_path),
+                    os.path.getsize(image_path) // 1024, os.path.getsize(output_path) // 1024)
+        return output_path
+
+    except Exception as e:
+        logger.warning("⚠️ Не удалось подготовить изображение '%s' для %s: %s", variant, image_path, e)
+        return image_path
+
+
+async def get_variant(image_path: str, variant: str) -> str:
+    """Асинхронная обертка над build_variant - сжатие выполняется вне event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, build_variant, image_path, variant)
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import metrics
+from profiler import frame_label, walk_stack, is_loop_idle, project_frame, PROJECT_DIR
+
+logger = logging.getLogger(__name__)
+
+# Сторож event loop: постоянно замеряет задержку loop, а если она превышает порог - отдельный поток
+# снимает стек блокирующего кадра. Остановки собираются по функциям (место в проекте + вызов, который
+# блокирует), попадают в метрики и в отчет /stalls.
+
+# Как часто корутина-пульс отмечается в loop (сек)
+LOOP_HEARTBEAT_INTERVAL = 0.05
+# Задержка, после которой loop считается заблокированным (сек)
+LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD", "0.25"))
+# Как часто поток-сторож проверяет пульс (сек)
+WATCHDOG_CHECK_INTERVAL = 0.05
+# Сколько кадров проекта сохранять в примере стека
+STALL_STACK_DEPTH = 8
+
+LOOP_LAG_SECONDS = metrics.histogram(
+    "event_loop_lag_seconds", "Задержка event loop (опоздание пробуждения корутины-пульса)",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+LOOP_STALLS = metrics.counter(
+    "event_loop_stalls_total", "Блокировки event loop дольше порога", ("site",))
+LOOP_STALL_SECONDS = metrics.counter(
+    "event_loop_stall_seconds_total", "Суммарное время блокировок event loop", ("site",))
+
+# Место блокировки -> {"count", "total", "max", "stack"}
+_stalls = {}
+_stalls_lock = threading.Lock()
+# Стек, снятый сторожем во время текущей блокировки (забирает корутина-пульс, когда loop оживет)
+_captured = None
+_last_beat = 0.0
+
+
+def _capture(frame) -> tuple:
+    stack = walk_stack(frame)
+    site_frame = project_frame(stack)
+    site = frame_label(site_frame) if site_frame else "-"
+    # Пример стека: вызовы проекта и сам блокирующий кадр
+    lines = [f"{frame_label(f)}:{f.f_lineno}" for f in stack
+             if f is frame or os.path.dirname(os.path.abspath(f.f_code.co_filename)) == PROJECT_DIR]
+    return site, frame_label(frame), lines[-STALL_STACK_DEPTH:]
+
+
+def _watchdog(loop_thread_id: int, stop: threading.Event):
+    """Поток-сторож: если пульс давно не обновлялся, снимает стек потока event loop"""
+    global _captured
+    captured_beat = None
+    while not stop.wait(WATCHDOG_CHECK_INTERVAL):
+        beat = _last_beat
+        if beat == captured_beat or time.monotonic() - beat < LOOP_STALL_THRESHOLD:
+            continue
+        frame = sys._current_frames().get(loop_thread_id)
+        if frame is None or is_loop_idle(frame):
+            continue
+        captured = _capture(frame)
+        with _stalls_lock:
+            _captured = captured
+        captured_beat = beat
+
+
+def _record_stall(captured: tuple, lag: float):
+    site, function, stack = captured
+    key = (site, function)
+    with _stalls_lock:
+        stall = _stalls.setdefault(key, {"count": 0, "total": 0.0, "max": 0.0, "stack": stack})
+        stall["count"] += 1
+        stall["total"] += lag
+        if lag >= stall["max"]:
+            stall["max"] = lag
+            stall["stack"] = stack
+    LOOP_STALLS.inc(site=site)
+    LOOP_STALL_SECONDS.inc(lag, site=site)
+    logger.warning("🐢 Event loop заблокирован на %.0f мс: %s ← %s", lag * 1000, site, function,
+                   extra={"stall_site": site, "stall_function": function, "lag": round(lag, 3)})
+
+
+async def loop_watchdog():
+    """Корутина-пульс и поток-сторож. Работает до отмены"""
+    global _last_beat, _captured
+    _last_beat = time.monotonic()
+    stop = threading.Event()
+    thread = threading.Thread(target=_watchdog, args=(threading.get_ident(), stop), name="loop-watchdog", daemon=True)
+    thread.start()
+    logger.info("🐕 Сторож event loop запущен (порог %.0f мс)", LOOP_STALL_THRESHOLD * 1000)
+    try:
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(LOOP_HEARTBEAT_INTERVAL)
+            now = time.monotonic()
+            _last_beat = now
+            lag = max(0.0, now - before - LOOP_HEARTBEAT_INTERVAL)
+            LOOP_LAG_SECONDS.observe(lag)
+
+            with _stalls_lock:
+                captured, _captured = _captured, None
+            if captured and lag >= LOOP_STALL_THRESHOLD:
+                _record_stall(captured, lag)
+    finally:
+        stop.set()
+
+
+def get_stall_report(top_n: int = 10) -> str:
+    """Отчет о блокировках event loop с начала работы процесса, самые дорогие - сверху"""
+    with _stalls_lock:
+        stalls = sorted(_stalls.items(), key=lambda item: item[1]["total"], reverse=True)
+    if not stalls:
+        return f"Блокировок event loop дольше {LOOP_STALL_THRESHOLD * 1000:.0f} мс не было"
+
+    total = sum(stall["total"] for _, stall in stalls)
+    count = sum(stall["count"] for _, stall in stalls)
+    lines = [f"Блокировок: {count}, суммарно {total:.1f} с (порог {LOOP_STALL_THRESHOLD * 1000:.0f} мс)", ""]
+    for (site, function), stall in stalls[:top_n]:
+        lines.append(f"{stall['total'] * 1000:7.0f} мс  x{stall['count']:<4} макс. {stall['max'] * 1000:.0f} мс")
+        lines.append(f"    {site} ← {function}")
+    lines.append("")
+    lines.append("Стек самой долгой блокировки в первом месте списка:")
+    lines.extend(f"    {line}" for line in stalls[0][1]["stack"])
+    return "\n".join(lines)
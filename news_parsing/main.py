@@ -1,62 +1,122 @@
+import argparse
 import asyncio
 from bot import dp, bot
-from parser import scheduler
+from parser import moderation_dispatcher, wake_moderation_dispatcher
+from pipeline import run_pipeline
+from site_poster import close_session
+from publisher import outbox_dispatcher
+from database import init_db
+from notify import start_wakeup_listener, CHANNEL_MODERATION
+from worker import start_worker_processes, stop_worker_processes
+from log_setup import setup_logging, shutdown_logging
+from metrics import start_metrics_server
+from loop_watchdog import loop_watchdog
+from retention import retention_loop
 import logging
-import sys
 
+logger = logging.getLogger(__name__)
 
-async def main():
-    print("🤖 Бот запускается...")
-    max_retries = 5
-    retry_delay = 5
 
-    for attempt in range(max_retries):
-        try:
-            print(f"🔄 Попытка запуска {attempt + 1}/{max_retries}...")
+async def run_crawler(workers: int, external_workers: bool = False):
+    """Сбор новостей: в этом же процессе или в отдельных процессах-воркерах"""
+    if workers <= 0 and not external_workers:
+        await run_pipeline()
+        return
+
+    # Воркеры пишут в общую базу и будят диспетчер модерации через канал пробуждения
+    transport = await start_wakeup_listener({CHANNEL_MODERATION: wake_moderation_dispatcher})
+    processes = start_worker_processes(workers) if workers > 0 else []
+    logger.info("👷 Запущено процессов-воркеров: %s", len(processes))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        transport.close()
+        stop_worker_processes(processes)
 
-            # Запускаем парсер ВНЕ зависимости от успешности бота
-            parser_task = asyncio.create_task(scheduler())
 
-            # Запускаем бота
-            await dp.start_polling(
-                bot,
-                handle_signals=False,
-                allowed_updates=dp.resolve_used_update_types()
-            )
-            break
+async def main(workers: int = 0, external_workers: bool = False):
+    logger.info("🤖 Бот запускается...")
+    await init_db()
+    metrics_runner = await start_metrics_server()
+    # Следим за блокировками event loop (метрики и /stalls)
+    watchdog_task = asyncio.create_task(loop_watchdog())
 
-        except Exception as e:
-            print(f"❌ Ошибка бота (попытка {attempt + 1}): {e}")
-
-            if attempt < max_retries - 1:
-                print(f"⏳ Повторная попытка через {retry_delay} секунд...")
-                await asyncio.sleep(retry_delay)
-                retry_delay *= 2  # Экспоненциальная задержка
-            else:
-                print("❌ Не удалось запустить бота после всех попыток")
-                # Но парсер продолжает работать!
-                try:
-                    await parser_task
-                except asyncio.CancelledError:
-                    print("✅ Фоновая задача парсера остановлена")
-                return
-
-    # Если бот запустился, ждем завершения парсера
+    # Фоновая доставка публикаций на сайт и в Telegram
+    outbox_task = asyncio.create_task(outbox_dispatcher())
+    # Отправка новостей из очереди на модерацию по мере освобождения слотов
+    moderation_task = asyncio.create_task(moderation_dispatcher())
+    # Удаление устаревших записей и сжатие базы
+    retention_task = asyncio.create_task(retention_loop())
     try:
-        await parser_task
-    except asyncio.CancelledError:
-        print("✅ Фоновая задача парсера остановлена")
-    except Exception as e:
-        print(f"⚠️ Ошибка в парсере: {e}")
+        parser_task = None
+        max_retries = 5
+        retry_delay = 5
+
+        for attempt in range(max_retries):
+            try:
+                logger.info("🔄 Попытка запуска %s/%s...", attempt + 1, max_retries)
+
+                # Запускаем парсер ВНЕ зависимости от успешности бота (один раз на все попытки)
+                if parser_task is None:
+                    parser_task = asyncio.create_task(run_crawler(workers, external_workers))
+
+                # Запускаем бота
+                await dp.start_polling(
+                    bot,
+                    handle_signals=False,
+                    allowed_updates=dp.resolve_used_update_types()
+                )
+                break
+
+            except Exception as e:
+                logger.error("❌ Ошибка бота (попытка %s): %s", attempt + 1, e)
+
+                if attempt < max_retries - 1:
+                    logger.info("⏳ Повторная попытка через %s секунд...", retry_delay)
+                    await asyncio.sleep(retry_delay)
+                    retry_delay *= 2  # Экспоненциальная задержка
+                else:
+                    logger.error("❌ Не удалось запустить бота после всех попыток")
+                    # Но парсер продолжает работать!
+                    try:
+                        await parser_task
+                    except asyncio.CancelledError:
+                        logger.info("✅ Фоновая задача парсера остановлена")
+                    return
+
+        # Если бот запустился, ждем завершения парсера
+        try:
+            await parser_task
+        except asyncio.CancelledError:
+            logger.info("✅ Фоновая задача парсера остановлена")
+        except Exception as e:
+            logger.warning("⚠️ Ошибка в парсере: %s", e)
+
+    finally:
+        outbox_task.cancel()
+        moderation_task.cancel()
+        watchdog_task.cancel()
+        retention_task.cancel()
+        # Закрываем пул соединений с API сайта
+        await close_session()
+        if metrics_runner:
+            await metrics_runner.cleanup()
 
 
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Бот агроновостей")
+    arg_parser.add_argument("--workers", type=int, default=0,
+                            help="сколько процессов-воркеров сбора новостей запустить (0 - в процессе бота)")
+    arg_parser.add_argument("--external-workers", action="store_true",
+                            help="не собирать новости в процессе бота - воркеры запущены отдельно (worker.py)")
+    args = arg_parser.parse_args()
+
+    setup_logging()
     try:
-        asyncio.run(main())
+        asyncio.run(main(args.workers, args.external_workers))
     except KeyboardInterrupt:
-        print("👋 Бот остановлен пользователем")
+        logger.info("👋 Бот остановлен пользователем")
     except Exception as e:
-        print(f"❌ Критическая ошибка: {e}")
-        import traceback
-
-        traceback.print_exc()
\ No newline at end of file
+        logger.exception("❌ Критическая ошибка: %s", e)
+    finally:
+        shutdown_logging()
@@ -0,0 +1,176 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Метрики в текстовом формате Prometheus: http://127.0.0.1:9108/metrics
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# Границы корзин гистограмм по умолчанию (сек)
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Время до решения модератора - минуты и часы
+DECISION_BUCKETS = (30, 60, 300, 600, 1800, 3600, 3 * 3600, 12 * 3600, 24 * 3600)
+
+_metrics = {}
+_collectors = []
+# Наблюдения приходят и из потоков executor'а (загрузка и разбор статей)
+_lock = threading.Lock()
+
+
+def _label_key(label_names: tuple, labels: dict) -> tuple:
+    return tuple(str(labels.get(name, "")) for name in label_names)
+
+
+def _format_labels(label_names: tuple, key: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, key)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.label_names, labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> list:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value}" for key, value in self.values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = _label_key(self.label_names, labels)
+        with _lock:
+            self.values[key] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}  # ключ меток -> [счетчики по корзинам, сумма, количество]
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.label_names, labels)
+        with _lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Замеряет длительность блока with"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list:
+        lines = []
+        for key, (counts, total, count) in self.values.items():
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.label_names, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            inf_labels = _format_labels(self.label_names, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf_labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+def _register(metric_class, name: str, *args, **kwargs):
+    # Повторная регистрация возвращает уже существующую метрику
+    if name not in _metrics:
+        _metrics[name] = metric_class(name, *args, **kwargs)
+    return _metrics[name]
+
+
+def counter(name: str, documentation: str, labels: tuple = ()) -> Counter:
+    return _register(Counter, name, documentation, labels)
+
+
+def gauge(name: str, documentation: str, labels: tuple = ()) -> Gauge:
+    return _register(Gauge, name, documentation, labels)
+
+
+def histogram(name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram, name, documentation, labels, buckets)
+
+
+def register_collector(collector):
+    """Добавляет async-функцию, которая обновляет gauge-метрики перед каждой выдачей (например, размеры очередей)"""
+    _collectors.append(collector)
+
+
+def domain_of(url: str) -> str:
+    """Домен для метки метрики (без пути - чтобы число меток не росло)"""
+    return urlsplit(url).hostname or "unknown"
+
+
+async def render_metrics() -> str:
+    for collector in _collectors:
+        try:
+            await collector()
+        except Exception as e:
+            logger.warning("⚠️ Не удалось собрать метрики %s: %s", getattr(collector, "__name__", collector), e)
+
+    lines = []
+    with _lock:
+        for metric in _metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+async def _handle_metrics(request):
+    return web.Response(text=await render_metrics(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(host: str = None, port: int = None):
+    """Запускает HTTP-сервер метрик в текущем event loop, возвращает runner (или None, если порт занят)"""
+    host = host or METRICS_HOST
+    port = port or METRICS_PORT
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        logger.warning("⚠️ Не удалось запустить сервер метрик на %s:%s: %s", host, port, e)
+        await runner.cleanup()
+        return None
+    logger.info("📈 Метрики доступны на http://%s:%s/metrics", host, port)
+    return runner
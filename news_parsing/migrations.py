@@ -0,0 +1,282 @@
+"""Версионные миграции схемы news.db.
+
+Каждая миграция - номер, описание и список шагов (SQL или async-функция от соединения).
+Примененные версии записываются в schema_version. При запуске применяются только недостающие
+миграции, каждая в своей транзакции: при ошибке база остается на предыдущей версии.
+Если схема актуальна, запуск стоит одного запроса к schema_version.
+
+Новая миграция добавляется в конец MIGRATIONS со следующим номером; уже примененные не меняются.
+
+Применить миграции и показать версию схемы:
+    python migrations.py
+"""
+import asyncio
+import logging
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+
+async def _add_news_sent_at(db):
+    # В базах до появления сроков хранения news_sent без даты: считаем, что записи отправлены сейчас.
+    # ALTER TABLE не разрешает DEFAULT CURRENT_TIMESTAMP, поэтому дата ставится в mark_news_sent
+    cursor = await db.execute("PRAGMA table_info(news_sent)")
+    if "sent_at" not in [row[1] for row in await cursor.fetchall()]:
+        await db.execute("ALTER TABLE news_sent ADD COLUMN sent_at DATETIME DEFAULT NULL")
+        await db.execute("UPDATE news_sent SET sent_at = CURRENT_TIMESTAMP WHERE sent_at IS NULL")
+
+
+async def _move_queue_text_to_content(db):
+    # Тексты статей переезжают в news_content (сжатые), processing_queue перестраивается без news_text.
+    # Перестройка вместо DROP COLUMN - работает и на SQLite старше 3.35
+    from database import pack_text
+
+    await db.execute("CREATE TABLE news_content (queue_id INTEGER PRIMARY KEY, body BLOB)")
+    cursor = await db.execute("SELECT id, news_text FROM processing_queue")
+    await db.executemany("INSERT INTO news_content (queue_id, body) VALUES (?, ?)",
+                         [(queue_id, pack_text(text)) for queue_id, text in await cursor.fetchall()])
+
+    # Последний выданный id нужно сохранить: id очереди не должны повторяться (на них опирается seen_filter)
+    cursor = await db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'processing_queue'")
+    row = await cursor.fetchone()
+    await db.execute("""
+        CREATE TABLE processing_queue_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            link TEXT UNIQUE,
+            title TEXT,
+            image_path TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            is_processing BOOLEAN DEFAULT FALSE,
+            processed_by INTEGER DEFAULT NULL,
+            claimed_at DATETIME DEFAULT NULL
+        )
+    """)
+    await db.execute("""
+        INSERT INTO processing_queue_new (id, link, title, image_path, created_at, is_processing, processed_by, claimed_at)
+        SELECT id, link, title, image_path, created_at, is_processing, processed_by, claimed_at FROM processing_queue
+    """)
+    await db.execute("DROP TABLE processing_queue")
+    await db.execute("ALTER TABLE processing_queue_new RENAME TO processing_queue")
+    if row:
+        await db.execute("DELETE FROM sqlite_sequence WHERE name = 'processing_queue'")
+        await db.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('processing_queue', ?)", (row[0],))
+    await db.execute("CREATE INDEX idx_processing_queue_claim ON processing_queue (is_processing, created_at)")
+    # Текст удаляется вместе с новостью из очереди - любым путем (обработка, очистка по сроку)
+    await db.execute("""
+        CREATE TRIGGER processing_queue_delete_content AFTER DELETE ON processing_queue
+        BEGIN
+            DELETE FROM news_content WHERE queue_id = OLD.id;
+        END
+    """)
+
+
+# Исходная схема. Базы, созданные до миграций, содержат ее часть - поэтому IF NOT EXISTS
+BASELINE = [
+    """
+    CREATE TABLE IF NOT EXISTS sites (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        url TEXT UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS news_sent (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        link TEXT UNIQUE,
+        sent_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    _add_news_sent_at,
+    "CREATE INDEX IF NOT EXISTS idx_news_sent_at ON news_sent (sent_at)",
+    """
+    CREATE TABLE IF NOT EXISTS published_news (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        link TEXT UNIQUE,
+        published_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_published_news_at ON published_news (published_at)",
+    """
+    CREATE TABLE IF NOT EXISTS processing_queue (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        link TEXT UNIQUE,
+        title TEXT,
+        news_text TEXT,
+        image_path TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        is_processing BOOLEAN DEFAULT FALSE,
+        processed_by INTEGER DEFAULT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS moderation_leases (
+        link TEXT PRIMARY KEY,
+        admin_id INTEGER DEFAULT NULL,
+        leased_until DATETIME
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_moderation_leases_until ON moderation_leases (leased_until)",
+    """
+    CREATE TABLE IF NOT EXISTS publish_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        idempotency_key TEXT UNIQUE,
+        link TEXT,
+        destination TEXT,
+        news_text TEXT,
+        image_path TEXT,
+        status TEXT DEFAULT 'pending',
+        attempts INTEGER DEFAULT 0,
+        last_error TEXT DEFAULT NULL,
+        next_attempt_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_publish_outbox_due ON publish_outbox (status, next_attempt_at)",
+    """
+    CREATE TABLE IF NOT EXISTS pending_news (
+        news_id TEXT PRIMARY KEY,
+        stage TEXT,
+        url TEXT,
+        title TEXT,
+        news_text TEXT,
+        image_path TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_pending_news_stage ON pending_news (stage)",
+    """
+    CREATE TABLE IF NOT EXISTS admin_messages (
+        admin_id INTEGER,
+        news_id TEXT,
+        message_id INTEGER,
+        PRIMARY KEY (admin_id, news_id, message_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_admin_messages_news ON admin_messages (news_id)",
+    """
+    CREATE TABLE IF NOT EXISTS feed_leases (
+        url TEXT PRIMARY KEY,
+        worker_id TEXT DEFAULT NULL,
+        leased_until DATETIME DEFAULT NULL,
+        next_poll_at DATETIME DEFAULT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS crawl_leases (
+        link TEXT PRIMARY KEY,
+        worker_id TEXT,
+        leased_until DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS trace_spans (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        trace_id TEXT,
+        link TEXT,
+        stage TEXT,
+        started_at REAL,
+        duration REAL,
+        status TEXT,
+        detail TEXT DEFAULT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_trace_spans_trace ON trace_spans (trace_id, started_at)",
+]
+
+async def _add_link_keys(db):
+    # Ключ дедупликации (ссылка без меток кампаний и фрагмента) считается в Python - существующие
+    # строки заполняются здесь, новые - при вставке
+    from database import canonical_link
+
+    for table in ("processing_queue", "news_sent", "published_news"):
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN link_key TEXT DEFAULT NULL")
+        cursor = await db.execute(f"SELECT id, link FROM {table}")
+        await db.executemany(f"UPDATE {table} SET link_key = ? WHERE id = ?",
+                             [(canonical_link(link), row_id) for row_id, link in await cursor.fetchall()])
+        await db.execute(f"CREATE INDEX idx_{table}_link_key ON {table} (link_key)")
+
+
+MIGRATIONS = [
+    (1, "Исходная схема", BASELINE),
+    (2, "Индексы и время захвата для выборки из очереди и очистки", [
+        # Выборка следующей новости: WHERE is_processing = FALSE ORDER BY created_at
+        "CREATE INDEX idx_processing_queue_claim ON processing_queue (is_processing, created_at)",
+        # Зависшую новость определяем по времени захвата, а не по времени добавления в очередь
+        "ALTER TABLE processing_queue ADD COLUMN claimed_at DATETIME DEFAULT NULL",
+        "UPDATE processing_queue SET claimed_at = CURRENT_TIMESTAMP WHERE is_processing = TRUE",
+        "CREATE INDEX idx_trace_spans_started ON trace_spans (started_at)",
+        "CREATE INDEX idx_publish_outbox_finished ON publish_outbox (status, updated_at)",
+        "CREATE INDEX idx_crawl_leases_until ON crawl_leases (leased_until)",
+    ]),
+    (3, "Удаление глобальной блокировки модерации (заменена арендами)", [
+        "DROP TABLE IF EXISTS moderation_lock",
+    ]),
+    (4, "Тексты статей отдельно от очереди, в сжатом виде", [_move_queue_text_to_content]),
+    (5, "Выполненные шаги доставки публикаций", [
+        # JSON: id уже отправленных сообщений Telegram, id созданной новости на сайте
+        "ALTER TABLE publish_outbox ADD COLUMN progress TEXT DEFAULT NULL",
+    ]),
+    (6, "Время захвата задач публикации", [
+        # Задачу, зависшую в in_progress (упавшая доставка), диспетчер возвращает в очередь по этому времени
+        "ALTER TABLE publish_outbox ADD COLUMN claimed_at DATETIME DEFAULT NULL",
+        "UPDATE publish_outbox SET claimed_at = CURRENT_TIMESTAMP WHERE status = 'in_progress'",
+    ]),
+    (7, "Канонические ключи ссылок для проверки дублей", [_add_link_keys]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+async def get_schema_version(db) -> int:
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor = await db.execute("SELECT MAX(version) FROM schema_version")
+    row = await cursor.fetchone()
+    return row[0] or 0
+
+
+async def migrate(db_name: str) -> int:
+    """Применяет недостающие миграции, возвращает версию схемы"""
+    # isolation_level=None - транзакциями управляем сами (BEGIN IMMEDIATE ... COMMIT)
+    async with aiosqlite.connect(db_name, isolation_level=None) as db:
+        try:
+            cursor = await db.execute("SELECT MAX(version) FROM schema_version")
+            if ((await cursor.fetchone())[0] or 0) >= LATEST_VERSION:
+                return LATEST_VERSION
+        except aiosqlite.OperationalError:
+            pass  # Новая база или база до миграций - schema_version еще нет
+
+        for version, description, steps in MIGRATIONS:
+            # Бот и воркеры могут стартовать одновременно: версию проверяем под блокировкой на запись
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                if await get_schema_version(db) >= version:
+                    await db.execute("ROLLBACK")
+                    continue
+                for step in steps:
+                    if callable(step):
+                        await step(db)
+                    else:
+                        await db.execute(step)
+                await db.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                                 (version, description))
+                await db.execute("COMMIT")
+            except Exception:
+                await db.execute("ROLLBACK")
+                logger.exception("❌ Миграция %s (%s) не применена", version, description)
+                raise
+            logger.info("🗄️ Применена миграция %s: %s", version, description)
+        return LATEST_VERSION
+
+
+if __name__ == "__main__":
+    from database import DB_NAME, init_db
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(init_db())
+    print(f"✅ База данных {DB_NAME} обновлена до версии схемы {LATEST_VERSION}")
@@ -0,0 +1,164 @@
+"""Локальная заглушка API api.demo.agrosearch.kz для проверки публикации без сети.
+
+Повторяет эндпоинты из NEWS_API_DOCUMENTATION.md: /auth/login, /upload/image, /content/news.
+
+Запуск сервера:
+    python mock_site_api.py --port 8080
+и в site_poster.py: BASE_API_URL = "http://127.0.0.1:8080/api"
+
+Самопроверка пакетной публикации (поднимает заглушку и публикует несколько новостей):
+    python mock_site_api.py --selftest
+"""
+import argparse
+import asyncio
+import os
+import random
+import uuid
+from aiohttp import web
+
+ALLOWED_IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "bmp", "svg", "webp"}
+
+
+def create_mock_app(delay: float = 0.0, fail_rate: float = 0.0) -> web.Application:
+    """Создает приложение-заглушку.
+
+    delay - искусственная задержка каждого ответа (сек),
+    fail_rate - доля запросов, на которые отвечаем 503 (для проверки повторов).
+    """
+    app = web.Application(client_max_size=20 * 1024 * 1024)
+    app["tokens"] = set()
+    app["images"] = {}  # image_uri -> размер файла
+    app["news"] = []
+
+    async def simulate_network():
+        if delay:
+            await asyncio.sleep(delay)
+        if fail_rate and random.random() < fail_rate:
+            raise web.HTTPServiceUnavailable(text="Service temporarily unavailable")
+
+    def validation_error(errors: dict):
+        return web.json_response({"message": "The given data was invalid.", "errors": errors}, status=422)
+
+    async def login(request):
+        await simulate_network()
+        data = await request.json()
+        if not (data.get("email") or data.get("phone_number")) or not data.get("password"):
+            return validation_error({"email": ["Wrong credentials"]})
+
+        token = uuid.uuid4().hex
+        app["tokens"].add(token)
+        return web.json_response({"access_token": token, "token_type": "bearer", "expires_in": 10080})
+
+    async def upload_image(request):
+        await simulate_network()
+        form = await request.post()
+        image = form.get("image")
+        if image is None or not hasattr(image, "file"):
+            return validation_error({"image": ["The image field is required."]})
+
+        extension = os.path.splitext(image.filename or "")[1].lstrip(".").lower()
+        if extension not in ALLOWED_IMAGE_EXTENSIONS:
+            return validation_error({"image": ["The image must be a file of type: jpg, jpeg, png, gif, bmp, svg, webp."]})
+
+        image_uri = f"tmp/images/{uuid.uuid4().hex}.{extension}"
+        app["images"][image_uri] = len(image.file.read())
+        return web.json_response({"success": True, "data": {"path": f"/storage/{image_uri}"}})
+
+    async def create_news(request):
+        await simulate_network()
+        auth = request.headers.get("Authorization", "")
+        if not auth.startswith("Bearer ") or auth[7:] not in app["tokens"]:
+            return web.json_response({"message": "Unauthenticated."}, status=401)
+
+        data = await request.json()
+        errors = {}
+        if not data.get("title"):
+            errors["title"] = ["The title field is required."]
+        elif len(data["title"]) > 255:
+            errors["title"] = ["The title may not be greater than 255 characters."]
+        if not data.get("description"):
+            errors["description"] = ["The description field is required."]
+        if len(data.get("subtitle") or "") > 500:
+            errors["subtitle"] = ["The subtitle may not be greater than 500 characters."]
+        for field in ("image_uri", "seo_image"):
+            if data.get(field) and data[field] not in app["images"]:
+                errors[field] = [f"The selected {field} is invalid."]
+        if not data.get("image_uri"):
+            errors["image_uri"] = ["The image uri field is required."]
+        if errors:
+            return validation_error(errors)
+
+        news_id = len(app["news"]) + 1
+        app["news"].append(data)
+        return web.json_response({
+            "success": True,
+            "message": "News created successfully",
+            "data": {"id": news_id, "title": data["title"], "slug": f"news-{news_id}"}
+        }, status=201)
+
+    async def list_news(request):
+        return web.json_response({"data": app["news"]})
+
+    app.router.add_post("/api/auth/login", login)
+    app.router.add_post("/api/upload/image", upload_image)
+    app.router.add_post("/api/content/news", create_news)
+    app.router.add_get("/api/content/news", list_news)
+    return app
+
+
+async def start_mock_api(host: str = "127.0.0.1", port: int = 8080, delay: float = 0.0, fail_rate: float = 0.0):
+    """Запускает заглушку в текущем event loop, возвращает (runner, base_api_url)"""
+    runner = web.AppRunner(create_mock_app(delay, fail_rate))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner, f"http://{host}:{port}/api"
+
+
+async def selftest(port: int, delay: float, fail_rate: float):
+    """Публикует пачку новостей в заглушку и выводит результат по каждой"""
+    import site_poster
+
+    runner, base_url = await start_mock_api(port=port, delay=delay, fail_rate=fail_rate)
+    site_poster.BASE_API_URL = base_url
+    try:
+        image_files = sorted(os.listdir("images")) if os.path.isdir("images") else []
+        items = []
+        for i in range(8):
+            image_path = os.path.join("images", image_files[i % len(image_files)]) if image_files else None
+            items.append((f"Тестовая новость {i + 1}\n\nТекст тестовой новости номер {i + 1}. Второе предложение.",
+                          image_path))
+
+        results = await site_poster.post_news_batch(items)
+        print("\n📋 Результаты пакетной публикации:")
+        for (news_text, image_path), success in zip(items, results):
+            ok = success and not isinstance(success, Exception)
+            print(f"   {'✅' if ok else '❌'} {news_text.splitlines()[0]} ({image_path})")
+    finally:
+        await site_poster.close_session()
+        await runner.cleanup()
+
+
+async def serve(port: int, delay: float, fail_rate: float):
+    runner, base_url = await start_mock_api(port=port, delay=delay, fail_rate=fail_rate)
+    print(f"🧪 Заглушка API запущена: {base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Локальная заглушка API agrosearch.kz")
+    arg_parser.add_argument("--port", type=int, default=8080)
+    arg_parser.add_argument("--delay", type=float, default=0.0, help="задержка ответа, сек")
+    arg_parser.add_argument("--fail-rate", type=float, default=0.0, help="доля ответов 503")
+    arg_parser.add_argument("--selftest", action="store_true", help="опубликовать тестовую пачку новостей")
+    args = arg_parser.parse_args()
+
+    try:
+        if args.selftest:
+            asyncio.run(selftest(args.port, args.delay, args.fail_rate))
+        else:
+            asyncio.run(serve(args.port, args.delay, args.fail_rate))
+    except KeyboardInterrupt:
+        print("👋 Заглушка остановлена")
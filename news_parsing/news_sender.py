@@ -1,31 +1,149 @@
 import asyncio
+import logging
 import os
 import random
 import hashlib
 from aiogram import Bot
 from aiogram.types import FSInputFile
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError
 from config import BOT_TOKEN, ADMINS
+from file_cache import cache_path, load_json_cache, save_json_cache, file_sha256
+from send_scheduler import schedule_send
+import metrics
+from database import save_pending_news, get_pending_news, remove_pending_news, save_admin_messages, \
+    get_admin_messages, remove_admin_messages, get_news_messages, remove_news_messages
+
+logger = logging.getLogger(__name__)
 
 bot = Bot(token=BOT_TOKEN)
 
-# Глобальные словари для хранения состояний
-pending_raw_news = {}  # Для сырых новостей на одобрение
-pending_processed_news = {}  # Для обработанных новостей на финальную публикацию
-admin_message_ids = {}  # Для хранения ID всех сообщений новости по admin_id
+# Этапы модерации (состояние хранится в БД, таблица pending_news)
+STAGE_RAW = "raw"  # Сырые новости на одобрение
+STAGE_PROCESSED = "processed"  # Обработанные новости на финальную публикацию
+
+# Кэш file_id уже загруженных в Telegram фото: sha256 файла -> file_id
+TELEGRAM_FILE_IDS_FILE = cache_path("telegram_file_ids.json")
+_telegram_file_ids = None
+
+# Ошибки Telegram, означающие, что сохраненный file_id больше не действителен
+# (остальные BadRequest - подпись, chat_id - повторная загрузка файла не исправит)
+FILE_ID_ERRORS = ("wrong file identifier", "file reference", "wrong remote file", "file_id")
+
+
+def _get_telegram_file_ids() -> dict:
+    """Лениво загружает кэш file_id с диска"""
+    global _telegram_file_ids
+    if _telegram_file_ids is None:
+        _telegram_file_ids = load_json_cache(TELEGRAM_FILE_IDS_FILE)
+    return _telegram_file_ids
+
 
+async def send_photo_cached(chat_id, image_path: str, **kwargs):
+    """Отправляет фото, повторно используя file_id вместо повторной загрузки файла"""
+    image_hash = file_sha256(image_path)
+    file_ids = _get_telegram_file_ids()
 
-async def send_raw_news_to_admin(title: str, news_text: str, source_url: str):
+    file_id = file_ids.get(image_hash)
+    if file_id:
+        try:
+            return await schedule_send(chat_id, bot.send_photo, chat_id, file_id, **kwargs)
+        except TelegramBadRequest as e:
+            if not any(marker in e.message.lower() for marker in FILE_ID_ERRORS):
+                raise
+            logger.warning("⚠️ Telegram не принял сохраненный file_id, загружаем файл заново: %s", e)
+            file_ids.pop(image_hash, None)
+            save_json_cache(TELEGRAM_FILE_IDS_FILE, file_ids)
+
+    message = await schedule_send(chat_id, bot.send_photo, chat_id, FSInputFile(image_path), **kwargs)
+    if message.photo:
+        # Берем самый большой размер - его file_id ссылается на исходное фото
+        file_ids[image_hash] = message.photo[-1].file_id
+        save_json_cache(TELEGRAM_FILE_IDS_FILE, file_ids)
+    return message
+
+
+# Максимальная длина текстового сообщения Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+
+async def send_long_message(chat_id, text: str, prefix: str = "", parse_mode: str = "HTML",
+                            start_part: int = 0, on_part_sent=None):
+    """Отправляет длинный текст несколькими сообщениями, разбивая по абзацам.
+
+    start_part - с какой части продолжить (предыдущие уже отправлены),
+    on_part_sent(index, message) - вызывается после отправки каждой части.
+    """
+    text = f"{prefix}{text}"
+    parts = []
+    while len(text) > MAX_MESSAGE_LENGTH:
+        split_at = text.rfind("\n", 0, MAX_MESSAGE_LENGTH)
+        if split_at <= 0:
+            split_at = MAX_MESSAGE_LENGTH
+        parts.append(text[:split_at])
+        text = text[split_at:].lstrip("\n")
+    if text:
+        parts.append(text)
+
+    for index in range(start_part, len(parts)):
+        message = await schedule_send(chat_id, bot.send_message, chat_id, parts[index], parse_mode=parse_mode)
+        if on_part_sent:
+            await on_part_sent(index, message)
+
+
+async def broadcast_to_admins(text: str, **kwargs) -> dict:
+    """Отправляет сообщение всем админам параллельно.
+
+    Скорость ограничивает send_scheduler: общий лимит бота и лимит на каждый чат,
+    ожидание RetryAfter и повторы - отдельного ограничения параллельности здесь нет.
+    Возвращает словарь admin_id -> Message (успех) или исключение (ошибка).
+    """
+    results = await asyncio.gather(
+        *(schedule_send(admin_id, bot.send_message, admin_id, text, **kwargs) for admin_id in ADMINS),
+        return_exceptions=True
+    )
+    return dict(zip(ADMINS, results))
+
+
+MODERATION_CARDS = metrics.counter(
+    "moderation_cards_total", "Карточки новостей, разосланные админам", ("result",))
+
+
+async def save_broadcast_messages(news_id: str, results: dict, label: str) -> int:
+    """Сохраняет ID разосланных сообщений новости и возвращает число успешных отправок.
+
+    Если не удалось отправить никому из-за сети - пробрасывает ошибку для повторной попытки.
+    """
+    sent_to_admins = 0
+    network_error = None
+    for admin_id, result in results.items():
+        if isinstance(result, TelegramForbiddenError):
+            MODERATION_CARDS.inc(result="forbidden")
+            logger.error("❌ Не удалось отправить админу %s — он не написал боту.", admin_id)
+        elif isinstance(result, Exception):
+            MODERATION_CARDS.inc(result="error")
+            logger.error("❌ Ошибка отправки админу %s: %s", admin_id, result)
+            if isinstance(result, TelegramNetworkError):
+                network_error = result
+        else:
+            # Сохраняем все ID сообщений для этой новости
+            await save_admin_messages(admin_id, news_id, [result.message_id])
+            logger.debug("✅ %s отправлена админу %s", label, admin_id)
+            MODERATION_CARDS.inc(result="sent")
+            sent_to_admins += 1
+
+    if sent_to_admins == 0 and network_error:
+        raise network_error
+    return sent_to_admins
+
+
+async def send_raw_news_to_admin(title: str, news_text: str, source_url: str) -> int:
+    """Отправляет сырую новость на модерацию, возвращает число админов, получивших ее (0 - не доставлена)"""
     max_retries = 3
     for attempt in range(max_retries):
         try:
             news_id = hashlib.md5(source_url.encode()).hexdigest()
-            pending_raw_news[news_id] = {
-                "url": source_url,
-                "title": title,
-                "text": news_text
-            }
+            await save_pending_news(news_id, STAGE_RAW, source_url, title, news_text)
 
             keyboard = InlineKeyboardBuilder()
             keyboard.button(text="✅ Одобрить для редактирования", callback_data=f"approve_raw|{news_id}")
@@ -39,50 +157,31 @@ async def send_raw_news_to_admin(title: str, news_text: str, source_url: str):
                 f"<b>🔗 Источник:</b>\n{source_url}"
             )
 
-            # Отправляем ВСЕМ админам
-            sent_to_admins = 0
-            for admin_id in ADMINS:
-                try:
-                    # Инициализируем хранилище сообщений для этого admin_id и news_id
-                    if admin_id not in admin_message_ids:
-                        admin_message_ids[admin_id] = {}
-
-                    message_ids = []
-
-                    # Отправляем ОДНО текстовое сообщение с кнопками
-                    text_message = await bot.send_message(
-                        admin_id,
-                        message_text,
-                        reply_markup=keyboard.as_markup(),
-                        parse_mode="HTML"
-                    )
-                    message_ids.append(text_message.message_id)
-
-                    # Сохраняем все ID сообщений для этой новости
-                    admin_message_ids[admin_id][news_id] = message_ids
-
-                    print(f"✅ Сырая новость отправлена админу {admin_id}")
-                    sent_to_admins += 1
-
-                except TelegramForbiddenError:
-                    print(f"❌ Не удалось отправить админу {admin_id} — он не написал боту.")
-                except Exception as e:
-                    print(f"❌ Ошибка отправки админу {admin_id}: {e}")
+            # Отправляем ВСЕМ админам одновременно (ОДНО текстовое сообщение с кнопками)
+            results = await broadcast_to_admins(
+                message_text,
+                reply_markup=keyboard.as_markup(),
+                parse_mode="HTML"
+            )
+            sent_to_admins = await save_broadcast_messages(news_id, results, "Сырая новость")
 
             if sent_to_admins > 0:
-                print(f"📨 Сырая новость отправлена {sent_to_admins} админам")
-                break
+                logger.info("📨 Сырая новость отправлена %s админам", sent_to_admins)
+                return sent_to_admins
 
         except TelegramNetworkError as e:
             if attempt < max_retries - 1:
                 wait_time = 2 ** attempt
-                print(f"⚠️ Ошибка сети, повторная попытка {attempt + 1} через {wait_time} сек...")
+                logger.warning("⚠️ Ошибка сети, повторная попытка %s через %s сек...", attempt + 1, wait_time)
                 await asyncio.sleep(wait_time)
             else:
-                print(f"❌ Не удалось отправить сырую новость после {max_retries} попыток: {e}")
+                logger.error("❌ Не удалось отправить сырую новость после %s попыток: %s", max_retries, e)
         except Exception as e:
-            print(f"❌ Критическая ошибка в send_raw_news_to_admin: {e}")
+            logger.error("❌ Критическая ошибка в send_raw_news_to_admin: %s", e)
             break
+    return 0
+
+
 async def send_processed_news_to_admin(news_text: str, source_url: str, original_title: str):
     max_retries = 3
     for attempt in range(max_retries):
@@ -94,11 +193,8 @@ async def send_processed_news_to_admin(news_text: str, source_url: str, original
             image_path = os.path.join("images", random.choice(image_files)) if image_files else None
 
             news_id = hashlib.md5(f"{source_url}_processed".encode()).hexdigest()
-            pending_processed_news[news_id] = {
-                "url": source_url,
-                "text": news_text,
-                "image": image_path  # Добавляем image для публикации
-            }
+            # Сохраняем вместе с image для публикации
+            await save_pending_news(news_id, STAGE_PROCESSED, source_url, original_title, news_text, image_path)
 
             keyboard = InlineKeyboardBuilder()
             keyboard.button(text="🌐 На сайт", callback_data=f"site|{news_id}")
@@ -114,87 +210,97 @@ async def send_processed_news_to_admin(news_text: str, source_url: str, original
                 f"<b>🔗 Источник:</b>\n{source_url}"
             )
 
-            # Отправляем ВСЕМ админам
-            sent_to_admins = 0
-            for admin_id in ADMINS:
-                try:
-                    # Инициализируем хранилище сообщений для этого admin_id и news_id
-                    if admin_id not in admin_message_ids:
-                        admin_message_ids[admin_id] = {}
-
-                    message_ids = []
-
-                    # Отправляем ОДНО текстовое сообщение с кнопками
-                    text_message = await bot.send_message(
-                        admin_id,
-                        message_text,
-                        reply_markup=keyboard.as_markup(),
-                        parse_mode="HTML"
-                    )
-                    message_ids.append(text_message.message_id)
-
-                    # Сохраняем все ID сообщений для этой новости
-                    admin_message_ids[admin_id][news_id] = message_ids
-
-                    print(f"✅ Обработанная новость отправлена админу {admin_id}")
-                    sent_to_admins += 1
-
-                except TelegramForbiddenError:
-                    print(f"❌ Не удалось отправить админу {admin_id} — он не написал боту.")
-                except Exception as e:
-                    print(f"❌ Ошибка отправки админу {admin_id}: {e}")
+            # Отправляем ВСЕМ админам одновременно (ОДНО текстовое сообщение с кнопками)
+            results = await broadcast_to_admins(
+                message_text,
+                reply_markup=keyboard.as_markup(),
+                parse_mode="HTML"
+            )
+            sent_to_admins = await save_broadcast_messages(news_id, results, "Обработанная новость")
 
             if sent_to_admins > 0:
-                print(f"📨 Обработанная новость отправлена {sent_to_admins} админам")
+                logger.info("📨 Обработанная новость отправлена %s админам", sent_to_admins)
                 break
 
         except TelegramNetworkError as e:
             if attempt < max_retries - 1:
                 wait_time = 2 ** attempt
-                print(f"⚠️ Ошибка сети, повторная попытка {attempt + 1} через {wait_time} сек...")
+                logger.warning("⚠️ Ошибка сети, повторная попытка %s через %s сек...", attempt + 1, wait_time)
                 await asyncio.sleep(wait_time)
             else:
-                print(f"❌ Не удалось отправить обработанную новость после {max_retries} попыток: {e}")
+                logger.error("❌ Не удалось отправить обработанную новость после %s попыток: %s", max_retries, e)
         except Exception as e:
-            print(f"❌ Критическая ошибка в send_processed_news_to_admin: {e}")
+            logger.error("❌ Критическая ошибка в send_processed_news_to_admin: %s", e)
             break
-async def delete_news_messages(admin_id: int, news_id: str):
-    """Удаляет все сообщения связанные с конкретной новостью у админа"""
-    try:
-        if admin_id in admin_message_ids and news_id in admin_message_ids[admin_id]:
-            message_ids = admin_message_ids[admin_id][news_id]
-            deleted_count = 0
+# Telegram позволяет удалить до 100 сообщений одним запросом deleteMessages
+DELETE_MESSAGES_BATCH = 100
+
 
-            for message_id in message_ids:
+async def delete_admin_messages(admin_id: int, message_ids: list) -> int:
+    """Удаляет сообщения в чате админа пачками, возвращает количество удаленных"""
+    deleted_count = 0
+    for i in range(0, len(message_ids), DELETE_MESSAGES_BATCH):
+        batch = message_ids[i:i + DELETE_MESSAGES_BATCH]
+        try:
+            await schedule_send(admin_id, bot.delete_messages, admin_id, batch)
+            deleted_count += len(batch)
+        except TelegramBadRequest:
+            # Пачка не удалилась целиком - пробуем по одному, чтобы удалить хотя бы часть
+            for message_id in batch:
                 try:
-                    await bot.delete_message(admin_id, message_id)
+                    await schedule_send(admin_id, bot.delete_message, admin_id, message_id)
                     deleted_count += 1
-                    await asyncio.sleep(0.1)  # Небольшая задержка между удалениями
                 except Exception as e:
-                    print(f"⚠️ Не удалось удалить сообщение {message_id}: {e}")
+                    logger.warning("⚠️ Не удалось удалить сообщение %s: %s", message_id, e)
+        except Exception as e:
+            logger.warning("⚠️ Не удалось удалить сообщения %s у админа %s: %s", batch, admin_id, e)
+    return deleted_count
+
+
+async def delete_news_messages(admin_id: int, news_id: str):
+    """Удаляет все сообщения связанные с конкретной новостью у админа"""
+    try:
+        message_ids = await get_admin_messages(admin_id, news_id)
+        if message_ids:
+            deleted_count = await delete_admin_messages(admin_id, message_ids)
 
             # Удаляем запись о сообщениях
-            del admin_message_ids[admin_id][news_id]
-            print(f"✅ Удалено {deleted_count} сообщений новости у админа {admin_id}")
+            await remove_admin_messages(admin_id, news_id)
+            logger.debug("✅ Удалено %s сообщений новости у админа %s", deleted_count, admin_id)
+
+    except Exception as e:
+        logger.error("❌ Ошибка при удалении сообщений новости: %s", e)
+
+
+async def delete_news_messages_for_all(news_id: str):
+    """Удаляет карточки новости у ВСЕХ админов одновременно"""
+    try:
+        messages = await get_news_messages(news_id)
+        if not messages:
+            return
+
+        counts = await asyncio.gather(
+            *(delete_admin_messages(admin_id, message_ids) for admin_id, message_ids in messages.items())
+        )
+        await remove_news_messages(news_id)
+        logger.info("✅ Удалено %s сообщений новости у %s админов", sum(counts), len(messages))
 
     except Exception as e:
-        print(f"❌ Ошибка при удалении сообщений новости: {e}")
+        logger.error("❌ Ошибка при удалении сообщений новости: %s", e)
 
 
 # Геттеры для доступа к данным из других модулей
-def get_pending_raw_news():
-    return pending_raw_news
+async def get_pending_raw_news(news_id: str):
+    return await get_pending_news(news_id, STAGE_RAW)
 
 
-def get_pending_processed_news():
-    return pending_processed_news
+async def get_pending_processed_news(news_id: str):
+    return await get_pending_news(news_id, STAGE_PROCESSED)
 
 
-def remove_from_pending_raw_news(news_id):
-    if news_id in pending_raw_news:
-        pending_raw_news.pop(news_id, None)
+async def remove_from_pending_raw_news(news_id):
+    await remove_pending_news(news_id)
 
 
-def remove_from_pending_processed_news(news_id):
-    if news_id in pending_processed_news:
-        pending_processed_news.pop(news_id, None)
\ No newline at end of file
+async def remove_from_pending_processed_news(news_id):
+    await remove_pending_news(news_id)
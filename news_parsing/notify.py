@@ -0,0 +1,43 @@
+import asyncio
+import logging
+import socket
+
+logger = logging.getLogger(__name__)
+
+# Канал пробуждения между процессами: воркеры шлют короткую UDP-датаграмму процессу бота.
+# Потеря датаграммы не страшна - диспетчеры все равно периодически проверяют базу.
+WAKEUP_HOST = "127.0.0.1"
+WAKEUP_PORT = 47651
+
+# Каналы пробуждения
+CHANNEL_MODERATION = "moderation"  # в очереди модерации появились новости
+
+
+def send_wakeup(channel: str):
+    """Отправляет сигнал пробуждения процессу бота (без ожидания ответа)"""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(channel.encode(), (WAKEUP_HOST, WAKEUP_PORT))
+    except OSError:
+        pass
+
+
+class WakeupProtocol(asyncio.DatagramProtocol):
+    def __init__(self, handlers: dict):
+        self.handlers = handlers
+
+    def datagram_received(self, data, addr):
+        handler = self.handlers.get(data.decode(errors="ignore"))
+        if handler:
+            handler()
+
+
+async def start_wakeup_listener(handlers: dict):
+    """Слушает сигналы пробуждения: handlers - словарь канал -> функция без аргументов"""
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: WakeupProtocol(handlers),
+        local_addr=(WAKEUP_HOST, WAKEUP_PORT)
+    )
+    logger.info("📡 Канал пробуждения слушает %s:%s", WAKEUP_HOST, WAKEUP_PORT)
+    return transport
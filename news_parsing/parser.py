@@ -1,35 +1,103 @@
 import asyncio
+import logging
+import os
+import random
 import feedparser
 import requests
 import re
 import html
+import time
 from bs4 import BeautifulSoup
-from config import DEEPSEEK_KEY
-from database import get_sites, is_news_sent, is_news_published, mark_news_sent, add_to_queue, clear_stuck_processing, \
-    get_next_from_queue, mark_queue_processed, get_queue_size
+import metrics
+from config import DEEPSEEK_KEY, ADMINS
+from database import get_sites, is_news_sent, mark_news_sent, add_to_queue, clear_stuck_processing, \
+    get_next_from_queue, mark_queue_processed, release_queue_item, acquire_moderation_lease, \
+    release_moderation_lease, count_active_leases_by_admin
 from news_sender import send_raw_news_to_admin
+from seen_filter import is_link_seen, mark_link_seen
+from snapshot_store import save_snapshot, load_snapshot, KIND_ARTICLE
+from tracing import trace_span
+
+logger = logging.getLogger(__name__)
+
+# Сколько новостей одновременно может быть на модерации в расчете на одного админа
+MODERATION_IN_FLIGHT_PER_ADMIN = 2
+# Страховочная проверка очереди модерации (сек) - на случай истекших аренд
+MODERATION_DISPATCH_INTERVAL = 60
+
+# Событие для пробуждения диспетчера модерации (создается внутри event loop)
+_dispatch_event = None
+
+ARTICLE_FETCH_SECONDS = metrics.histogram(
+    "article_fetch_seconds", "Время загрузки страницы статьи", ("domain", "result"))
+ARTICLE_EXTRACT_SECONDS = metrics.histogram(
+    "article_extract_seconds", "Время извлечения текста статьи из HTML", ("result",))
+DEEPSEEK_SECONDS = metrics.histogram(
+    "deepseek_request_seconds", "Время запроса к DeepSeek", ("result",))
+DEEPSEEK_TOKENS = metrics.counter(
+    "deepseek_tokens_total", "Токены DeepSeek (prompt / completion)", ("kind",))
+
+
+# Заголовки браузера, чтобы избежать блокировки
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+
+# Загрузка страницы статьи
+def fetch_article_html(url: str) -> str:
+    started = time.perf_counter()
+    try:
+        logger.debug("🔍 Загружаем статью: %s", url)
 
+        response = requests.get(url, timeout=4, headers=REQUEST_HEADERS)
+        response.encoding = response.apparent_encoding
+        logger.debug("Статья %s: HTTP %s", url, response.status_code)
+        ARTICLE_FETCH_SECONDS.observe(time.perf_counter() - started, domain=metrics.domain_of(url),
+                                      result=response.status_code)
+        if response.ok:
+            # Снимок уже декодированной страницы: повторное извлечение не зависит от угадывания кодировки
+            save_snapshot(url, response.text.encode("utf-8"), KIND_ARTICLE)
+            return response.text
 
-# Парсинг полного текста статьи
-def get_full_article(url: str) -> str:
-    try:
+        # Сайт отвечает ошибкой (5xx, 403) - вместо страницы ошибки берем сохраненный снимок
+        return _article_from_snapshot(url) or response.text
+
+    except Exception as e:
+        logger.warning("⚠️ Ошибка загрузки %s: %s", url, e)
+        ARTICLE_FETCH_SECONDS.observe(time.perf_counter() - started, domain=metrics.domain_of(url), result="error")
+        # Сайт недоступен - берем страницу из ранее сохраненного снимка
+        return _article_from_snapshot(url) or ""
 
-        print(f"🔍 Парсим статью: {url}")
 
-        # Добавляем заголовки чтобы избежать блокировки
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        }
+def _article_from_snapshot(url: str) -> str:
+    snapshot = load_snapshot(url)
+    if not snapshot:
+        return None
+    logger.info("📦 Статья %s взята из снимка", url)
+    return snapshot.decode("utf-8", errors="replace")
 
-        response = requests.get(url, timeout=4, headers=headers)
-        response.encoding = response.apparent_encoding
-        print(response.status_code)
-        soup = BeautifulSoup(response.text, "html.parser")
+
+# Извлечение текста статьи из HTML
+def extract_article_text(page_html: str) -> str:
+    if not page_html:
+        return ""
+
+    started = time.perf_counter()
+    text = _extract_article_text(page_html)
+    ARTICLE_EXTRACT_SECONDS.observe(time.perf_counter() - started, result="ok" if text else "empty")
+    return text
+
+
+def _extract_article_text(page_html: str) -> str:
+
+    try:
+        soup = BeautifulSoup(page_html, "html.parser")
 
         # Расширенный список селекторов для поиска контента
         selectors = [
@@ -58,7 +126,7 @@ def get_full_article(url: str) -> str:
             found = soup.select(selector)
             if found:
                 article = found[0]
-                print(f"✅ Найден контент по селектору: {selector}")
+                logger.debug("✅ Найден контент по селектору: %s", selector)
                 break
 
         # Если не нашли по селекторам, ищем по структуре
@@ -68,7 +136,7 @@ def get_full_article(url: str) -> str:
             text_blocks = [block for block in text_blocks if len(block.get_text(strip=True)) > 200]
             if text_blocks:
                 article = max(text_blocks, key=lambda x: len(x.get_text(strip=True)))
-                print("✅ Найден контент по размеру текстового блока")
+                logger.debug("✅ Найден контент по размеру текстового блока")
 
         if article:
             # Удаляем ненужные элементы
@@ -81,20 +149,25 @@ def get_full_article(url: str) -> str:
             text = "\n\n".join(paragraphs).strip()
 
             if text:
-                print(f"✅ Успешно извлечен текст: {len(text)} символов, {len(text.split())} слов")
+                logger.debug("✅ Успешно извлечен текст: %s символов", len(text))
                 return text
             else:
-                print("❌ Текст извлечен, но пустой после фильтрации")
+                logger.debug("Текст извлечен, но пустой после фильтрации")
                 return ""
         else:
-            print("❌ Контент не найден на странице")
+            logger.debug("Контент не найден на странице")
             return ""
 
     except Exception as e:
-        print(f"❌ Ошибка парсинга {url}: {e}")
+        logger.error("❌ Ошибка извлечения текста: %s", e)
         return ""
 
 
+# Парсинг полного текста статьи
+def get_full_article(url: str) -> str:
+    return extract_article_text(fetch_article_html(url))
+
+
 # Очистка HTML и мусора
 def clean_text(text: str) -> str:
     text = re.sub(r'<[^>]+>', '', text)  # удаляем все HTML-теги
@@ -115,44 +188,30 @@ async def process_with_deepseek(title: str, body: str) -> str:
     """Обработка текста через DeepSeek после одобрения сырой новости"""
     return paraphrase_with_deepseek(title, body)
 
-# Функция для сравнения текстов до и после обработки
-def print_text_comparison(original_title: str, original_body: str, processed_text: str):
-    print("\n" + "=" * 80)
-    print("📋 СРАВНЕНИЕ ТЕКСТОВ:")
-    print("=" * 80)
-
-    print("\n🔹 ИСХОДНЫЙ ЗАГОЛОВОК:")
-    print("-" * 40)
-    print(original_title)
-
-    print("\n🔹 ИСХОДНЫЙ ТЕКСТ:")
-    print("-" * 40)
-    if original_body and len(original_body.strip()) > 0:
-        print(original_body[:500] + "..." if len(original_body) > 500 else original_body)
-        print(f"(Длина: {len(original_body)} символов, {len(original_body.split())} слов)")
-    else:
-        print("❌ Текст отсутствует")
-        print("(Длина: 0 символов, 0 слов)")
-
-    print("\n🔹 ОБРАБОТАННЫЙ ТЕКСТ (DeepSeek):")
-    print("-" * 40)
-    print(processed_text)
-    print(f"(Длина: {len(processed_text)} символов, {len(processed_text.split())} слов)")
+# Сравнение текстов до и после обработки (подробный вывод - только на уровне DEBUG)
+def log_text_comparison(original_title: str, original_body: str, processed_text: str):
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
 
-    print("\n🔹 СТАТИСТИКА:")
-    print("-" * 40)
-    original_words = len(original_body.split()) if original_body and len(original_body.strip()) > 0 else 0
+    original_body = original_body or ""
+    original_words = len(original_body.split())
     processed_words = len(processed_text.split())
-
-    print(f"Сокращение текста: {original_words} → {processed_words} слов")
-
     if original_words > 0:
-        reduction_percent = ((original_words - processed_words) / original_words * 100)
-        print(f"Сокращение: {reduction_percent:.1f}%")
+        reduction = f"{(original_words - processed_words) / original_words * 100:.1f}%"
     else:
-        print("Сокращение: невозможно вычислить (исходный текст пустой)")
+        reduction = "невозможно вычислить (исходный текст пустой)"
 
-    print("=" * 80 + "\n")
+    logger.debug(
+        "📋 Сравнение текстов: %s → %s слов, сокращение %s\n"
+        "🔹 Исходный заголовок: %s\n"
+        "🔹 Исходный текст (%s символов): %s\n"
+        "🔹 Обработанный текст (%s символов): %s",
+        original_words, processed_words, reduction,
+        original_title,
+        len(original_body), original_body[:500] + "..." if len(original_body) > 500 else original_body,
+        len(processed_text), processed_text,
+        extra={"original_words": original_words, "processed_words": processed_words}
+    )
 
 
 
@@ -160,11 +219,12 @@ def print_text_comparison(original_title: str, original_body: str, processed_tex
 def paraphrase_with_deepseek(title: str, body: str) -> str:
     # Если текст слишком короткий, не используем DeepSeek
     if not body or len(body.strip()) < 80:  # Увеличили порог с 50 до 80
-        print(f"⚠️ Текст слишком короткий ({len(body)} символов), используем заголовок")
+        logger.warning("⚠️ Текст слишком короткий (%s символов), используем заголовок", len(body))
         result = title
-        print_text_comparison(title, body, result)
+        log_text_comparison(title, body, result)
         return result
 
+    started = time.perf_counter()
     try:
         prompt = f"""
         Ты — профессиональный редактор новостного портала. 
@@ -204,6 +264,11 @@ def paraphrase_with_deepseek(title: str, body: str) -> str:
             timeout=30
         )
         data = response.json()
+        DEEPSEEK_SECONDS.observe(time.perf_counter() - started, result=response.status_code)
+        usage = data.get("usage") or {}
+        DEEPSEEK_TOKENS.inc(usage.get("prompt_tokens", 0), kind="prompt")
+        DEEPSEEK_TOKENS.inc(usage.get("completion_tokens", 0), kind="completion")
+
         if "choices" in data and len(data["choices"]) > 0:
             message = data["choices"][0].get("message", {})
             text = message.get("content", "")
@@ -211,18 +276,19 @@ def paraphrase_with_deepseek(title: str, body: str) -> str:
             processed_text = limit_words(text, 180)
 
             # Выводим сравнение текстов
-            print_text_comparison(title, body, processed_text)
+            log_text_comparison(title, body, processed_text)
 
             return processed_text
         else:
-            print("DeepSeek ERROR:", data)
+            logger.error("❌ DeepSeek вернул ошибку: %s", data)
             fallback_text = limit_words(clean_text(f"{title}\n\n{body}"), 180)
-            print_text_comparison(title, body, fallback_text)
+            log_text_comparison(title, body, fallback_text)
             return fallback_text
     except Exception as e:
-        print(f"❌ Ошибка DeepSeek: {e}")
+        logger.error("❌ Ошибка DeepSeek: %s", e)
+        DEEPSEEK_SECONDS.observe(time.perf_counter() - started, result="error")
         fallback_text = title  # Используем только заголовок при ошибке
-        print_text_comparison(title, body, fallback_text)
+        log_text_comparison(title, body, fallback_text)
         return fallback_text
 
 
@@ -231,15 +297,15 @@ async def process_entry(entry):
     title = getattr(entry, "title", "Без названия")
     link = getattr(entry, "link", "")
 
-    print(f"\n🎯 Обрабатываем новость: {title}")
-    print(f"🔗 Ссылка: {link}")
+    logger.info("🎯 Обрабатываем новость: %s", title)
+    logger.info("🔗 Ссылка: %s", link)
 
     # Сначала получаем описание из RSS (часто там есть краткий текст)
     rss_description = getattr(entry, "summary", getattr(entry, "description", ""))
     if rss_description:
         # Очищаем HTML из описания
         rss_description = clean_text(rss_description)
-        print(f"📝 RSS описание: {len(rss_description)} символов")
+        logger.debug("📝 RSS описание: %s символов", len(rss_description))
 
     # Потом пытаемся получить полный текст статьи
     full_article = get_full_article(link)
@@ -256,18 +322,34 @@ async def process_entry(entry):
     return paraphrase_with_deepseek(title, body)
 
 
+# Выбираем лучший источник текста: полная статья или описание из RSS
+def choose_original_text(full_article: str, rss_description: str) -> str:
+    if full_article and len(full_article) > 100:
+        return full_article
+    if rss_description and len(rss_description) > 50:
+        return rss_description
+    return ""
+
+
+# Путь к случайному изображению для новости
+def pick_news_image():
+    image_files = os.listdir("images") if os.path.isdir("images") else []
+    return os.path.join("images", random.choice(image_files)) if image_files else None
+
+
 # Парсинг фида и обработка новостей
 async def parse_feed_and_process(url: str, limit: int = 20) -> int:
     """Парсит RSS и добавляет новости в очередь с ОРИГИНАЛЬНЫМ текстом"""
-    feed = feedparser.parse(url)
+    loop = asyncio.get_running_loop()
+    feed = await loop.run_in_executor(None, feedparser.parse, url)
     added_to_queue = 0
 
     for entry in feed.entries[:limit]:
         link = getattr(entry, 'link', '')
 
         # Проверяем, не была ли уже опубликована или отправлена на модерацию
-        if not await is_news_published(link) and not await is_news_sent(link):
-            print(f"📥 Добавляем новость в очередь: {getattr(entry, 'title', 'Без названия')}")
+        if not await is_link_seen(link):
+            logger.info("📥 Добавляем новость в очередь: %s", getattr(entry, 'title', 'Без названия'))
 
             # Получаем ОРИГИНАЛЬНЫЙ текст (без DeepSeek обработки)
             title = getattr(entry, 'title', 'Без названия')
@@ -277,46 +359,90 @@ async def parse_feed_and_process(url: str, limit: int = 20) -> int:
             if rss_description:
                 rss_description = clean_text(rss_description)
 
-            full_article = get_full_article(link)
+            # Загрузка и разбор страницы не блокируют event loop
+            full_article = await loop.run_in_executor(None, get_full_article, link)
 
-            # Выбираем лучший источник текста
-            if full_article and len(full_article) > 100:
-                original_text = full_article
-            elif rss_description and len(rss_description) > 50:
-                original_text = rss_description
-            else:
-                original_text = ""
-
-            # Получаем путь к случайному изображению
-            import os
-            import random
-            image_files = os.listdir("images")
-            image_path = os.path.join("images", random.choice(image_files)) if image_files else None
+            original_text = choose_original_text(full_article, rss_description)
+            image_path = pick_news_image()
 
             # Добавляем в очередь ОРИГИНАЛЬНЫЙ текст
             await add_to_queue(link, title, original_text, image_path)
+            mark_link_seen(link)
             added_to_queue += 1
+            wake_moderation_dispatcher()
 
             await asyncio.sleep(0.5)
 
     return added_to_queue
 
+def get_moderation_capacity() -> int:
+    """Сколько новостей может одновременно находиться на модерации"""
+    return MODERATION_IN_FLIGHT_PER_ADMIN * max(len(ADMINS), 1)
+
+
+async def get_free_moderation_slots() -> int:
+    """Количество свободных слотов модерации.
+
+    У каждого админа свое окно из MODERATION_IN_FLIGHT_PER_ADMIN новостей: взятые им в работу
+    занимают только его окно, поэтому медленный админ не отнимает слоты у остальных.
+    Новости, которые еще никто не взял, занимают общие свободные слоты.
+    """
+    leases = await count_active_leases_by_admin()
+    unassigned = leases.pop(None, 0)
+    free = sum(max(MODERATION_IN_FLIGHT_PER_ADMIN - leases.get(admin_id, 0), 0) for admin_id in ADMINS)
+    return free - unassigned
+
+
 async def process_multiple_from_queue():
-    """Обрабатывает новости из очереди с учетом блокировки модерации"""
-    from database import is_moderation_locked
+    """Отправляет новости из очереди на модерацию, пока есть свободные слоты"""
+    sent = 0
+    free_slots = await get_free_moderation_slots()
+    while free_slots > 0:
+        result = await process_next_from_queue()
+        if result is None:
+            break  # Свободных новостей нет (остальные захвачены другим процессом или /postnext)
+        if result:
+            sent += 1
+            free_slots -= 1
+    return sent
+
+
+def _get_dispatch_event() -> asyncio.Event:
+    global _dispatch_event
+    if _dispatch_event is None:
+        _dispatch_event = asyncio.Event()
+    return _dispatch_event
+
+
+def wake_moderation_dispatcher():
+    """Будит диспетчер модерации: в очереди новая новость или освободился слот"""
+    _get_dispatch_event().set()
+
 
-    # Проверяем, не заблокирована ли модерация
-    if await is_moderation_locked():
-        print("⏳ Модерация заблокирована - ждем завершения текущей новости")
-        return 0
+async def moderation_dispatcher():
+    """Фоновая отправка новостей на модерацию.
 
-    queue_size = await get_queue_size()
-    if queue_size == 0:
-        return 0
+    Заполняет окно модерации сразу, как только появляется новость в очереди
+    или админ принимает решение, не дожидаясь следующего цикла парсера.
+    """
+    logger.info("📨 Диспетчер модерации запущен!")
+    event = _get_dispatch_event()
 
-    # Берем только одну новость вместо нескольких
-    success = await process_next_from_queue()
-    return 1 if success else 0
+    while True:
+        try:
+            event.clear()
+            sent = await process_multiple_from_queue()
+            if sent:
+                logger.info("✅ Отправлено на модерацию: %s новостей", sent)
+
+            try:
+                await asyncio.wait_for(event.wait(), timeout=MODERATION_DISPATCH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+        except Exception as e:
+            logger.error("❌ Ошибка в диспетчере модерации: %s", e)
+            await asyncio.sleep(MODERATION_DISPATCH_INTERVAL)
 # Проверка новостей и отправка админу
 async def check_news_and_send():
     sites = await get_sites()
@@ -325,27 +451,46 @@ async def check_news_and_send():
 
 
 async def process_next_from_queue():
-    """Обрабатывает следующую новость из очереди - отправляет ОРИГИНАЛЬНЫЙ текст"""
+    """Обрабатывает следующую новость из очереди - отправляет ОРИГИНАЛЬНЫЙ текст.
+
+    True - отправлена, False - новость пропущена,
+    None - свободных новостей нет, новость не удалось взять из очереди или доставить админам
+    (повторять сразу бессмысленно, недоставленная новость остается в очереди).
+    """
     try:
         await clear_stuck_processing()
         queue_item = await get_next_from_queue()
+    except Exception as e:
+        logger.error("❌ Не удалось взять новость из очереди: %s", e)
+        return None
 
-        if not queue_item:
-            return False
+    if not queue_item:
+        return None
 
+    try:
         queue_id, link, title, news_text, image_path = queue_item
 
-        print(f"🎯 Обрабатываем новость из очереди: {title}")
-        print(f"🔗 Ссылка: {link}")
+        logger.info("🎯 Обрабатываем новость из очереди: %s", title)
+        logger.info("🔗 Ссылка: %s", link)
 
         # Проверяем, не была ли уже отправлена на модерацию
         if await is_news_sent(link):
-            print(f"⚠️ Новость уже отправлена на модерацию, пропускаем: {link}")
+            logger.warning("⚠️ Новость уже отправлена на модерацию, пропускаем: %s", link)
             await mark_queue_processed(link)
             return False
 
+        # Занимаем слот модерации до отправки, чтобы параллельный запуск его учел
+        await acquire_moderation_lease(link)
+
         # Отправляем СЫРУЮ (оригинальную) новость на первичное одобрение БЕЗ ФОТО
-        await send_raw_news_to_admin(title, news_text, link)
+        async with trace_span(link, "send_raw"):
+            sent_to_admins = await send_raw_news_to_admin(title, news_text, link)
+
+        if not sent_to_admins:
+            logger.warning("⚠️ Сырая новость не доставлена ни одному админу, оставляем в очереди: %s", link)
+            await release_moderation_lease(link)
+            await release_queue_item(queue_id)
+            return None
 
         # Помечаем как отправленную на модерацию
         await mark_news_sent(link)
@@ -353,67 +498,20 @@ async def process_next_from_queue():
         # Удаляем из очереди после успешной обработки
         await mark_queue_processed(link)
 
-        print(f"✅ Сырая новость отправлена на первичную модерацию")
+        logger.info("✅ Сырая новость отправлена на первичную модерацию")
         return True
 
     except Exception as e:
-        print(f"❌ Ошибка обработки новости из очереди: {e}")
-        if 'queue_item' in locals() and queue_item:
-            await mark_queue_processed(queue_item[1])
-        return False
-async def process_with_deepseek(title: str, body: str) -> str:
-    """Обработка текста через DeepSeek после одобрения сырой новости"""
-    return paraphrase_with_deepseek(title, body)
-# Фоновая проверка
-async def scheduler():
-    """Улучшенный планировщик с блокировкой модерации"""
-    print("🔄 Планировщик парсера запущен!")
-
-    while True:
+        logger.error("❌ Ошибка обработки новости из очереди: %s", e)
         try:
-            # Проверяем новые новости
-            sites = await get_sites()
-            if not sites:
-                print("⚠️ Нет RSS-лент для проверки. Используйте /addsite")
-                await asyncio.sleep(60)
-                continue
-
-            print(f"🔍 Проверяем {len(sites)} RSS-лент...")
-
-            total_added = 0
-            for url in sites:
-                try:
-                    added = await parse_feed_and_process(url, limit=15)
-                    total_added += added
-                    print(f"✅ Добавлено {added} новостей из {url}")
-                    await asyncio.sleep(1)
-                except Exception as e:
-                    print(f"❌ Ошибка парсинга {url}: {e}")
-
-            if total_added > 0:
-                print(f"🎯 Всего добавлено в очередь: {total_added} новостей")
-            else:
-                print("ℹ️ Новых новостей не найдено")
-
-            # Обрабатываем очередь ТОЛЬКО если модерация не заблокирована
-            from database import is_moderation_locked
-            if not await is_moderation_locked():
-                queue_size = await get_queue_size()
-                if queue_size > 0:
-                    print(f"📥 Обрабатываем очередь: {queue_size} новостей")
-                    processed = await process_multiple_from_queue()
-                    print(f"✅ Обработано {processed} новостей из очереди")
-                else:
-                    print("📭 Очередь пуста")
-            else:
-                print("⏳ Модерация заблокирована - пропускаем обработку очереди")
+            # Возвращаем новость в очередь: ошибка может быть временной
+            await release_moderation_lease(queue_item[1])
+            await release_queue_item(queue_item[0])
+        except Exception as release_error:
+            logger.error("❌ Не удалось вернуть новость в очередь: %s", release_error)
+        return None
 
-            # Пауза перед следующим циклом
-            print("⏳ Следующая проверка через 30 секунд...")
-            await asyncio.sleep(30)
-
-        except Exception as e:
-            print(f"❌ Ошибка в планировщике: {e}")
-            print("⏳ Повторная попытка через 60 секунд...")
-            await asyncio.sleep(60)
 
+async def process_with_deepseek(title: str, body: str) -> str:
+    """Обработка текста через DeepSeek после одобрения сырой новости"""
+    return paraphrase_with_deepseek(title, body)
@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import feedparser
+import requests
+import metrics
+from database import get_sites, is_news_queued, add_to_queue, claim_due_feeds, \
+    finish_feed_poll, claim_crawl_link, release_crawl_link
+from notify import send_wakeup, CHANNEL_MODERATION
+from seen_filter import is_link_seen, mark_link_seen
+from tracing import trace_span
+from parser import fetch_article_html, extract_article_text, clean_text, choose_original_text, pick_news_image, \
+    wake_moderation_dispatcher, REQUEST_HEADERS
+from snapshot_store import save_snapshot, KIND_FEED
+
+logger = logging.getLogger(__name__)
+
+# Конвейер сбора новостей: каждая стадия - отдельные воркеры, между стадиями - ограниченные очереди.
+# Если следующая стадия не успевает, очередь заполняется и предыдущая ждет (backpressure).
+#
+#   опрос RSS → дедупликация → загрузка статьи → извлечение текста → запись в очередь модерации
+#
+# Состояние между запусками хранится в БД: processing_queue и news_sent, дальше работает moderation_dispatcher.
+# Конвейер может работать в нескольких процессах (worker.py): ленты и ссылки распределяются
+# через аренды в feed_leases / crawl_leases, поэтому одну статью не скачивают дважды.
+
+# Как часто опрашивать RSS-ленты (сек)
+FEED_POLL_INTERVAL = 30
+# Как часто проверять, не подошел ли срок опроса какой-либо ленты (сек)
+FEED_CLAIM_INTERVAL = 5
+# Сколько записей брать из каждой ленты
+FEED_ENTRIES_LIMIT = 15
+# Таймаут загрузки ленты (сек)
+FEED_FETCH_TIMEOUT = 10
+# Заголовки запроса ленты. Без br: brotli не установлен, такой ответ requests не распакует
+FEED_REQUEST_HEADERS = {
+    'User-Agent': REQUEST_HEADERS['User-Agent'],
+    'Accept': 'application/rss+xml, application/atom+xml, application/xml;q=0.9, text/xml;q=0.9, */*;q=0.1',
+    'Accept-Encoding': 'gzip, deflate',
+}
+
+# Параллельность стадий
+FEED_CONCURRENCY = 4
+DEDUP_CONCURRENCY = 2
+FETCH_CONCURRENCY = 8
+EXTRACT_CONCURRENCY = 2
+STORE_CONCURRENCY = 1
+
+# Размер очереди между стадиями
+STAGE_QUEUE_SIZE = 50
+
+# Аренды (сек): если процесс упал, лента и ссылки освобождаются по истечении срока
+FEED_LEASE_SECONDS = 120
+CRAWL_LEASE_SECONDS = 300
+
+# Идентификатор процесса для аренд
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# ETag / Last-Modified лент для условных запросов (не скачиваем неизмененную ленту)
+_feed_validators = {}
+# Ссылки, которые сейчас идут по конвейеру (чтобы повторный опрос не взял их второй раз)
+_in_pipeline = set()
+# Событие для внеочередного опроса лент (создается внутри event loop)
+_poll_event = None
+_queues = {}
+
+FEED_FETCH_SECONDS = metrics.histogram(
+    "feed_fetch_seconds", "Время загрузки и разбора RSS-ленты", ("domain", "result"))
+FEED_ENTRIES_NEW = metrics.counter(
+    "feed_entries_new_total", "Новые (не виденные ранее) новости из RSS", ("domain",))
+
+
+def _get_poll_event() -> asyncio.Event:
+    global _poll_event
+    if _poll_event is None:
+        _poll_event = asyncio.Event()
+    return _poll_event
+
+
+def wake_feed_poller():
+    """Запускает опрос лент, не дожидаясь таймера (например, после /addsite)"""
+    _get_poll_event().set()
+
+
+def _parse_feed(url: str):
+    """Скачивает и разбирает ленту; None - лента не изменилась с прошлого опроса"""
+    headers = dict(FEED_REQUEST_HEADERS)
+    etag, modified = _feed_validators.get(url, (None, None))
+    if etag:
+        headers["If-None-Match"] = etag
+    if modified:
+        headers["If-Modified-Since"] = modified
+
+    response = requests.get(url, timeout=FEED_FETCH_TIMEOUT, headers=headers)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    _feed_validators[url] = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    # Ленту качаем сами, чтобы сохранить исходные байты: feedparser их наружу не отдает
+    save_snapshot(url, response.content, KIND_FEED)
+    # Заголовки ответа нужны feedparser: кодировка из Content-Type и базовый адрес для относительных ссылок
+    # (feedparser ищет заголовки в нижнем регистре)
+    response_headers = {key.lower(): value for key, value in response.headers.items()}
+    response_headers["content-location"] = response.url
+    return feedparser.parse(response.content, response_headers=response_headers)
+
+
+async def read_feed(url: str) -> list:
+    """Стадия опроса: скачивает ленту и возвращает ее записи"""
+    loop = asyncio.get_running_loop()
+    domain = metrics.domain_of(url)
+    started = time.perf_counter()
+    try:
+        feed = await loop.run_in_executor(None, _parse_feed, url)
+    except Exception:
+        FEED_FETCH_SECONDS.observe(time.perf_counter() - started, domain=domain, result="error")
+        raise
+    finally:
+        await finish_feed_poll(url, FEED_POLL_INTERVAL)
+
+    not_modified = feed is None
+    FEED_FETCH_SECONDS.observe(time.perf_counter() - started, domain=domain,
+                               result="not_modified" if not_modified else "ok")
+    if not_modified:
+        return []
+
+    entries = []
+    for entry in feed.entries[:FEED_ENTRIES_LIMIT]:
+        link = getattr(entry, "link", "")
+        if link:
+            entries.append({
+                "link": link,
+                "title": getattr(entry, "title", "Без названия"),
+                "summary": getattr(entry, "summary", getattr(entry, "description", "")),
+            })
+    return entries
+
+
+async def dedup_entry(item: dict):
+    """Стадия дедупликации: пропускает уже опубликованные и отправленные новости"""
+    link = item["link"]
+    if link in _in_pipeline:
+        return None
+    # Резервируем ссылку сразу, пока другие воркеры этой стадии ждут базу
+    _in_pipeline.add(link)
+
+    # Фильтр Блума отсекает уже виденные ссылки без запросов к базе
+    if await is_link_seen(link):
+        _in_pipeline.discard(link)
+        return None
+    # Ссылку мог уже взять другой процесс-воркер
+    if not await claim_crawl_link(link, WORKER_ID, CRAWL_LEASE_SECONDS):
+        _in_pipeline.discard(link)
+        return None
+    # ...или уже успел положить ее в очередь и освободить аренду
+    if await is_news_queued(link):
+        await _release_link(link)
+        return None
+
+    logger.info("📥 Добавляем новость в очередь: %s", item['title'])
+    FEED_ENTRIES_NEW.inc(domain=metrics.domain_of(link))
+    return item
+
+
+async def fetch_entry(item: dict) -> dict:
+    """Стадия загрузки: скачивает страницу статьи"""
+    loop = asyncio.get_running_loop()
+    async with trace_span(item["link"], "fetch", WORKER_ID):
+        item["html"] = await loop.run_in_executor(None, fetch_article_html, item["link"])
+    return item
+
+
+async def extract_entry(item: dict) -> dict:
+    """Стадия извлечения: достает текст статьи и выбирает лучший источник текста"""
+    loop = asyncio.get_running_loop()
+    async with trace_span(item["link"], "extract"):
+        full_article = await loop.run_in_executor(None, extract_article_text, item.pop("html"))
+        rss_description = clean_text(item["summary"]) if item["summary"] else ""
+        item["text"] = choose_original_text(full_article, rss_description)
+    return item
+
+
+async def store_entry(item: dict):
+    """Стадия записи: кладет новость в очередь модерации и будит диспетчер"""
+    try:
+        async with trace_span(item["link"], "enqueue"):
+            await add_to_queue(item["link"], item["title"], item["text"], pick_news_image())
+        mark_link_seen(item["link"])
+        wake_moderation_dispatcher()
+        # Бот может работать в отдельном процессе
+        send_wakeup(CHANNEL_MODERATION)
+    finally:
+        await _release_link(item["link"])
+
+
+async def _release_link(link: str):
+    _in_pipeline.discard(link)
+    await release_crawl_link(link, WORKER_ID)
+
+
+async def _stage_worker(name: str, handler, inbox: asyncio.Queue, outbox: asyncio.Queue = None):
+    while True:
+        item = await inbox.get()
+        try:
+            result = await handler(item)
+            if outbox is not None and result is not None:
+                # Стадия опроса возвращает список записей, остальные - одну новость
+                for next_item in (result if isinstance(result, list) else [result]):
+                    await outbox.put(next_item)
+        except Exception as e:
+            logger.error("❌ Ошибка на стадии '%s': %s", name, e, extra={"stage": name})
+            if isinstance(item, dict) and item["link"] in _in_pipeline:
+                await _release_link(item["link"])
+        finally:
+            inbox.task_done()
+
+
+async def feed_poller(feeds: asyncio.Queue):
+    """Отправляет на опрос ленты, срок опроса которых наступил (или сразу по wake_feed_poller)"""
+    event = _get_poll_event()
+    while True:
+        try:
+            event.clear()
+            if not await get_sites():
+                logger.warning("⚠️ Нет RSS-лент для проверки. Используйте /addsite")
+            # Забираем не больше лент, чем помещается в очередь опроса
+            for url in await claim_due_feeds(WORKER_ID, feeds.maxsize - feeds.qsize(), FEED_LEASE_SECONDS):
+                await feeds.put(url)
+
+            try:
+                await asyncio.wait_for(event.wait(), timeout=FEED_CLAIM_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+        except Exception as e:
+            logger.error("❌ Ошибка опроса RSS-лент: %s", e)
+            await asyncio.sleep(FEED_POLL_INTERVAL)
+
+
+def get_pipeline_stats() -> dict:
+    """Заполненность очередей между стадиями конвейера"""
+    stats = {name: queue.qsize() for name, queue in _queues.items()}
+    stats["in_pipeline"] = len(_in_pipeline)
+    return stats
+
+
+async def run_pipeline():
+    """Запускает все стадии конвейера и работает до отмены"""
+    logger.info("🔄 Конвейер сбора новостей запущен!")
+
+    feeds = asyncio.Queue(STAGE_QUEUE_SIZE)
+    entries = asyncio.Queue(STAGE_QUEUE_SIZE)
+    to_fetch = asyncio.Queue(STAGE_QUEUE_SIZE)
+    to_extract = asyncio.Queue(STAGE_QUEUE_SIZE)
+    to_store = asyncio.Queue(STAGE_QUEUE_SIZE)
+    _queues.update(feeds=feeds, entries=entries, fetch=to_fetch, extract=to_extract, store=to_store)
+
+    stages = [
+        ("опрос RSS", read_feed, feeds, entries, FEED_CONCURRENCY),
+        ("дедупликация", dedup_entry, entries, to_fetch, DEDUP_CONCURRENCY),
+        ("загрузка", fetch_entry, to_fetch, to_extract, FETCH_CONCURRENCY),
+        ("извлечение", extract_entry, to_extract, to_store, EXTRACT_CONCURRENCY),
+        ("запись", store_entry, to_store, None, STORE_CONCURRENCY),
+    ]
+
+    tasks = [asyncio.create_task(feed_poller(feeds))]
+    for name, handler, inbox, outbox, concurrency in stages:
+        for _ in range(concurrency):
+            tasks.append(asyncio.create_task(_stage_worker(name, handler, inbox, outbox)))
+
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Профилирование работающего процесса по команде /profile N - без перезапуска под профайлером.
+# Сэмплирующий профайлер (отдельный поток снимает стеки всех потоков), монитор задержки event loop
+# и медленные callback'и из режима отладки asyncio.
+
+# Как часто снимать стеки (сек)
+PROFILE_SAMPLE_INTERVAL = 0.005
+# Как часто замерять задержку event loop (сек)
+LOOP_LAG_INTERVAL = 0.1
+# Callback дольше этого времени считается медленным (loop.slow_callback_duration)
+SLOW_CALLBACK_SECONDS = 0.1
+# Ограничения длительности сеанса (сек)
+PROFILE_DEFAULT_SECONDS = 30
+PROFILE_MAX_SECONDS = 600
+# Сколько строк в отчете о блокирующих вызовах
+PROFILE_TOP_N = 15
+
+# Функции, в которых простаивают фоновые потоки (executor, aiosqlite, логирование) - их не показываем
+IDLE_FUNCTIONS = {"wait", "dequeue", "get", "select", "poll", "_poll", "_worker"}
+
+# Код проекта - по нему определяем место вызова, которое блокирует event loop
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Идет ли сейчас сеанс профилирования (одновременно - только один)
+_profile_lock = None
+
+
+def _get_profile_lock() -> asyncio.Lock:
+    global _profile_lock
+    if _profile_lock is None:
+        _profile_lock = asyncio.Lock()
+    return _profile_lock
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def walk_stack(frame) -> list:
+    """Стек от корня к текущему кадру"""
+    stack = []
+    while frame is not None:
+        stack.append(frame)
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def is_loop_idle(frame) -> bool:
+    """Event loop ничего не выполняет, а ждет событий в select()"""
+    code = frame.f_code
+    return code.co_name in ("select", "poll", "_poll") and os.path.basename(code.co_filename) == "selectors.py"
+
+
+def project_frame(stack: list):
+    """Самый глубокий кадр кода проекта - место, откуда пришел блокирующий вызов"""
+    for frame in reversed(stack):
+        if os.path.dirname(os.path.abspath(frame.f_code.co_filename)) == PROJECT_DIR:
+            return frame
+    return None
+
+
+def project_call_site(stack: list):
+    frame = project_frame(stack)
+    return f"{frame_label(frame)}:{frame.f_lineno}" if frame else None
+
+
+class ProfileSession:
+    """Один сеанс профилирования: сэмплы стеков, задержки event loop и медленные callback'и"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+        self.stacks = Counter()  # свернутый стек -> число сэмплов (формат flamegraph.pl / speedscope)
+        self.blocking = Counter()  # (место вызова в проекте, функция) -> сэмплы, когда loop был занят
+        self.loop_samples = 0
+        self.busy_samples = 0
+        self.lags = []
+        self.slow_callbacks = []
+        self.started = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+
+    def sample(self):
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own_id = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = walk_stack(frame)
+            name = thread_names.get(thread_id, str(thread_id))
+            if thread_id == self.loop_thread_id:
+                self.loop_samples += 1
+                if is_loop_idle(frame):
+                    self.stacks[f"{name};(idle)"] += 1
+                    continue
+                self.busy_samples += 1
+                self.blocking[(project_call_site(stack) or "-", frame_label(frame))] += 1
+            elif frame.f_code.co_name in IDLE_FUNCTIONS:
+                # Простаивающие потоки (executor ждет задач) только засоряют flamegraph
+                continue
+            self.stacks[";".join([name] + [frame_label(f) for f in stack])] += 1
+
+    def _sampler(self):
+        while not self._stop.wait(PROFILE_SAMPLE_INTERVAL):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.debug("Ошибка снятия сэмпла: %s", e)
+
+    async def _lag_monitor(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.lags.append(max(0.0, time.perf_counter() - started - LOOP_LAG_INTERVAL))
+
+    async def run(self, seconds: float):
+        slow_handler = _SlowCallbackHandler(self.slow_callbacks)
+        asyncio_logger = logging.getLogger("asyncio")
+        asyncio_logger.addHandler(slow_handler)
+        previous_debug = self.loop.get_debug()
+        previous_threshold = self.loop.slow_callback_duration
+        self.loop.set_debug(True)
+        self.loop.slow_callback_duration = SLOW_CALLBACK_SECONDS
+
+        sampler = threading.Thread(target=self._sampler, name="profiler", daemon=True)
+        lag_task = asyncio.create_task(self._lag_monitor())
+        self.started = time.perf_counter()
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self._stop.set()
+            lag_task.cancel()
+            self.duration = time.perf_counter() - self.started
+            await self.loop.run_in_executor(None, sampler.join)
+            self.loop.set_debug(previous_debug)
+            self.loop.slow_callback_duration = previous_threshold
+            asyncio_logger.removeHandler(slow_handler)
+
+    def folded(self) -> str:
+        """Свернутые стеки: 'поток;файл:функция;... число' - вход для flamegraph.pl и speedscope"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def report(self, top_n: int = PROFILE_TOP_N) -> str:
+        sample_ms = self.duration * 1000 / self.loop_samples if self.loop_samples else 0
+        lags = sorted(self.lags)
+        lines = [
+            f"Длительность: {self.duration:.1f} с, сэмплов event loop: {self.loop_samples}",
+            f"Event loop занят: {self.busy_samples * 100 / max(self.loop_samples, 1):.1f}% времени",
+        ]
+        if lags:
+            p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+            lines.append(f"Задержка loop: сред. {sum(lags) / len(lags) * 1000:.1f} мс, "
+                         f"p99 {p99 * 1000:.1f} мс, макс. {lags[-1] * 1000:.1f} мс")
+        lines.append(f"Медленных callback'ов (> {SLOW_CALLBACK_SECONDS * 1000:.0f} мс): {len(self.slow_callbacks)}")
+
+        lines.append("")
+        lines.append(f"Топ-{top_n} блокирующих вызовов (место в проекте ← функция):")
+        if not self.blocking:
+            lines.append("  нет")
+        for (call_site, function), count in self.blocking.most_common(top_n):
+            lines.append(f"  {count * sample_ms:7.0f} мс  {call_site} ← {function}")
+
+        if self.slow_callbacks:
+            lines.append("")
+            lines.append("Самые медленные callback'и:")
+            for took, text in sorted(self.slow_callbacks, reverse=True)[:5]:
+                lines.append(f"  {took * 1000:7.0f} мс  {text[:150]}")
+        return "\n".join(lines)
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """Забирает предупреждения asyncio 'Executing <Handle ...> took X seconds'"""
+
+    def __init__(self, records: list):
+        super().__init__(logging.WARNING)
+        self.records = records
+
+    def emit(self, record: logging.LogRecord):
+        if isinstance(record.msg, str) and record.msg.startswith("Executing") and len(record.args or ()) == 2:
+            handle, took = record.args
+            # Из '<Task ... coro=<busy() running at file.py:8> ...>' оставляем только корутину и строку
+            match = re.search(r"coro=<(.+?)>", str(handle))
+            self.records.append((took, match.group(1) if match else str(handle)))
+
+
+async def run_profile(seconds: float) -> ProfileSession:
+    """Профилирует текущий процесс seconds секунд. Если сеанс уже идет, возвращает None"""
+    lock = _get_profile_lock()
+    if lock.locked():
+        return None
+    async with lock:
+        session = ProfileSession(asyncio.get_running_loop())
+        logger.info("🔬 Профилирование запущено на %s сек", seconds)
+        await session.run(seconds)
+        logger.info("🔬 Профилирование завершено: %s сэмплов", session.loop_samples)
+        return session
@@ -0,0 +1,293 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from config import CHANNEL_ID
+from database import add_to_outbox, claim_due_publications, mark_publication_done, mark_publication_failed, \
+    reset_inflight_publications, mark_news_published, save_publication_progress, mark_publication_unverified, \
+    release_publications
+from image_variants import get_variant
+from news_sender import send_photo_cached, send_long_message, broadcast_to_admins
+from site_poster import post_news_to_site, post_news_batch, SiteCreateUncertain
+from tracing import record_span
+
+logger = logging.getLogger(__name__)
+
+# Площадки публикации
+DESTINATION_SITE = "site"
+DESTINATION_TELEGRAM = "telegram"
+
+# Настройки фоновой доставки
+OUTBOX_CONCURRENCY = 10  # Сколько задач доставляется одновременно
+OUTBOX_POLL_INTERVAL = 15  # Как часто проверять отложенные повторы (сек)
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = 30  # Базовая задержка повтора (удваивается с каждой попыткой)
+# Задача дольше этого в in_progress считается брошенной (доставка упала, не записав результат)
+OUTBOX_CLAIM_TIMEOUT = 15 * 60
+
+# Максимальная длина подписи к фото в Telegram
+MAX_CAPTION_LENGTH = 1024
+
+DESTINATION_NAMES = {
+    DESTINATION_SITE: "🌐 на сайте",
+    DESTINATION_TELEGRAM: "✅ в Telegram",
+}
+
+# Событие для мгновенного пробуждения диспетчера при новой задаче (создается внутри event loop)
+_outbox_event = None
+
+
+def _get_outbox_event() -> asyncio.Event:
+    global _outbox_event
+    if _outbox_event is None:
+        _outbox_event = asyncio.Event()
+    return _outbox_event
+
+
+# Повтор задачи outbox продолжает доставку с невыполненного шага: выполненные шаги
+# (id отправленных сообщений, id новости на сайте) сохраняются в progress задачи.
+
+async def publish_to_telegram(news_text: str, image_path: str, progress: dict, save_progress) -> bool:
+    """Публикует новость в Telegram-канал (фото + текст)"""
+    if not image_path or not os.path.exists(image_path):
+        raise FileNotFoundError(f"Изображение не найдено: {image_path}")
+
+    long_text = len(news_text) > MAX_CAPTION_LENGTH
+    if "photo_message_id" not in progress:
+        photo_path = await get_variant(image_path, "telegram")
+        if long_text:
+            # Если текст длинный - отправляем фото без текста, а текст отдельно
+            message = await send_photo_cached(CHANNEL_ID, photo_path)
+        else:
+            # Если текст помещается в подпись к фото
+            message = await send_photo_cached(CHANNEL_ID, photo_path, caption=news_text, parse_mode="HTML")
+        progress["photo_message_id"] = message.message_id
+        await save_progress()
+
+    if long_text:
+        async def on_part_sent(index: int, message):
+            progress["text_parts_sent"] = index + 1
+            await save_progress()
+
+        await send_long_message(CHANNEL_ID, news_text, "", start_part=progress.get("text_parts_sent", 0),
+                                on_part_sent=on_part_sent)
+    return True
+
+
+async def publish_to_site(news_text: str, image_path: str, progress: dict, save_progress) -> bool:
+    """Публикует новость на сайт через API"""
+    if "site_news_id" in progress:
+        return True  # Новость уже создана прошлой попыткой
+
+    result = await post_news_to_site(news_text, image_path)
+    if result:
+        progress["site_news_id"] = result
+        await save_progress()
+    return bool(result)
+
+
+PUBLISHERS = {
+    DESTINATION_SITE: publish_to_site,
+    DESTINATION_TELEGRAM: publish_to_telegram,
+}
+
+
+def wake_outbox_dispatcher():
+    """Будит диспетчер публикаций, не дожидаясь таймера"""
+    _get_outbox_event().set()
+
+
+async def enqueue_publication(link: str, destinations: list, news_text: str, image_path: str) -> int:
+    """Ставит новость в очередь публикации и будит диспетчер"""
+    added = await add_to_outbox(link, destinations, news_text, image_path)
+    wake_outbox_dispatcher()
+    return added
+
+
+async def notify_admins(text: str):
+    """Отправляет уведомление всем админам"""
+    await broadcast_to_admins(text)
+
+
+def _load_progress(item) -> dict:
+    return json.loads(item[6]) if item[6] else {}
+
+
+async def deliver_publication(item):
+    """Доставляет одну задачу outbox и фиксирует результат"""
+    outbox_id, link, destination, news_text, image_path, attempts, _ = item
+    progress = _load_progress(item)
+
+    async def save_progress():
+        await save_publication_progress(outbox_id, progress)
+
+    started_at, started = time.time(), time.perf_counter()
+    uncertain = False
+    try:
+        publisher = PUBLISHERS[destination]
+        success = await publisher(news_text, image_path, progress, save_progress)
+        error = None if success else "площадка вернула ошибку"
+    except SiteCreateUncertain as e:
+        success, uncertain, error = False, True, str(e)
+    except Exception as e:
+        success = False
+        error = str(e) or e.__class__.__name__
+
+    await record_span(link, f"publish_{destination}", started_at, time.perf_counter() - started,
+                      "ok" if success else "error", error)
+    if uncertain:
+        await record_unverified_delivery(item, error)
+    else:
+        await record_delivery_result(item, success, error)
+
+
+async def deliver_site_batch(items: list):
+    """Доставляет несколько задач для сайта одной пакетной публикацией"""
+    # Задачи, новость которых уже создана прошлой попыткой, повторно не публикуем
+    done = [item for item in items if "site_news_id" in _load_progress(item)]
+    for item in done:
+        await record_delivery_result(item, True)
+    items = [item for item in items if item not in done]
+    if not items:
+        return
+
+    started_at, started = time.time(), time.perf_counter()
+    try:
+        results = await post_news_batch([(item[3], item[4]) for item in items])
+    except Exception as e:
+        results = [e] * len(items)
+
+    duration = time.perf_counter() - started
+    for item, result in zip(items, results):
+        try:
+            await _record_batch_result(item, result, started_at, duration, len(items))
+        except Exception as e:
+            # Ошибка записи результата одной задачи не должна оставить остальные захваченными
+            logger.error("❌ Outbox #%s: не удалось записать результат публикации: %s", item[0], e)
+            await release_publications([item[0]], str(e) or e.__class__.__name__, OUTBOX_RETRY_DELAY)
+
+
+async def _record_batch_result(item, result, started_at: float, duration: float, batch_size: int):
+    """Записывает результат одной задачи из пакета: ID новости, False или исключение"""
+    if isinstance(result, Exception):
+        error = str(result) or result.__class__.__name__
+    else:
+        error = None if result else "площадка вернула ошибку"
+    await record_span(item[1], f"publish_{item[2]}", started_at, duration,
+                      "ok" if result and not error else "error", error or f"пакет из {batch_size}")
+
+    if isinstance(result, SiteCreateUncertain):
+        await record_unverified_delivery(item, error)
+    elif result and not error:
+        await save_publication_progress(item[0], {**_load_progress(item), "site_news_id": result})
+        await record_delivery_result(item, True)
+    else:
+        await record_delivery_result(item, False, error)
+
+
+async def record_unverified_delivery(item, error: str):
+    """Площадка могла принять запрос, но ответа нет: повтор создал бы дубль, поэтому ждем проверки админом"""
+    outbox_id, link, destination = item[:3]
+    destination_name = DESTINATION_NAMES.get(destination, destination)
+    await mark_publication_unverified(outbox_id, error)
+    logger.warning("⚠️ Outbox #%s: неизвестно, опубликована ли новость %s (%s)", outbox_id, destination_name, error,
+                   extra={"outbox_id": outbox_id, "destination": destination, "link": link})
+    await notify_admins(f"⚠️ Неизвестно, опубликована ли новость {destination_name}: {error}\n{link}\n"
+                        f"Проверьте вручную. Если новости нет - /retrypublish {outbox_id}")
+
+
+async def record_delivery_result(item, success: bool, error: str = None):
+    """Фиксирует результат доставки: успех, повтор с задержкой или окончательная ошибка"""
+    outbox_id, link, destination, news_text, image_path, attempts, _ = item
+    destination_name = DESTINATION_NAMES.get(destination, destination)
+
+    if success:
+        await mark_publication_done(outbox_id)
+        await mark_news_published(link)
+        logger.info("✅ Outbox #%s: новость опубликована %s", outbox_id, destination_name,
+                    extra={"outbox_id": outbox_id, "destination": destination, "link": link})
+        await notify_admins(f"Новость опубликована {destination_name}!\n{link}")
+        return
+
+    attempts += 1
+    if attempts >= OUTBOX_MAX_ATTEMPTS:
+        await mark_publication_failed(outbox_id, error)
+        logger.error("❌ Outbox #%s: не удалось опубликовать %s после %s попыток: %s",
+                     outbox_id, destination_name, attempts, error,
+                     extra={"outbox_id": outbox_id, "destination": destination, "link": link})
+        await notify_admins(f"❌ Не удалось опубликовать новость {destination_name} "
+                            f"после {attempts} попыток.\n{link}\nОшибка: {error}\n"
+                            f"Повторить: /retrypublish {outbox_id}")
+    else:
+        delay = OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+        await mark_publication_failed(outbox_id, error, retry_in_seconds=delay)
+        logger.warning("⚠️ Outbox #%s: ошибка публикации %s (%s), повтор через %s сек",
+                       outbox_id, destination_name, error, delay,
+                       extra={"outbox_id": outbox_id, "destination": destination, "link": link})
+
+
+async def _guarded_delivery(coro, items: list):
+    """Выполняет доставку; если она упала (например, база заблокирована при записи результата),
+    возвращает еще захваченные задачи в очередь с задержкой, а не оставляет их в in_progress"""
+    try:
+        await coro
+    except Exception as e:
+        error = str(e) or e.__class__.__name__
+        logger.exception("❌ Outbox: доставка задач %s прервана: %s", [item[0] for item in items], error)
+        try:
+            await release_publications([item[0] for item in items], error, OUTBOX_RETRY_DELAY)
+        except Exception as release_error:
+            # Не удалось и это - задачи вернет проверка зависших по OUTBOX_CLAIM_TIMEOUT
+            logger.error("❌ Outbox: не удалось вернуть задачи в очередь: %s", release_error)
+
+
+async def outbox_dispatcher():
+    """Фоновая доставка очереди публикаций, каждая площадка - независимо.
+
+    Задачи выполняются параллельно (до OUTBOX_CONCURRENCY), поэтому медленный сайт
+    не задерживает публикации в Telegram и наоборот.
+    """
+    logger.info("📤 Диспетчер публикаций запущен!")
+    await reset_inflight_publications()
+
+    event = _get_outbox_event()
+    in_flight = {}  # задача -> сколько записей outbox она доставляет
+
+    def on_done(task):
+        in_flight.pop(task, None)
+        event.set()  # Освободились слоты - можно забрать следующие задачи
+
+    def start(coro, items: list):
+        task = asyncio.create_task(_guarded_delivery(coro, items))
+        in_flight[task] = len(items)
+        task.add_done_callback(on_done)
+
+    while True:
+        try:
+            event.clear()
+            # Задачи, захват которых не снят (упавшая доставка, потерянный процесс), возвращаем в очередь
+            stale = await reset_inflight_publications(older_than_seconds=OUTBOX_CLAIM_TIMEOUT)
+            if stale:
+                logger.warning("⚠️ Outbox: %s зависших задач возвращены в очередь", stale)
+
+            free_slots = OUTBOX_CONCURRENCY - sum(in_flight.values())
+            if free_slots > 0:
+                items = await claim_due_publications(free_slots)
+
+                # Новости для сайта публикуем пакетом (один вход, параллельная загрузка картинок)
+                site_items = [item for item in items if item[2] == DESTINATION_SITE]
+                if site_items:
+                    start(deliver_site_batch(site_items), site_items)
+                for item in items:
+                    if item[2] != DESTINATION_SITE:
+                        start(deliver_publication(item), [item])
+
+            try:
+                await asyncio.wait_for(event.wait(), timeout=OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+        except Exception as e:
+            logger.error("❌ Ошибка в диспетчере публикаций: %s", e)
+            await asyncio.sleep(OUTBOX_POLL_INTERVAL)
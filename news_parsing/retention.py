@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+import metrics
+from database import DB_NAME, delete_rows_batch, get_db_page_stats, enable_incremental_vacuum, incremental_vacuum, \
+    optimize_db
+
+logger = logging.getLogger(__name__)
+
+# Хранение и сжатие базы: устаревшие строки удаляются небольшими пакетами (каждый - отдельная короткая
+# транзакция, между пакетами пауза для других писателей), освободившиеся страницы возвращаются ОС
+# через incremental_vacuum, статистика планировщика обновляется ANALYZE / PRAGMA optimize.
+
+# Сроки хранения (дней). RSS-ленты хранят записи недели, поэтому ссылки старше срока уже не вернутся в ленту
+RETENTION_NEWS_SENT_DAYS = int(os.getenv("RETENTION_NEWS_SENT_DAYS", "180"))
+RETENTION_PUBLISHED_DAYS = int(os.getenv("RETENTION_PUBLISHED_DAYS", "365"))
+# Новость, которая неделями не дошла до модерации, уже неактуальна
+RETENTION_QUEUE_DAYS = int(os.getenv("RETENTION_QUEUE_DAYS", "14"))
+RETENTION_OUTBOX_DAYS = int(os.getenv("RETENTION_OUTBOX_DAYS", "90"))
+RETENTION_TRACE_DAYS = int(os.getenv("RETENTION_TRACE_DAYS", "14"))
+# Новости, по которым модераторы так и не приняли решение (кнопки в старых сообщениях перестают работать)
+RETENTION_PENDING_DAYS = int(os.getenv("RETENTION_PENDING_DAYS", "30"))
+# Истекшие аренды больше ничего не блокируют
+RETENTION_LEASE_DAYS = 1
+
+# Как часто запускать очистку (сек)
+RETENTION_INTERVAL = 6 * 3600
+# Строк в одном пакете удаления и пауза между пакетами (сек)
+RETENTION_BATCH_SIZE = 500
+RETENTION_BATCH_PAUSE = 0.05
+# Страниц за один шаг incremental_vacuum
+RETENTION_VACUUM_PAGES = 1000
+# Напоминать о разовом переводе базы в auto_vacuum=INCREMENTAL, если свободно больше этой доли
+RETENTION_FULL_VACUUM_RATIO = 0.2
+# Полный ANALYZE - не чаще раза в сутки, в остальных запусках - PRAGMA optimize
+RETENTION_ANALYZE_INTERVAL = 24 * 3600
+
+# Таблица, условие устаревания (параметр - срок вида '-N days'), срок в днях (None - условие без срока)
+RETENTION_RULES = [
+    ("news_sent", "sent_at < datetime('now', ?)", RETENTION_NEWS_SENT_DAYS),
+    ("published_news", "published_at < datetime('now', ?)", RETENTION_PUBLISHED_DAYS),
+    ("processing_queue", "is_processing = FALSE AND created_at < datetime('now', ?)", RETENTION_QUEUE_DAYS),
+    ("pending_news", "created_at < datetime('now', ?)", RETENTION_PENDING_DAYS),
+    # Сообщения модерации удаленных новостей - после pending_news, чтобы убрать и только что осиротевшие
+    ("admin_messages", "news_id NOT IN (SELECT news_id FROM pending_news)", None),
+    ("publish_outbox", "status IN ('done', 'failed', 'needs_check') AND updated_at < datetime('now', ?)", RETENTION_OUTBOX_DAYS),
+    ("trace_spans", "started_at < CAST(strftime('%s', 'now', ?) AS REAL)", RETENTION_TRACE_DAYS),
+    ("moderation_leases", "leased_until < datetime('now', ?)", RETENTION_LEASE_DAYS),
+    ("crawl_leases", "leased_until < datetime('now', ?)", RETENTION_LEASE_DAYS),
+]
+
+RETENTION_DELETED_ROWS = metrics.counter(
+    "retention_deleted_rows_total", "Строки, удаленные по сроку хранения", ("table",))
+RETENTION_RUN_SECONDS = metrics.histogram(
+    "retention_run_seconds", "Длительность очистки и сжатия базы", buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300))
+DB_FILE_BYTES = metrics.gauge("sqlite_file_bytes", "Размер файла базы")
+DB_FREE_PAGES = metrics.gauge("sqlite_freelist_pages", "Свободные страницы в файле базы")
+
+_last_analyze = 0.0
+
+
+async def purge_table(table: str, condition: str, days: int = None) -> int:
+    """Удаляет устаревшие строки таблицы пакетами, возвращает количество удаленных"""
+    deleted = 0
+    params = (f"-{days} days",) if days is not None else ()
+    while True:
+        count = await delete_rows_batch(table, condition, params, RETENTION_BATCH_SIZE)
+        deleted += count
+        if count < RETENTION_BATCH_SIZE:
+            break
+        await asyncio.sleep(RETENTION_BATCH_PAUSE)
+    if deleted:
+        RETENTION_DELETED_ROWS.inc(deleted, table=table)
+    return deleted
+
+
+async def compact_db():
+    """Возвращает ОС место, освободившееся после удаления"""
+    stats = await get_db_page_stats()
+    if not stats["freelist_count"]:
+        return
+
+    if stats["auto_vacuum"] != 2:
+        # База создана до включения auto_vacuum. Полный VACUUM держит базу заблокированной на все время
+        # перезаписи - в работающем боте его не запускаем, только подсказываем разовое обслуживание
+        if stats["freelist_count"] >= stats["page_count"] * RETENTION_FULL_VACUUM_RATIO:
+            logger.warning("⚠️ В базе свободно %s из %s страниц, но auto_vacuum выключен. Остановите бота и "
+                           "воркеры и выполните: python retention.py --convert",
+                           stats["freelist_count"], stats["page_count"])
+        return
+
+    free_pages = stats["freelist_count"]
+    while free_pages > 0:
+        await incremental_vacuum(RETENTION_VACUUM_PAGES)
+        free_pages -= RETENTION_VACUUM_PAGES
+        await asyncio.sleep(RETENTION_BATCH_PAUSE)
+
+
+async def run_retention() -> dict:
+    """Один проход: удаление по срокам хранения, сжатие файла и обновление статистики"""
+    global _last_analyze
+    started = time.perf_counter()
+    deleted = {}
+    for table, condition, days in RETENTION_RULES:
+        try:
+            deleted[table] = await purge_table(table, condition, days)
+        except Exception as e:
+            logger.error("❌ Ошибка очистки таблицы %s: %s", table, e, extra={"table": table})
+
+    await compact_db()
+    analyze = time.time() - _last_analyze >= RETENTION_ANALYZE_INTERVAL
+    await optimize_db(analyze=analyze)
+    if analyze:
+        _last_analyze = time.time()
+
+    stats = await get_db_page_stats()
+    DB_FILE_BYTES.set(os.path.getsize(DB_NAME))
+    DB_FREE_PAGES.set(stats["freelist_count"])
+    RETENTION_RUN_SECONDS.observe(time.perf_counter() - started)
+
+    total = sum(deleted.values())
+    if total:
+        logger.info("🧹 Очистка базы: удалено %s строк (%s)", total,
+                    ", ".join(f"{table}: {count}" for table, count in deleted.items() if count))
+    return deleted
+
+
+async def retention_loop():
+    """Периодическая очистка базы, работает до отмены"""
+    logger.info("🧹 Очистка базы запущена (каждые %s ч)", RETENTION_INTERVAL // 3600)
+    while True:
+        try:
+            await run_retention()
+        except Exception as e:
+            logger.error("❌ Ошибка очистки базы: %s", e)
+        await asyncio.sleep(RETENTION_INTERVAL)
+
+
+async def convert_db():
+    """Разовый перевод старой базы в auto_vacuum=INCREMENTAL (полный VACUUM)"""
+    stats = await get_db_page_stats()
+    if stats["auto_vacuum"] == 2:
+        print("✅ auto_vacuum=INCREMENTAL уже включен")
+        return
+    print(f"🗜️ Полный VACUUM: {stats['page_count']} страниц, свободно {stats['freelist_count']}...")
+    await enable_incremental_vacuum()
+    print(f"✅ Готово, размер базы: {os.path.getsize(DB_NAME) / 1024 / 1024:.1f} МБ")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Очистка и сжатие базы")
+    arg_parser.add_argument("--convert", action="store_true",
+                            help="перевести базу в auto_vacuum=INCREMENTAL (бот и воркеры должны быть остановлены)")
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(convert_db() if args.convert else run_retention())
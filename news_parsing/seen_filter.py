@@ -0,0 +1,233 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+import metrics
+from database import get_seen_links_since, get_id_sequences, is_link_key_seen, canonical_link
+from file_cache import cache_path
+from retention import RETENTION_NEWS_SENT_DAYS, RETENTION_PUBLISHED_DAYS
+
+logger = logging.getLogger(__name__)
+
+# Фильтр Блума уже виденных ссылок перед проверками дедупликации в БД.
+# В фильтре - канонические ключи ссылок (link_key, см. database.canonical_link). Отрицательный ответ точен -
+# такого ключа нет ни в очереди, ни в news_sent, ни в published_news, и к базе не обращаемся.
+# Положительный может быть ложным, поэтому подтверждается запросом по тому же ключу к этим трем таблицам.
+#
+# Каждый процесс (бот и воркеры) держит свою копию и догоняет записи других процессов по отметкам
+# последних id таблиц (get_seen_links_since). Снимок фильтра сохраняется на диск, поэтому при запуске
+# из базы дочитываются только записи после снимка. Удаленные по сроку хранения строки из фильтра
+# не уходят, поэтому он периодически строится из базы заново.
+
+# На сколько ссылок рассчитан фильтр и допустимая доля ложных срабатываний (1 млн / 1% - около 1.2 МБ)
+SEEN_FILTER_CAPACITY = int(os.getenv("SEEN_FILTER_CAPACITY", "1000000"))
+SEEN_FILTER_FP_RATE = float(os.getenv("SEEN_FILTER_FP_RATE", "0.01"))
+# Как часто дочитывать новые ссылки из базы перед проверкой (сек)
+SEEN_FILTER_REFRESH_INTERVAL = 2
+# Как часто сохранять снимок на диск (сек)
+SEEN_FILTER_SAVE_INTERVAL = 300
+# По сколько строк читать базу при построении фильтра
+SEEN_FILTER_LOAD_BATCH = 50000
+# Через сколько секунд строить фильтр из базы заново: к этому времени retention.py
+# успевает удалить ссылки, которые в фильтре еще остались
+SEEN_FILTER_REBUILD_INTERVAL = min(RETENTION_NEWS_SENT_DAYS, RETENTION_PUBLISHED_DAYS) * 86400
+
+SEEN_FILTER_FILE = cache_path("seen_links.bloom")
+
+SEEN_FILTER_CHECKS = metrics.counter(
+    "seen_filter_checks_total", "Проверки дедупликации через фильтр Блума", ("result",))
+SEEN_FILTER_ITEMS = metrics.gauge("seen_filter_items", "Ссылок в фильтре Блума")
+
+_filter = None
+_marks = {}
+_refreshed_at = 0.0
+_saved_at = 0.0
+_filter_lock = None
+
+
+class BloomFilter:
+    """Фильтр Блума на bytearray: размер определяется ожидаемым числом элементов и долей ложных срабатываний"""
+
+    def __init__(self, capacity: int, fp_rate: float, bits: bytearray = None, count: int = 0,
+                 built_at: float = None, built_count: int = 0):
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.size = max(8, int(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.size + 7) // 8)
+        self.count = count
+        # Когда фильтр построен из базы и сколько ключей в нем тогда было
+        self.built_at = built_at if built_at is not None else time.time()
+        self.built_count = built_count
+
+    def _positions(self, key: str):
+        # Двойное хэширование: k позиций из двух 64-битных половин одного blake2b
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        # Считаем только новые ключи: повторный ключ не меняет ни одного бита
+        # (новый ключ, совпавший по всем битам с другими, тоже не посчитается - это ложное срабатывание)
+        added = False
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+
+    def needs_rebuild(self) -> bool:
+        """Пора ли строить фильтр из базы заново"""
+        if time.time() - self.built_at >= SEEN_FILTER_REBUILD_INTERVAL:
+            return True
+        # Переполнен, хотя после построения из базы помещался - перестройка выбросит удаленные ключи
+        return self.count > self.capacity >= self.built_count
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+def _get_filter_lock() -> asyncio.Lock:
+    global _filter_lock
+    if _filter_lock is None:
+        _filter_lock = asyncio.Lock()
+    return _filter_lock
+
+
+def _add_links(bloom: BloomFilter, link_keys: list):
+    for link_key in link_keys:
+        if link_key:
+            bloom.add(link_key)
+
+
+def _load_snapshot():
+    """Читает снимок с диска; если параметры фильтра изменились - None"""
+    try:
+        with open(SEEN_FILTER_FILE, "rb") as f:
+            header = json.loads(f.readline())
+            bits = bytearray(f.read())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("⚠️ Не удалось прочитать снимок фильтра ссылок: %s", e)
+        return None
+
+    # Снимки без built_at сохранены до периодической перестройки - строим заново
+    bloom = BloomFilter(header["capacity"], header["fp_rate"], bits, header["count"],
+                        header.get("built_at", 0), header.get("built_count", 0))
+    if (header["capacity"], header["fp_rate"]) != (SEEN_FILTER_CAPACITY, SEEN_FILTER_FP_RATE) \
+            or len(bits) != (bloom.size + 7) // 8:
+        return None
+    return bloom, header["marks"]
+
+
+def _save_snapshot(bloom: BloomFilter, marks: dict):
+    """Атомарно сохраняет фильтр и отметки, до которых он построен"""
+    try:
+        os.makedirs(os.path.dirname(SEEN_FILTER_FILE) or ".", exist_ok=True)
+        header = {"capacity": bloom.capacity, "fp_rate": bloom.fp_rate, "count": bloom.count,
+                  "built_at": bloom.built_at, "built_count": bloom.built_count, "marks": marks}
+        # Снимок пишут несколько процессов - у каждого свой временный файл
+        tmp_path = f"{SEEN_FILTER_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps(header).encode() + b"\n")
+            f.write(bloom.bits)
+        os.replace(tmp_path, SEEN_FILTER_FILE)
+    except Exception as e:
+        logger.warning("⚠️ Не удалось сохранить снимок фильтра ссылок: %s", e)
+
+
+async def _catch_up(bloom: BloomFilter, marks: dict) -> tuple:
+    """Добавляет в фильтр ссылки, записанные в базу после отметок"""
+    loop = asyncio.get_running_loop()
+    added = 0
+    while True:
+        links, marks = await get_seen_links_since(marks, SEEN_FILTER_LOAD_BATCH)
+        if not links:
+            return marks, added
+        # Хэширование большой пачки - в executor, чтобы не блокировать event loop
+        if len(links) > 1000:
+            await loop.run_in_executor(None, _add_links, bloom, links)
+        else:
+            _add_links(bloom, links)
+        added += len(links)
+
+
+async def _build() -> tuple:
+    """Строит фильтр из базы с нуля, возвращает (фильтр, отметки)"""
+    bloom = BloomFilter(SEEN_FILTER_CAPACITY, SEEN_FILTER_FP_RATE)
+    marks, _ = await _catch_up(bloom, {})
+    bloom.built_at, bloom.built_count = time.time(), bloom.count
+    return bloom, marks
+
+
+def _log_ready(bloom: BloomFilter, message: str, added: int):
+    logger.info("🧮 %s: %s ссылок (%s из базы), %.1f МБ", message, bloom.count, added, len(bloom.bits) / 1024 / 1024)
+    if bloom.count > bloom.capacity:
+        logger.warning("⚠️ В фильтре ссылок больше %s элементов - увеличьте SEEN_FILTER_CAPACITY",
+                       bloom.capacity)
+
+
+async def _refresh():
+    global _filter, _marks, _refreshed_at, _saved_at
+    loop = asyncio.get_running_loop()
+    if _filter is None:
+        snapshot = await loop.run_in_executor(None, _load_snapshot)
+        if snapshot:
+            # Снимок от другой базы (пересоздана или восстановлена из копии) или устаревший - строим заново
+            sequences = await get_id_sequences()
+            if any(mark > sequences.get(table, 0) for table, mark in snapshot[1].items()) \
+                    or snapshot[0].needs_rebuild():
+                snapshot = None
+        if snapshot:
+            bloom, marks = snapshot
+            marks, added = await _catch_up(bloom, marks)
+        else:
+            bloom, marks = await _build()
+            added = bloom.count
+        _filter, _marks = bloom, marks
+        _log_ready(bloom, "Фильтр ссылок готов", added)
+    elif _filter.needs_rebuild():
+        _filter, _marks = await _build()
+        _log_ready(_filter, "Фильтр ссылок перестроен", _filter.count)
+        _saved_at = 0.0  # Снимок сохраняем сразу, чтобы другие процессы не строили его из старого
+    else:
+        _marks, added = await _catch_up(_filter, _marks)
+
+    _refreshed_at = time.monotonic()
+    SEEN_FILTER_ITEMS.set(_filter.count)
+    if time.monotonic() - _saved_at >= SEEN_FILTER_SAVE_INTERVAL:
+        _saved_at = time.monotonic()
+        await loop.run_in_executor(None, _save_snapshot, _filter, dict(_marks))
+
+
+async def is_link_seen(link: str) -> bool:
+    """Была ли ссылка уже в очереди, на модерации или опубликована"""
+    if _filter is None or time.monotonic() - _refreshed_at >= SEEN_FILTER_REFRESH_INTERVAL:
+        async with _get_filter_lock():
+            if _filter is None or time.monotonic() - _refreshed_at >= SEEN_FILTER_REFRESH_INTERVAL:
+                await _refresh()
+
+    link_key = canonical_link(link)
+    if link_key not in _filter:
+        SEEN_FILTER_CHECKS.inc(result="negative")
+        return False
+
+    # Положительный ответ подтверждаем в базе по тому же ключу
+    if await is_link_key_seen(link_key):
+        SEEN_FILTER_CHECKS.inc(result="positive")
+        return True
+    SEEN_FILTER_CHECKS.inc(result="unconfirmed")
+    return False
+
+
+def mark_link_seen(link: str):
+    """Сразу добавляет ссылку в фильтр этого процесса (не дожидаясь чтения из базы)"""
+    if _filter is not None:
+        _filter.add(canonical_link(link))
@@ -0,0 +1,271 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+from config import CHANNEL_ID
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Telegram: ~30 сообщений/сек на бота, ~1/сек в личный чат, ~20/мин в группу или канал
+GLOBAL_RATE = 30
+GLOBAL_BURST = 30
+PRIVATE_CHAT_RATE = 1
+PRIVATE_CHAT_BURST = 3
+GROUP_CHAT_RATE = 20 / 60
+GROUP_CHAT_BURST = 3
+
+# Приоритеты: меньше - важнее. Посты в канал идут раньше уведомлений админам
+PRIORITY_CHANNEL = 0
+PRIORITY_ADMIN = 1
+
+SCHEDULER_WORKERS = 4
+SEND_MAX_RETRIES = 3
+
+TELEGRAM_SEND_SECONDS = metrics.histogram(
+    "telegram_send_seconds", "Время вызова метода отправки Telegram", ("method", "result"))
+TELEGRAM_QUEUE_WAIT_SECONDS = metrics.histogram(
+    "telegram_queue_wait_seconds", "Время ожидания сообщения в очереди отправки до первой попытки", ("priority",))
+TELEGRAM_FLOOD_WAITS = metrics.counter(
+    "telegram_flood_waits_total", "Ответы Telegram RetryAfter (flood wait)")
+TELEGRAM_FLOOD_WAIT_SECONDS = metrics.counter(
+    "telegram_flood_wait_seconds_total", "Суммарное время ожидания по RetryAfter")
+
+
+class TokenBucket:
+    """Простейший token bucket: rate токенов в секунду, не более capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # до какого момента чат заблокирован (RetryAfter)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Сколько секунд ждать до появления токена (0 - можно отправлять)"""
+        self._refill()
+        blocked = max(0.0, self.blocked_until - time.monotonic())
+        if self.tokens >= 1:
+            return blocked
+        return max(blocked, (1 - self.tokens) / self.rate)
+
+    def consume(self):
+        self._refill()
+        self.tokens -= 1
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class SendJob:
+    def __init__(self, chat_id, send, args, kwargs, priority: int, future: asyncio.Future):
+        self.chat_id = chat_id
+        self.send = send
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.future = future
+        self.sequence = next(_sequence)
+        self.attempts = 0
+        self.queued_at = time.monotonic()
+
+
+class ChatState:
+    """Очередь отправок одного чата: сообщения в чат уходят строго по порядку"""
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.jobs = deque()
+        self.scheduled = False  # чат уже стоит в общей очереди или ждет таймера
+
+
+_queue = None
+_workers = []
+_sequence = itertools.count()
+_global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+_chats = {}
+
+# Метрики планировщика
+_stats = {
+    "sent": 0,
+    "failed": 0,
+    "retries": 0,
+    "flood_waits": 0,
+    "delayed_chats": 0,  # чаты, ожидающие освобождения лимита
+    "in_progress": 0,
+}
+
+
+def _chat_state(chat_id) -> ChatState:
+    state = _chats.get(chat_id)
+    if state is None:
+        # Отрицательные ID - группы и каналы, положительные - личные чаты
+        if isinstance(chat_id, int) and chat_id > 0:
+            bucket = TokenBucket(PRIVATE_CHAT_RATE, PRIVATE_CHAT_BURST)
+        else:
+            bucket = TokenBucket(GROUP_CHAT_RATE, GROUP_CHAT_BURST)
+        state = _chats[chat_id] = ChatState(bucket)
+    return state
+
+
+def _put_chat(chat_id):
+    """Ставит чат в общую очередь по приоритету и порядку его первого сообщения"""
+    head = _chats[chat_id].jobs[0]
+    _queue.put_nowait((head.priority, head.sequence, chat_id))
+
+
+def _schedule_chat(chat_id, delay: float = 0):
+    """Ставит чат в очередь сейчас или через delay секунд, не занимая воркер"""
+    _chats[chat_id].scheduled = True
+    if delay <= 0:
+        _put_chat(chat_id)
+        return
+
+    _stats["delayed_chats"] += 1
+
+    def requeue():
+        _stats["delayed_chats"] -= 1
+        _put_chat(chat_id)
+
+    asyncio.get_running_loop().call_later(delay, requeue)
+
+
+def _finish(job: SendJob, result=None, error: Exception = None):
+    state = _chats[job.chat_id]
+    state.jobs.popleft()
+    if job.future.done():
+        return
+    if error is not None:
+        _stats["failed"] += 1
+        job.future.set_exception(error)
+    else:
+        _stats["sent"] += 1
+        job.future.set_result(result)
+
+
+async def _send_next(chat_id):
+    """Отправляет первое сообщение из очереди чата"""
+    state = _chats[chat_id]
+    job = state.jobs[0]
+
+    global_wait = _global_bucket.delay()
+    if global_wait > 0:
+        await asyncio.sleep(global_wait)
+
+    state.bucket.consume()
+    _global_bucket.consume()
+    job.attempts += 1
+    if job.attempts == 1:
+        TELEGRAM_QUEUE_WAIT_SECONDS.observe(time.monotonic() - job.queued_at,
+                                            priority="channel" if job.priority == PRIORITY_CHANNEL else "admin")
+
+    method = getattr(job.send, "__name__", "send")
+    started = time.perf_counter()
+    result_label = "ok"
+    _stats["in_progress"] += 1
+    try:
+        result = await job.send(*job.args, **job.kwargs)
+    except TelegramRetryAfter as e:
+        result_label = "flood_wait"
+        _stats["flood_waits"] += 1
+        TELEGRAM_FLOOD_WAITS.inc()
+        TELEGRAM_FLOOD_WAIT_SECONDS.inc(e.retry_after)
+        _retry_or_fail(job, e, e.retry_after)
+    except TelegramNetworkError as e:
+        result_label = "network_error"
+        _retry_or_fail(job, e, 2 ** job.attempts)
+    except Exception as e:
+        result_label = "error"
+        _finish(job, error=e)
+    else:
+        _finish(job, result=result)
+    finally:
+        _stats["in_progress"] -= 1
+        TELEGRAM_SEND_SECONDS.observe(time.perf_counter() - started, method=method, result=result_label)
+
+
+def _retry_or_fail(job: SendJob, error: Exception, delay: float):
+    if job.attempts > SEND_MAX_RETRIES:
+        _finish(job, error=error)
+        return
+
+    # Сообщение остается первым в очереди чата, весь чат ждет delay секунд
+    _stats["retries"] += 1
+    _chats[job.chat_id].bucket.block(delay)
+    logger.info("⏳ Повтор отправки в чат %s через %s сек (%s)", job.chat_id, delay, error.__class__.__name__)
+
+
+async def _worker():
+    while True:
+        _, _, chat_id = await _queue.get()
+        state = _chats[chat_id]
+        wait = 0
+        try:
+            # Пропускаем сообщения, которые отправитель уже перестал ждать
+            while state.jobs and state.jobs[0].future.done():
+                state.jobs.popleft()
+
+            if state.jobs:
+                wait = state.bucket.delay()
+                if wait <= 0:
+                    await _send_next(chat_id)
+                    wait = state.bucket.delay()
+        except Exception as e:
+            logger.error("❌ Ошибка в планировщике отправки: %s", e)
+            wait = 1
+        finally:
+            _queue.task_done()
+
+        if state.jobs:
+            _schedule_chat(chat_id, wait)
+        else:
+            state.scheduled = False
+
+
+def _ensure_started():
+    """Лениво запускает воркеры внутри текущего event loop"""
+    global _queue
+    if _queue is None:
+        _queue = asyncio.PriorityQueue()
+    if not _workers:
+        for _ in range(SCHEDULER_WORKERS):
+            _workers.append(asyncio.create_task(_worker()))
+
+
+async def schedule_send(chat_id, send, *args, priority: int = None, **kwargs):
+    """Ставит вызов метода отправки Telegram в очередь с учетом лимитов и ждет результат.
+
+    send - метод бота (bot.send_message, bot.send_photo, ...), args/kwargs - его аргументы.
+    По умолчанию посты в канал получают высокий приоритет, остальные - обычный.
+    Сообщения в один чат отправляются строго в порядке постановки.
+    """
+    _ensure_started()
+    if priority is None:
+        priority = PRIORITY_CHANNEL if chat_id == CHANNEL_ID else PRIORITY_ADMIN
+
+    future = asyncio.get_running_loop().create_future()
+    state = _chat_state(chat_id)
+    state.jobs.append(SendJob(chat_id, send, args, kwargs, priority, future))
+    if not state.scheduled:
+        _schedule_chat(chat_id)
+    return await future
+
+
+def get_scheduler_stats() -> dict:
+    """Метрики планировщика: глубина очереди по приоритетам и счетчики отправок"""
+    stats = dict(_stats)
+    stats["queued_channel"] = 0
+    stats["queued_admin"] = 0
+    for state in _chats.values():
+        for job in state.jobs:
+            key = "queued_channel" if job.priority == PRIORITY_CHANNEL else "queued_admin"
+            stats[key] += 1
+    return stats
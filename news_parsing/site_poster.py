@@ -1,8 +1,18 @@
+import asyncio
+import logging
 import os
-import requests
+import re
 import json
+import time
+import aiohttp
 from datetime import datetime
+from urllib.parse import urlsplit
+import metrics
 from config import SITE_URL, SITE_LOGIN, SITE_PASSWORD
+from file_cache import cache_path, load_json_cache, save_json_cache, file_sha256
+from image_variants import get_variant, get_mime_type
+
+logger = logging.getLogger(__name__)
 
 
 # Базовый URL API
@@ -12,21 +22,200 @@ BASE_API_URL = "https://api.demo.agrosearch.kz/api"
 # Глобальная переменная для хранения токена
 access_token = None
 
+# Конец предложения: знак препинания, после которого пробел, перенос строки или конец текста
+SENTENCE_END_RE = re.compile(r"[.!?。！？](?=[ \n\r]|$)")
+
+# Языки, для которых API принимает отдельные поля (title_kk, seo_title_en, ...)
+EXTRA_LANGUAGES = ("kk", "en", "zh")
+
+# Отправлять ли русский текст в поля других языков.
+# По NEWS_API_DOCUMENTATION.md эти поля необязательны; при False тело запроса примерно в 4 раза меньше,
+# но что сайт покажет на kk/en/zh без них, документация не описывает - проверьте на демо-API перед выключением.
+SEND_DUPLICATE_TRANSLATIONS = True
+
+# Лимиты длины полей API
+TITLE_MAX_LENGTH = 255
+SUBTITLE_LENGTH = 200
+SEO_DESCRIPTION_MAX_LENGTH = 500
+
+SEO_KEYWORDS = "агро, сельское хозяйство, АПК, новости сельского хозяйства"
+
+# Настройки HTTP-клиента API
+API_TIMEOUT = aiohttp.ClientTimeout(total=30, connect=10)
+API_POOL_SIZE = 10  # Максимум одновременных соединений с API
+API_KEEPALIVE = 60  # Сколько секунд держать неиспользуемое соединение открытым
+API_MAX_RETRIES = 3
+API_RETRY_DELAY = 1  # Базовая задержка между повторами (удваивается)
+
+# Статусы, при которых запрос можно безопасно повторить
+RETRY_STATUSES = {429, 502, 503, 504}
+# Для неидемпотентных запросов (создание новости) - только если сервер точно его не выполнил
+SAFE_RETRY_STATUSES = {429, 503}
+# Ответы, после которых неизвестно, создана ли новость (запрос мог дойти до приложения)
+UNCERTAIN_STATUSES = {500, 502, 504}
+
+# Общая сессия с пулом соединений (создается лениво внутри event loop)
+_session = None
+# Блокировка, чтобы параллельные запросы не логинились одновременно
+_login_lock = None
+
+# Сколько новостей создается одновременно при пакетной публикации
+SITE_BATCH_CONCURRENCY = 4
+
+
+class SiteCreateUncertain(Exception):
+    """Неизвестно, создал ли сайт новость (таймаут или обрыв после отправки запроса).
+
+    Повторять создание нельзя - появится дубль; результат нужно проверить на сайте.
+    """
+
+
+class ApiResponse:
+    """Прочитанный ответ API (тело доступно после закрытия соединения)"""
+
+    def __init__(self, status_code: int, headers: dict, text: str):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """Возвращает общую HTTP-сессию, создавая ее при первом обращении"""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=API_POOL_SIZE, keepalive_timeout=API_KEEPALIVE)
+        _session = aiohttp.ClientSession(connector=connector, timeout=API_TIMEOUT)
+    return _session
+
+
+async def close_session():
+    """Закрывает общую HTTP-сессию (вызывается при остановке бота)"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def _retry_delay(response: ApiResponse, attempt: int) -> float:
+    """Задержка перед повтором: Retry-After от сервера или экспоненциальная"""
+    retry_after = response.headers.get("Retry-After") if response else None
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return API_RETRY_DELAY * 2 ** attempt
+
+
+SITE_API_SECONDS = metrics.histogram(
+    "site_api_request_seconds", "Время запроса к API сайта (одна попытка)", ("method", "endpoint", "status"))
+SITE_API_RETRIES = metrics.counter(
+    "site_api_retries_total", "Повторы запросов к API сайта", ("endpoint",))
+
+
+async def _request(method: str, url: str, idempotent: bool = True, form_factory=None, **kwargs) -> ApiResponse:
+    """Выполняет запрос к API с повторами при временных ошибках.
+
+    form_factory - функция, создающая aiohttp.FormData заново для каждой попытки.
+    Для неидемпотентных запросов повтор делается только если запрос точно не был выполнен.
+    """
+    retry_statuses = RETRY_STATUSES if idempotent else SAFE_RETRY_STATUSES
+    retry_errors = (aiohttp.ClientConnectionError, asyncio.TimeoutError) if idempotent \
+        else (aiohttp.ClientConnectorError,)
+
+    endpoint = urlsplit(url).path
+    for attempt in range(API_MAX_RETRIES + 1):
+        response = None
+        started = time.perf_counter()
+        try:
+            session = await get_session()
+            if form_factory:
+                kwargs["data"] = form_factory()
+            async with session.request(method, url, **kwargs) as raw_response:
+                text = await raw_response.text()
+                response = ApiResponse(raw_response.status, dict(raw_response.headers), text)
+            SITE_API_SECONDS.observe(time.perf_counter() - started, method=method, endpoint=endpoint,
+                                     status=response.status_code)
+
+            if response.status_code not in retry_statuses or attempt == API_MAX_RETRIES:
+                return response
+            logger.warning("⚠️ API ответил %s, повтор %s/%s", response.status_code, attempt + 1, API_MAX_RETRIES)
+
+        except retry_errors as e:
+            SITE_API_SECONDS.observe(time.perf_counter() - started, method=method, endpoint=endpoint, status="error")
+            if attempt == API_MAX_RETRIES:
+                raise
+            logger.warning("⚠️ Ошибка соединения с API (%r), повтор %s/%s", e, attempt + 1, API_MAX_RETRIES)
+
+        SITE_API_RETRIES.inc(endpoint=endpoint)
+
+        await asyncio.sleep(_retry_delay(response, attempt))
+
+# Кэш загруженных изображений: "адрес API|sha256 содержимого" -> image_uri на сервере.
+# Адрес API в ключе - чтобы при переключении окружения (например, на mock_site_api.py)
+# не подставлять пути, которых на этом сервере нет
+UPLOAD_CACHE_FILE = cache_path("uploaded_images.json")
+_upload_cache = None
+
+
+def _get_upload_cache() -> dict:
+    """Лениво загружает кэш загруженных изображений с диска"""
+    global _upload_cache
+    if _upload_cache is None:
+        # Записи старого формата (без адреса API) непонятно к какому серверу относятся - отбрасываем
+        _upload_cache = {key: uri for key, uri in load_json_cache(UPLOAD_CACHE_FILE).items() if "|" in key}
+    return _upload_cache
+
+
+def _upload_cache_key(image_hash: str) -> str:
+    return f"{BASE_API_URL}|{image_hash}"
+
+
+def _current_api_uploads() -> dict:
+    """Записи кэша загрузок текущего адреса API"""
+    prefix = f"{BASE_API_URL}|"
+    return {key: uri for key, uri in _get_upload_cache().items() if key.startswith(prefix)}
+
+
+def is_cached_image_uri(image_uri: str) -> bool:
+    """Проверяет, был ли image_uri взят из кэша загрузок"""
+    return bool(image_uri) and image_uri in _current_api_uploads().values()
+
+
+def invalidate_uploaded_image(image_uri: str):
+    """Удаляет из кэша все записи с указанным image_uri (сервер его больше не знает)"""
+    cache = _get_upload_cache()
+    stale_keys = [key for key, uri in _current_api_uploads().items() if uri == image_uri]
+    if not stale_keys:
+        return
+
+    for key in stale_keys:
+        del cache[key]
+    save_json_cache(UPLOAD_CACHE_FILE, cache)
+    logger.info("🗑️ Изображение удалено из кэша загрузок: %s", image_uri)
+
+
+def _is_image_rejected(response) -> bool:
+    """Проверяет, что API отклонил запрос из-за изображения: ошибка валидации (4xx) по полю картинки"""
+    if not 400 <= response.status_code < 500:
+        return False
+    try:
+        errors = response.json().get("errors", {})
+    except ValueError:
+        return False
+    return isinstance(errors, dict) and any(key in errors for key in ("image_uri", "seo_image"))
+
 
 def truncate_text(text: str, max_length: int) -> str:
     """Обрезает текст до максимальной длины, сохраняя целые предложения"""
     if not text or len(text) <= max_length:
         return text
 
-    # Находим конец первого предложения
-    sentence_endings = ['.', '!', '?', '。', '！', '？']
-
     # Ищем конец первого предложения в пределах max_length
-    for i in range(min(len(text), max_length)):
-        if text[i] in sentence_endings:
-            # Проверяем, что после точки пробел или конец текста
-            if i + 1 >= len(text) or text[i + 1] in [' ', '\n', '\r']:
-                return text[:i + 1]
+    # (знак конца предложения, после которого пробел или конец текста)
+    match = SENTENCE_END_RE.search(text)
+    if match and match.start() < max_length:
+        return text[:match.end()]
 
     # Если не нашли конец предложения, ищем ближайший пробел
     last_space = text.rfind(' ', 0, max_length - 3)
@@ -36,14 +225,14 @@ def truncate_text(text: str, max_length: int) -> str:
     return text[:max_length - 3] + "..."
 
 
-def login_to_api() -> bool:
+async def login_to_api() -> bool:
     """Аутентификация в API и получение токена"""
     global access_token
 
     login_url = f"{BASE_API_URL}/auth/login"
 
     try:
-        print("🔑 Аутентифицируемся в API...")
+        logger.info("🔑 Аутентифицируемся в API...")
 
         payload = {
             "email": SITE_LOGIN,
@@ -55,80 +244,106 @@ def login_to_api() -> bool:
             "Accept-Language": "ru"
         }
 
-        response = requests.post(login_url, json=payload, headers=headers, timeout=30)
+        response = await _request("POST", login_url, json=payload, headers=headers)
 
         if response.status_code == 200:
             data = response.json()
             access_token = data.get("access_token")
             if access_token:
-                print("✅ Успешная аутентификация в API")
+                logger.info("✅ Успешная аутентификация в API")
                 return True
             else:
-                print("❌ Токен не получен в ответе")
+                logger.error("❌ Токен не получен в ответе")
                 return False
         else:
-            print(f"❌ Ошибка аутентификации: {response.status_code}")
-            print(f"Ответ: {response.text}")
+            logger.error("❌ Ошибка аутентификации: %s", response.status_code)
             return False
 
     except Exception as e:
-        print(f"❌ Ошибка при аутентификации: {e}")
+        logger.error("❌ Ошибка при аутентификации: %s", e)
         return False
 
 
-def upload_image(image_path: str) -> str:
-    """Загружает изображение и возвращает путь для использования в новости"""
+async def upload_image(image_path: str, force: bool = False) -> str:
+    """Загружает изображение и возвращает путь для использования в новости.
+
+    Повторно то же самое изображение не загружается - путь берется из кэша.
+    force=True игнорирует кэш и загружает файл заново.
+    """
     global access_token
 
+    image_hash = None
+    if os.path.exists(image_path):
+        image_hash = file_sha256(image_path)
+        cached_uri = _get_upload_cache().get(_upload_cache_key(image_hash))
+        if cached_uri and not force:
+            logger.info("♻️ Изображение уже загружено, используем кэш: %s", cached_uri)
+            return cached_uri
+
     if not access_token:
-        if not login_to_api():
+        if not await login_to_api():
             return None
 
     upload_url = f"{BASE_API_URL}/upload/image"
 
     try:
-        print(f"🖼️ Загружаем изображение: {image_path}")
+        logger.info("🖼️ Загружаем изображение: %s", image_path)
 
         if not os.path.exists(image_path):
-            print(f"❌ Файл изображения не найден: {image_path}")
+            logger.error("❌ Файл изображения не найден: %s", image_path)
             return None
 
-        with open(image_path, 'rb') as image_file:
-            files = {'image': (os.path.basename(image_path), image_file, 'image/jpeg')}
+        loop = asyncio.get_running_loop()
+        image_bytes = await loop.run_in_executor(None, _read_file, image_path)
 
-            response = requests.post(upload_url, files=files, timeout=30)
+        def make_form():
+            form = aiohttp.FormData()
+            form.add_field("image", image_bytes, filename=os.path.basename(image_path),
+                           content_type=get_mime_type(image_path))
+            return form
 
-            if response.status_code == 200:
-                data = response.json()
-                image_path_from_api = data.get("data", {}).get("path", "")
+        response = await _request("POST", upload_url, form_factory=make_form)
 
-                print(f"✅ Изображение загружено, путь от API: {image_path_from_api}")
+        if response.status_code == 200:
+            data = response.json()
+            image_path_from_api = data.get("data", {}).get("path", "")
+
+            logger.info("✅ Изображение загружено, путь от API: %s", image_path_from_api)
+
+            # Обрабатываем путь от API - добавляем префикс tmp/images/ если его нет
+            if image_path_from_api.startswith("/storage/"):
+                image_path_from_api = image_path_from_api[9:]  # удаляем "/storage/"
+            elif image_path_from_api.startswith("https://"):
+                # Если вернулся полный URL, извлекаем только имя файла
+                from urllib.parse import urlparse
+                parsed_url = urlparse(image_path_from_api)
+                filename = os.path.basename(parsed_url.path)
+                image_path_from_api = f"tmp/images/{filename}"
+            else:
+                # Если вернулось только имя файла, добавляем путь
+                image_path_from_api = f"tmp/images/{image_path_from_api}"
 
-                # Обрабатываем путь от API - добавляем префикс tmp/images/ если его нет
-                if image_path_from_api.startswith("/storage/"):
-                    image_path_from_api = image_path_from_api[9:]  # удаляем "/storage/"
-                elif image_path_from_api.startswith("https://"):
-                    # Если вернулся полный URL, извлекаем только имя файла
-                    from urllib.parse import urlparse
-                    parsed_url = urlparse(image_path_from_api)
-                    filename = os.path.basename(parsed_url.path)
-                    image_path_from_api = f"tmp/images/{filename}"
-                else:
-                    # Если вернулось только имя файла, добавляем путь
-                    image_path_from_api = f"tmp/images/{image_path_from_api}"
+            logger.debug("✅ Обработанный путь для image_uri: %s", image_path_from_api)
 
-                print(f"✅ Обработанный путь для image_uri: {image_path_from_api}")
-                return image_path_from_api
-            else:
-                print(f"❌ Ошибка загрузки изображения: {response.status_code}")
-                print(f"Ответ: {response.text}")
-                return None
+            cache = _get_upload_cache()
+            cache[_upload_cache_key(image_hash)] = image_path_from_api
+            save_json_cache(UPLOAD_CACHE_FILE, cache)
+
+            return image_path_from_api
+        else:
+            logger.error("❌ Ошибка загрузки изображения: %s %s", response.status_code, response.text[:200])
+            return None
 
     except Exception as e:
-        print(f"❌ Ошибка при загрузке изображения: {e}")
+        logger.error("❌ Ошибка при загрузке изображения: %s", e)
         return None
 
 
+def _read_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
 def translate_news_content(title: str, body: str) -> dict:
     """
     Возвращает контент только на русском языке (без перевода)
@@ -137,33 +352,18 @@ def translate_news_content(title: str, body: str) -> dict:
     if not body or len(body.strip()) == 0:
         body = title  # Используем заголовок как тело если тело пустое
 
-    # Создаем короткий подзаголовок из первых 200 символов тела текста
-    short_subtitle = truncate_text(body, 200)
-
-    translations = {
-        'ru': {
-            'title': truncate_text(title, 255),
-            'description': body,
-            'subtitle': short_subtitle
-        },
-        'kk': {
-            'title': truncate_text(title, 255),
-            'description': body,
-            'subtitle': short_subtitle
-        },
-        'en': {
-            'title': truncate_text(title, 255),
-            'description': body,
-            'subtitle': short_subtitle
-        },
-        'zh': {
-            'title': truncate_text(title, 255),
-            'description': body,
-            'subtitle': short_subtitle
-        }
+    # Все производные поля считаем один раз, остальные языки ссылаются на тот же контент
+    content = {
+        'title': truncate_text(title, TITLE_MAX_LENGTH),
+        'description': body,
+        # Короткий подзаголовок из первых 200 символов тела текста
+        'subtitle': truncate_text(body, SUBTITLE_LENGTH)
     }
+    translations = {'ru': content}
+    for language in EXTRA_LANGUAGES:
+        translations[language] = content
 
-    print(f"✅ Контент подготовлен: заголовок {len(title)} симв., описание {len(body)} симв.")
+    logger.debug("✅ Контент подготовлен: заголовок %s симв., описание %s симв.", len(title), len(body))
     return translations
 
 def extract_title_and_body(text: str):
@@ -197,75 +397,83 @@ def extract_title_and_body(text: str):
     if not body:
         body = title
 
-    print(f"📄 Извлечен заголовок ({len(title)} символов): {title}")
-    print(f"📄 Извлечен текст ({len(body)} символов): {body[:100]}...")
+    logger.debug("📄 Извлечен заголовок (%s символов): %s", len(title), title)
+    logger.debug("📄 Извлечен текст (%s символов)", len(body))
 
     return title, body
 
 
-def create_news_api(title: str, description: str, subtitle: str, image_uri: str, translations: dict) -> bool:
-    """Создает новость через API только на русском языке"""
+def build_news_payload(content: dict, image_uri: str, seo_image_uri: str = None,
+                       include_translations: bool = None) -> dict:
+    """Собирает тело запроса на создание новости.
+
+    content - уже подготовленные русские поля (title, description, subtitle) из
+    translate_news_content, повторно они не обрезаются. Поля других языков
+    добавляются только при include_translations (по умолчанию SEND_DUPLICATE_TRANSLATIONS).
+    """
+    if include_translations is None:
+        include_translations = SEND_DUPLICATE_TRANSLATIONS
+
+    title = content['title']
+    description = content['description']
+    subtitle = content['subtitle']
+    seo_title = truncate_text(title, TITLE_MAX_LENGTH)
+    seo_description = truncate_text(subtitle, SEO_DESCRIPTION_MAX_LENGTH)
+
+    payload = {
+        # Основные поля на русском
+        "title": title,
+        "description": description,
+        "subtitle": subtitle,
+        "image_uri": image_uri,
+
+        # SEO поля (все на русском)
+        "seo_title": seo_title,
+        "seo_description": seo_description,
+        "seo_keywords": SEO_KEYWORDS,
+        "seo_image": seo_image_uri or image_uri,
+
+        # Дополнительные поля
+        "date_publication": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+    if include_translations:
+        # Остальные языки используем те же русские данные
+        for language in EXTRA_LANGUAGES:
+            payload[f"title_{language}"] = title
+            payload[f"description_{language}"] = description
+            payload[f"subtitle_{language}"] = subtitle
+            payload[f"seo_title_{language}"] = seo_title
+            payload[f"seo_description_{language}"] = seo_description
+            payload[f"seo_keywords_{language}"] = SEO_KEYWORDS
+
+    return payload
+
+
+async def create_news_api(title: str, description: str, subtitle: str, image_uri: str, translations: dict,
+                    seo_image_uri: str = None):
+    """Создает новость через API только на русском языке.
+
+    Возвращает ID созданной новости (True, если API его не вернул) или False при ошибке.
+    Если результат неизвестен - SiteCreateUncertain.
+    """
     global access_token
 
     if not access_token:
-        if not login_to_api():
+        if not await login_to_api():
             return False
 
     news_url = f"{BASE_API_URL}/content/news"
 
     try:
-        print("📤 Создаем новость через API (только русский язык)...")
+        logger.debug("📤 Создаем новость через API")
 
         # Проверяем обязательные поля
         if not translations['ru']['title'] or not translations['ru']['description']:
-            print("❌ Ошибка: заголовок или описание пустые")
+            logger.error("❌ Ошибка: заголовок или описание пустые")
             return False
 
-        # SEO настройки только на русском
-        seo_keywords = truncate_text("агро, сельское хозяйство, АПК, новости сельского хозяйства", 255)
-
-        # Упрощенный payload только с русскими полями
-        payload = {
-            # Основные поля на русском
-            "title": translations['ru']['title'],
-            "description": translations['ru']['description'],
-            "subtitle": translations['ru']['subtitle'],
-            "image_uri": image_uri,
-
-            # Остальные языки используем те же русские данные
-            "title_kk": translations['ru']['title'],
-            "description_kk": translations['ru']['description'],
-            "subtitle_kk": translations['ru']['subtitle'],
-
-            "title_en": translations['ru']['title'],
-            "description_en": translations['ru']['description'],
-            "subtitle_en": translations['ru']['subtitle'],
-
-            "title_zh": translations['ru']['title'],
-            "description_zh": translations['ru']['description'],
-            "subtitle_zh": translations['ru']['subtitle'],
-
-            # SEO поля (все на русском)
-            "seo_title": truncate_text(translations['ru']['title'], 255),
-            "seo_description": truncate_text(translations['ru']['subtitle'], 500),
-            "seo_keywords": seo_keywords,
-            "seo_image": image_uri,
-
-            "seo_title_kk": truncate_text(translations['ru']['title'], 255),
-            "seo_description_kk": truncate_text(translations['ru']['subtitle'], 500),
-            "seo_keywords_kk": seo_keywords,
-
-            "seo_title_en": truncate_text(translations['ru']['title'], 255),
-            "seo_description_en": truncate_text(translations['ru']['subtitle'], 500),
-            "seo_keywords_en": seo_keywords,
-
-            "seo_title_zh": truncate_text(translations['ru']['title'], 255),
-            "seo_description_zh": truncate_text(translations['ru']['subtitle'], 500),
-            "seo_keywords_zh": seo_keywords,
-
-            # Дополнительные поля
-            "date_publication": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
+        payload = build_news_payload(translations['ru'], image_uri, seo_image_uri)
 
         headers = {
             "Authorization": f"Bearer {access_token}",
@@ -273,137 +481,227 @@ def create_news_api(title: str, description: str, subtitle: str, image_uri: str,
             "Accept-Language": "ru"
         }
 
-        print(f"📊 Отправляем данные (только русский язык):")
-        print(f"   Заголовок: '{payload['title']}' ({len(payload['title'])} симв.)")
-        print(f"   Подзаголовок: '{payload['subtitle']}' ({len(payload['subtitle'])} симв.)")
-        print(f"   Описание: '{payload['description'][:100]}...' ({len(payload['description'])} симв.)")
-        print(f"   Image URI: '{payload['image_uri']}'")
-        print(f"   URL: {news_url}")
-        print(f"   Токен: {access_token[:20]}...")
+        logger.debug("📊 Отправляем новость: заголовок %s симв., подзаголовок %s симв., описание %s симв., image_uri %s",
+                     len(payload['title']), len(payload['subtitle']), len(payload['description']), payload['image_uri'])
 
-        response = requests.post(news_url, json=payload, headers=headers, timeout=30)
-
-        print(f"📡 Ответ сервера: {response.status_code}")
-        print(f"📡 Заголовки ответа: {dict(response.headers)}")
-
-        # Проверяем тип ответа
-        content_type = response.headers.get('content-type', '')
-        if 'application/json' in content_type:
-            response_data = response.json()
-            print(f"📡 JSON ответ: {response_data}")
-        else:
-            print(f"📡 Не-JSON ответ (первые 200 символов): {response.text[:200]}")
+        response = await _request("POST", news_url, idempotent=False, json=payload, headers=headers)
 
         if response.status_code == 201:
-            result_data = response.json()
-            print("✅ Новость успешно создана через API (только русский язык)!")
-            print(f"🎉 ID новости: {result_data.get('data', {}).get('id', 'N/A')}")
-            return True
+            return _created_news_id(response)
+        elif response.status_code in UNCERTAIN_STATUSES:
+            raise SiteCreateUncertain(f"API ответил {response.status_code}")
         else:
-            print(f"❌ Ошибка создания новости: {response.status_code}")
+            logger.error("❌ Ошибка создания новости: %s %s", response.status_code, response.text[:200])
+
+            if image_uri and _is_image_rejected(response):
+                logger.warning("⚠️ API отклонил изображение, сбрасываем кэш загрузки")
+                invalidate_uploaded_image(image_uri)
+                if seo_image_uri:
+                    invalidate_uploaded_image(seo_image_uri)
+                return False
 
             if response.status_code == 401:
-                print("🔄 Токен устарел, пробуем переаутентифицироваться...")
-                if login_to_api():
+                logger.info("🔄 Токен устарел, пробуем переаутентифицироваться...")
+                if await login_to_api():
                     headers["Authorization"] = f"Bearer {access_token}"
-                    response = requests.post(news_url, json=payload, headers=headers, timeout=30)
+                    response = await _request("POST", news_url, idempotent=False, json=payload, headers=headers)
                     if response.status_code == 201:
-                        print("✅ Новость успешно создана после переаутентификации!")
-                        return True
+                        logger.info("✅ Новость успешно создана после переаутентификации!")
+                        return _created_news_id(response)
+                    if response.status_code in UNCERTAIN_STATUSES:
+                        raise SiteCreateUncertain(f"API ответил {response.status_code}")
 
             return False
 
+    except SiteCreateUncertain:
+        raise
+    except aiohttp.ClientConnectorError as e:
+        # Соединение не установлено - запрос до сервера не дошел
+        logger.error("❌ Нет соединения с API: %s", e)
+        return False
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise SiteCreateUncertain(f"нет ответа API: {e!r}") from e
     except Exception as e:
-        print(f"❌ Ошибка при создании новости: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Ошибка при создании новости: %s", e)
         return False
 
 
-def post_news_to_site(news_text: str, image_path: str = None) -> bool:
-    """Основная функция публикации новости через API (только русский язык)"""
-
-    # Шаг 1: Аутентификация
-    if not login_to_api():
-        print("❌ Не удалось аутентифицироваться в API")
-        return False
-
-    # Шаг 2: Извлечение заголовка и текста
+def _created_news_id(response: ApiResponse):
+    """ID новости из ответа на создание (True, если API его не вернул)"""
+    try:
+        news_id = response.json().get('data', {}).get('id')
+    except ValueError:
+        news_id = None
+    logger.info("✅ Новость создана через API, ID: %s", news_id or 'N/A')
+    return news_id or True
+
+
+async def ensure_logged_in() -> bool:
+    """Аутентифицируется в API, только если токена еще нет (один вход на все запросы)"""
+    global _login_lock
+    if access_token:
+        return True
+
+    if _login_lock is None:
+        _login_lock = asyncio.Lock()
+    async with _login_lock:
+        # Пока ждали блокировку, токен мог получить другой запрос
+        if access_token:
+            return True
+        return await login_to_api()
+
+
+async def upload_site_images(image_path: str) -> dict:
+    """Готовит сжатые варианты изображения (сайт и SEO) и загружает их параллельно"""
+    images = {"site_path": None, "seo_path": None, "image_uri": None, "seo_image_uri": None}
+    if not image_path or not os.path.exists(image_path):
+        logger.warning("⚠️ Путь к изображению не указан или файл не существует")
+        return images
+
+    images["site_path"], images["seo_path"] = await asyncio.gather(
+        get_variant(image_path, "site"),
+        get_variant(image_path, "seo"),
+    )
+    images["image_uri"], images["seo_image_uri"] = await asyncio.gather(
+        upload_image(images["site_path"]),
+        upload_image(images["seo_path"]),
+    )
+    if not images["image_uri"]:
+        logger.warning("⚠️ Продолжаем без изображения")
+        images["seo_image_uri"] = None
+    return images
+
+
+async def publish_prepared_news(news_text: str, images: dict):
+    """Создает новость на сайте по тексту и уже загруженным изображениям.
+
+    Возвращает ID новости на сайте (см. create_news_api) или False.
+    """
+    # Извлечение заголовка и текста
     title, body = extract_title_and_body(news_text)
 
     # ВРЕМЕННАЯ ПРОВЕРКА: если тело пустое, используем тестовый текст
     if not body or len(body.strip()) == 0:
-        print("⚠️ Тело новости пустое, используем тестовый текст")
+        logger.warning("⚠️ Тело новости пустое, используем тестовый текст")
         body = "Это тестовое описание новости. " + title
 
-    # Шаг 3: Загрузка изображения
-    image_uri = None
-    if image_path and os.path.exists(image_path):
-        image_uri = upload_image(image_path)
-        if not image_uri:
-            print("⚠️ Продолжаем без изображения")
-    else:
-        print("⚠️ Путь к изображению не указан или файл не существует")
-
-    # Шаг 4: Подготовка контента (без перевода)
-    print("🔄 Подготавливаем контент (только русский язык)...")
+    # Подготовка контента (без перевода)
+    logger.debug("🔄 Подготавливаем контент")
     translations = translate_news_content(title, body)
 
-    # Шаг 5: Создание новости
-    subtitle = truncate_text(body, 200)
-    success = create_news_api(title, body, subtitle, image_uri, translations)
+    # Создание новости
+    subtitle = translations['ru']['subtitle']
+    image_uri = images["image_uri"]
+    seo_image_uri = images["seo_image_uri"]
+    image_from_cache = is_cached_image_uri(image_uri)
+    success = await create_news_api(title, body, subtitle, image_uri, translations, seo_image_uri)
+
+    # Если сервер удалил ранее загруженное изображение - загружаем заново и повторяем
+    if not success and image_from_cache and not is_cached_image_uri(image_uri):
+        logger.info("🔄 Повторно загружаем изображение и публикуем еще раз...")
+        image_uri = await upload_image(images["site_path"], force=True)
+        seo_image_uri = await upload_image(images["seo_path"], force=True) if image_uri else None
+        if image_uri:
+            success = await create_news_api(title, body, subtitle, image_uri, translations, seo_image_uri)
 
     if success:
-        print("🎉 Новость успешно опубликована на сайте (только русский язык)!")
+        logger.info("🎉 Новость успешно опубликована на сайте")
     else:
-        print("❌ Не удалось опубликовать новость на сайте")
+        logger.error("❌ Не удалось опубликовать новость на сайте")
 
     return success
 
-def post_news_to_site_simple(news_text: str, image_path: str = None) -> bool:
+
+async def post_news_to_site(news_text: str, image_path: str = None):
+    """Основная функция публикации новости через API (только русский язык).
+
+    Возвращает ID новости на сайте или False; при неизвестном результате - SiteCreateUncertain.
+    """
+
+    # Шаг 1: Аутентификация (повторный вход только если токена нет или он устарел)
+    if not await ensure_logged_in():
+        logger.error("❌ Не удалось аутентифицироваться в API")
+        return False
+
+    # Шаг 2: Загрузка изображения (сжатые варианты для сайта и SEO)
+    images = await upload_site_images(image_path)
+
+    # Шаг 3: Подготовка контента и создание новости
+    return await publish_prepared_news(news_text, images)
+
+
+async def post_news_batch(items: list, concurrency: int = None) -> list:
+    """Пакетная публикация нескольких новостей на сайт.
+
+    items - список пар (news_text, image_path). Вход в API выполняется один раз,
+    разные изображения загружаются параллельно, а новости создаются не более
+    чем по concurrency одновременно. Возвращает список результатов в том же порядке,
+    что и items: ID новости на сайте, False или исключение SiteCreateUncertain.
+    """
+    if not items:
+        return []
+    concurrency = concurrency or SITE_BATCH_CONCURRENCY
+
+    logger.info("📦 Пакетная публикация на сайт: %s новостей", len(items))
+    if not await ensure_logged_in():
+        logger.error("❌ Не удалось аутентифицироваться в API")
+        return [False] * len(items)
+
+    # Каждое изображение готовим и загружаем один раз, даже если оно у нескольких новостей
+    image_paths = list({image_path for _, image_path in items if image_path})
+    uploaded = await asyncio.gather(*(upload_site_images(path) for path in image_paths), return_exceptions=True)
+    images_by_path = {}
+    for path, images in zip(image_paths, uploaded):
+        if isinstance(images, Exception):
+            logger.warning("⚠️ Не удалось загрузить изображение %s: %s", path, images)
+            continue
+        images_by_path[path] = images
+
+    no_images = {"site_path": None, "seo_path": None, "image_uri": None, "seo_image_uri": None}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def publish_one(news_text: str, image_path: str):
+        async with semaphore:
+            try:
+                return await publish_prepared_news(news_text, images_by_path.get(image_path, no_images))
+            except SiteCreateUncertain as e:
+                return e
+            except Exception as e:
+                logger.error("❌ Ошибка пакетной публикации: %s", e)
+                return False
+
+    results = await asyncio.gather(*(publish_one(news_text, image_path) for news_text, image_path in items))
+    published = sum(1 for result in results if result and not isinstance(result, Exception))
+    logger.info("📦 Пакетная публикация завершена: успешно %s из %s", published, len(results))
+    return list(results)
+
+
+async def post_news_to_site_simple(news_text: str, image_path: str = None) -> bool:
     """Простая версия публикации (только русский язык)"""
 
-    if not login_to_api():
+    if not await login_to_api():
         return False
 
     title, body = extract_title_and_body(news_text)
 
     image_uri = None
     if image_path and os.path.exists(image_path):
-        image_uri = upload_image(image_path)
-
-    # Создаем минимальные переводы (только русский)
-    short_subtitle = truncate_text(body, 200)
-    translations = {
-        'ru': {
-            'title': title,
-            'description': body,
-            'subtitle': short_subtitle
-        },
-        'kk': {
-            'title': title,
-            'description': body,
-            'subtitle': short_subtitle
-        },
-        'en': {
-            'title': title,
-            'description': body,
-            'subtitle': short_subtitle
-        },
-        'zh': {
-            'title': title,
-            'description': body,
-            'subtitle': short_subtitle
-        }
-    }
+        image_uri = await upload_image(await get_variant(image_path, "site"))
+
+    # Создаем минимальные переводы (только русский), заголовок уже ограничен в extract_title_and_body
+    short_subtitle = truncate_text(body, SUBTITLE_LENGTH)
+    content = {'title': title, 'description': body, 'subtitle': short_subtitle}
+    translations = {'ru': content}
+    for language in EXTRA_LANGUAGES:
+        translations[language] = content
 
-    return create_news_api(title, body, short_subtitle, image_uri, translations)
+    return await create_news_api(title, body, short_subtitle, image_uri, translations)
 
 
 # Функции для обратной совместимости
-def login_to_site() -> bool:
+async def login_to_site() -> bool:
     """Старая функция для обратной совместимости"""
-    return login_to_api()
+    return await login_to_api()
 
 
 def get_csrf_token_for_create() -> str:
@@ -0,0 +1,265 @@
+"""Хранилище снимков загруженных страниц статей и RSS-лент.
+
+Содержимое хранится сжатым по SHA-256 (одинаковые страницы - один файл):
+    cache/snapshots/objects/ab/abcd....z   - сжатое содержимое
+    cache/snapshots/refs/12/1234....json   - последний снимок по ссылке: url, тип, хэш, время загрузки
+Общий размер (объекты и ссылки) ограничен SNAPSHOT_MAX_MB: при превышении удаляются давно
+не использованные объекты (время использования - mtime файла, обновляется при чтении) и ссылки на них.
+Ссылки старше SNAPSHOT_REF_MAX_DAYS удаляются при каждой проверке размера.
+
+Снимки позволяют прогнать новый извлекатель текста по уже скачанным страницам, не загружая их заново,
+и взять текст статьи, если сайт временно недоступен.
+
+Повторное извлечение текста по всем сохраненным статьям (заодно замер скорости извлекателя):
+    python snapshot_store.py --reextract --output reextract.jsonl
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+import metrics
+from file_cache import cache_path, load_json_cache, save_json_cache
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = cache_path("snapshots")
+OBJECTS_DIR = os.path.join(SNAPSHOT_DIR, "objects")
+REFS_DIR = os.path.join(SNAPSHOT_DIR, "refs")
+
+# Ограничение общего размера снимков (после сжатия)
+SNAPSHOT_MAX_BYTES = int(os.getenv("SNAPSHOT_MAX_MB", "500")) * 1024 * 1024
+# При вытеснении освобождаем место с запасом, чтобы не чистить после каждой записи
+SNAPSHOT_EVICT_TARGET = 0.9
+# Проверять размер хранилища после записи такого объема
+SNAPSHOT_EVICT_EVERY_BYTES = SNAPSHOT_MAX_BYTES // 20
+SNAPSHOT_COMPRESSION_LEVEL = 6
+# Сколько дней хранить ссылку на снимок страницы, которая с тех пор не загружалась
+SNAPSHOT_REF_MAX_DAYS = int(os.getenv("SNAPSHOT_REF_MAX_DAYS", "90"))
+
+KIND_ARTICLE = "article"
+KIND_FEED = "feed"
+
+SNAPSHOT_WRITES = metrics.counter(
+    "snapshot_writes_total", "Сохраненные снимки страниц (new - новое содержимое, same - уже было)", ("kind", "result"))
+SNAPSHOT_EVICTED_BYTES = metrics.counter(
+    "snapshot_evicted_bytes_total", "Объем снимков, удаленных по лимиту размера и сроку хранения ссылок")
+
+# Снимки пишут потоки executor'а
+_evict_lock = threading.Lock()
+_written_since_evict = 0
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _object_path(digest: str) -> str:
+    return os.path.join(OBJECTS_DIR, digest[:2], f"{digest}.z")
+
+
+def _ref_path(url: str) -> str:
+    key = _digest(url.encode())
+    return os.path.join(REFS_DIR, key[:2], f"{key}.json")
+
+
+def save_snapshot(url: str, content: bytes, kind: str = KIND_ARTICLE) -> str:
+    """Сохраняет снимок страницы, возвращает хэш содержимого (None - не удалось сохранить)"""
+    global _written_since_evict
+    if not content:
+        return None
+    try:
+        digest = _digest(content)
+        path = _object_path(digest)
+        if os.path.exists(path):
+            os.utime(path)
+            SNAPSHOT_WRITES.inc(kind=kind, result="same")
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = zlib.compress(content, SNAPSHOT_COMPRESSION_LEVEL)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            SNAPSHOT_WRITES.inc(kind=kind, result="new")
+            with _evict_lock:
+                _written_since_evict += len(data)
+                need_evict = _written_since_evict >= SNAPSHOT_EVICT_EVERY_BYTES
+                if need_evict:
+                    _written_since_evict = 0
+            if need_evict:
+                evict_snapshots()
+
+        save_json_cache(_ref_path(url), {"url": url, "kind": kind, "sha256": digest, "fetched_at": time.time()})
+        return digest
+    except Exception as e:
+        logger.warning("⚠️ Не удалось сохранить снимок %s: %s", url, e)
+        return None
+
+
+def load_snapshot(url: str) -> bytes:
+    """Последний сохраненный снимок страницы или None"""
+    ref = load_json_cache(_ref_path(url))
+    if not ref:
+        return None
+    return load_object(ref["sha256"])
+
+
+def load_object(digest: str) -> bytes:
+    path = _object_path(digest)
+    try:
+        with open(path, "rb") as f:
+            data = zlib.decompress(f.read())
+        os.utime(path)  # Отметка использования для вытеснения
+        return data
+    except FileNotFoundError:
+        return None  # Объект вытеснен
+    except Exception as e:
+        logger.warning("⚠️ Поврежденный снимок %s: %s", digest, e)
+        return None
+
+
+def iter_snapshots(kind: str = None):
+    """Перебирает сохраненные снимки (словари url / kind / sha256 / fetched_at), вытесненные пропускает"""
+    if not os.path.isdir(REFS_DIR):
+        return
+    for root, _, files in os.walk(REFS_DIR):
+        for name in files:
+            if not name.endswith(".json"):
+                continue
+            ref = load_json_cache(os.path.join(root, name))
+            if not ref or (kind and ref.get("kind") != kind):
+                continue
+            if os.path.exists(_object_path(ref["sha256"])):
+                yield ref
+
+
+def _list_files(directory: str) -> list:
+    """Файлы каталога снимков: [(mtime, размер, путь)]"""
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    return files
+
+
+def _remove_file(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False  # Уже удалил другой процесс
+
+
+def evict_snapshots(max_bytes: int = SNAPSHOT_MAX_BYTES) -> int:
+    """Удаляет устаревшие ссылки и давно не использованные объекты, пока хранилище больше лимита.
+
+    Возвращает освобожденный объем.
+    """
+    freed = 0
+    # Ссылка перезаписывается при каждой загрузке страницы, поэтому ее mtime - время последней загрузки
+    expire_before = time.time() - SNAPSHOT_REF_MAX_DAYS * 86400
+    refs = []
+    for mtime, size, path in _list_files(REFS_DIR):
+        if mtime < expire_before:
+            if _remove_file(path):
+                freed += size
+        else:
+            refs.append((size, path))
+    objects = _list_files(OBJECTS_DIR)
+
+    total = sum(size for _, size, _ in objects) + sum(size for size, _ in refs)
+    if total > max_bytes:
+        target = total - max_bytes * SNAPSHOT_EVICT_TARGET
+        evicted = 0
+        for _, size, path in sorted(objects):
+            if evicted >= target:
+                break
+            if _remove_file(path):
+                evicted += size
+        freed += evicted
+
+        # Ссылки на удаленные объекты больше ничего не дают
+        for size, path in refs:
+            ref = load_json_cache(path)
+            if not ref or not os.path.exists(_object_path(ref["sha256"])):
+                if _remove_file(path):
+                    freed += size
+                    evicted += size
+        logger.info("🗑️ Снимки страниц: вытеснено %.1f МБ, осталось %.1f МБ",
+                    evicted / 1024 / 1024, (total - evicted) / 1024 / 1024)
+
+    if freed:
+        SNAPSHOT_EVICTED_BYTES.inc(freed)
+    return freed
+
+
+def reextract(output: str = None, limit: int = None) -> dict:
+    """Прогоняет текущий извлекатель текста по всем сохраненным статьям"""
+    from parser import extract_article_text
+
+    timings = []
+    empty = 0
+    total_length = 0
+    out = open(output, "w", encoding="utf-8") if output else None
+    try:
+        for ref in iter_snapshots(KIND_ARTICLE):
+            if limit and len(timings) >= limit:
+                break
+            content = load_object(ref["sha256"])
+            if content is None:
+                continue
+            page_html = content.decode("utf-8", errors="replace")
+            started = time.perf_counter()
+            text = extract_article_text(page_html)
+            timings.append(time.perf_counter() - started)
+            total_length += len(text)
+            if not text:
+                empty += 1
+            if out:
+                out.write(json.dumps({"url": ref["url"], "sha256": ref["sha256"], "length": len(text),
+                                      "seconds": round(timings[-1], 4), "text": text}, ensure_ascii=False) + "\n")
+    finally:
+        if out:
+            out.close()
+
+    timings.sort()
+    count = len(timings)
+    return {
+        "pages": count,
+        "empty": empty,
+        "avg_length": total_length // count if count else 0,
+        "total_seconds": sum(timings),
+        "p50_ms": timings[count // 2] * 1000 if count else 0,
+        "p95_ms": timings[min(count - 1, int(count * 0.95))] * 1000 if count else 0,
+    }
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Снимки загруженных страниц")
+    arg_parser.add_argument("--reextract", action="store_true", help="извлечь текст из всех сохраненных статей")
+    arg_parser.add_argument("--output", help="куда записать результаты извлечения (JSONL)")
+    arg_parser.add_argument("--limit", type=int, help="сколько статей обработать")
+    arg_parser.add_argument("--evict", action="store_true", help="применить лимит размера хранилища")
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.evict:
+        evict_snapshots()
+    if args.reextract:
+        result = reextract(args.output, args.limit)
+        print(f"📄 Статей: {result['pages']}, без текста: {result['empty']}, средняя длина: {result['avg_length']}")
+        print(f"⏱️ Извлечение: всего {result['total_seconds']:.1f} с, "
+              f"p50 {result['p50_ms']:.1f} мс, p95 {result['p95_ms']:.1f} мс")
+    elif not args.evict:
+        articles = sum(1 for _ in iter_snapshots(KIND_ARTICLE))
+        feeds = sum(1 for _ in iter_snapshots(KIND_FEED))
+        print(f"📦 Снимков статей: {articles}, лент: {feeds}")
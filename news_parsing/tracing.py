@@ -0,0 +1,111 @@
+import hashlib
+import html
+import logging
+import time
+from contextlib import asynccontextmanager
+from database import add_trace_span, get_trace_spans, get_recent_traces
+
+logger = logging.getLogger(__name__)
+
+# Трассировка новости по всему конвейеру: каждый этап записывает интервал (span) в таблицу trace_spans.
+# Ключ трассы - md5 ссылки, тот же, что news_id сырой новости в news_sender.
+
+# Этапы в порядке прохождения новости и их подписи для /trace
+STAGE_NAMES = {
+    "fetch": "загрузка статьи",
+    "extract": "извлечение текста",
+    "enqueue": "в очередь",
+    "send_raw": "отправка админам",
+    "raw_decision": "решение по сырой",
+    "paraphrase": "DeepSeek",
+    "send_processed": "отправка обработанной",
+    "processed_decision": "решение по обработанной",
+    "publish_site": "публикация на сайт",
+    "publish_telegram": "публикация в Telegram",
+}
+
+# Ширина полосы в отрисовке waterfall (символов)
+WATERFALL_WIDTH = 20
+
+
+def trace_id_for(link: str) -> str:
+    return hashlib.md5(link.encode()).hexdigest()
+
+
+async def record_span(link: str, stage: str, started_at: float, duration: float, status: str = "ok",
+                      detail: str = None):
+    """Записывает интервал этапа. Ошибка записи не должна ломать обработку новости"""
+    try:
+        await add_trace_span(trace_id_for(link), link, stage, started_at, duration, status, detail)
+    except Exception as e:
+        logger.warning("⚠️ Не удалось записать span %s для %s: %s", stage, link, e)
+
+
+@asynccontextmanager
+async def trace_span(link: str, stage: str, detail: str = None):
+    """Замеряет этап обработки новости: async with trace_span(link, "fetch"): ..."""
+    started_at = time.time()
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        await record_span(link, stage, started_at, time.perf_counter() - started, status, detail)
+
+
+async def trace_event(link: str, stage: str, status: str = "ok", detail: str = None):
+    """Мгновенное событие (решение админа и т.п.)"""
+    await record_span(link, stage, time.time(), 0.0, status, detail)
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 1:
+        return f"{seconds * 1000:.0f}мс"
+    if seconds < 60:
+        return f"{seconds:.1f}с"
+    if seconds < 3600:
+        return f"{int(seconds // 60)}м {int(seconds % 60)}с"
+    return f"{int(seconds // 3600)}ч {int(seconds % 3600 // 60)}м"
+
+
+def render_waterfall(spans: list) -> str:
+    """Рисует waterfall трассы: смещение от начала, этап, полоса и длительность (HTML для Telegram)"""
+    start = min(span["started_at"] for span in spans)
+    end = max(span["started_at"] + span["duration"] for span in spans)
+    total = max(end - start, 1e-6)
+
+    lines = []
+    for span in spans:
+        offset = span["started_at"] - start
+        length = min(max(1, round(span["duration"] / total * WATERFALL_WIDTH)), WATERFALL_WIDTH)
+        begin = min(int(offset / total * WATERFALL_WIDTH), WATERFALL_WIDTH - length)
+        bar = (" " * begin + "█" * length).ljust(WATERFALL_WIDTH)
+        name = STAGE_NAMES.get(span["stage"], span["stage"])
+        mark = "❌" if span["status"] == "error" else " "
+        lines.append(f"+{format_duration(offset):>7} {name[:22]:<22} |{bar}| {format_duration(span['duration'])}{mark}")
+
+    header = f"🧭 Трасса {spans[0]['trace_id'][:12]} — всего {format_duration(total)}\n{html.escape(spans[0]['link'])}"
+    return f"{header}\n<pre>{html.escape(chr(10).join(lines))}</pre>"
+
+
+async def get_trace_report(key: str) -> str:
+    """Отчет по трассе: key - ссылка на новость или ID трассы (можно начало ID)"""
+    trace_id = trace_id_for(key) if key.startswith(("http://", "https://")) else key
+    spans = await get_trace_spans(trace_id)
+    if not spans:
+        return None
+    return render_waterfall(spans)
+
+
+async def get_recent_traces_report(limit: int = 10) -> str:
+    traces = await get_recent_traces(limit)
+    if not traces:
+        return "📭 Трасс пока нет"
+    lines = ["🧭 Последние трассы:"]
+    for trace_id, link, total in traces:
+        lines.append(f"• <code>{trace_id[:12]}</code> {format_duration(total)} — {html.escape(link)}")
+    lines.append("\nПодробнее: /trace &lt;id или ссылка&gt;")
+    return "\n".join(lines)
@@ -0,0 +1,82 @@
+"""Процесс-воркер сбора новостей: опрос RSS, загрузка и извлечение статей.
+
+Бот и воркеры работают с общей базой news.db. Ленты и ссылки распределяются через аренды,
+новые новости попадают в processing_queue, а бот будится сигналом через notify.py.
+
+Запуск отдельно от бота:
+    python worker.py --count 4
+или вместе с ботом:
+    python main.py --workers 4
+
+Метрики воркера номер i доступны на порту METRICS_PORT + i (бот - на METRICS_PORT).
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+from database import init_db
+from log_setup import setup_logging, shutdown_logging
+from metrics import start_metrics_server, METRICS_PORT
+from loop_watchdog import loop_watchdog
+
+logger = logging.getLogger(__name__)
+
+
+async def worker_main(index: int = 0):
+    from pipeline import run_pipeline, WORKER_ID
+    logger.info("👷 Воркер %s запущен", WORKER_ID)
+    await init_db()
+    metrics_runner = await start_metrics_server(port=METRICS_PORT + index + 1)
+    watchdog_task = asyncio.create_task(loop_watchdog())
+    try:
+        await run_pipeline()
+    finally:
+        watchdog_task.cancel()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+
+
+def run_worker(index: int = 0):
+    setup_logging()
+    try:
+        asyncio.run(worker_main(index))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown_logging()
+
+
+def start_worker_processes(count: int) -> list:
+    """Запускает count процессов-воркеров (spawn - у каждого свой event loop и свой WORKER_ID)"""
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for i in range(count):
+        process = context.Process(target=run_worker, args=(i,), name=f"news-worker-{i + 1}", daemon=True)
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def stop_worker_processes(processes: list):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join(timeout=5)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Воркеры сбора новостей")
+    arg_parser.add_argument("--count", type=int, default=1, help="количество процессов")
+    args = arg_parser.parse_args()
+
+    if args.count <= 1:
+        run_worker()
+    else:
+        setup_logging()
+        workers = start_worker_processes(args.count)
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            stop_worker_processes(workers)
+            logger.info("👋 Воркеры остановлены")